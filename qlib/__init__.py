@@ -32,7 +32,8 @@ def init(default_conf="client", **kwargs):
 
     """
     from .config import C  # pylint: disable=C0415
-    from .data.cache import H  # pylint: disable=C0415
+    from .data.cache import H, DiskCacheEvictor  # pylint: disable=C0415
+    from .utils.paral import WorkerPool  # pylint: disable=C0415
 
     logger = get_module_logger("Initialization")
 
@@ -69,6 +70,15 @@ def init(default_conf="client", **kwargs):
 
     C.register()
 
+    # the workers are started after the providers are registered, the forked ones inherit them
+    WorkerPool.stop()
+    if C.worker_pool:
+        WorkerPool.start()
+
+    DiskCacheEvictor.stop()
+    if C.get("disk_cache_evict_interval") is not None and C.get("disk_cache_size_limit") is not None:
+        DiskCacheEvictor.start(C.disk_cache_evict_interval)
+
     if "flask_server" in C:
         logger.info(f"flask_server={C['flask_server']}, flask_port={C['flask_port']}")
     logger.info("qlib successfully initialized based on %s settings." % default_conf)
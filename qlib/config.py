@@ -122,6 +122,15 @@ _default_config = {
     # cache
     "expression_cache": None,
     "calendar_cache": None,
+    # compile the fields of a dataset into one DAG, so the common sub-expressions are evaluated only once
+    "compile_expressions": False,
+    # the number of compiled DAGs kept by the expression provider, each (fields, index range) query compiles one
+    "compiled_expressions_limit": 32,
+    # calculate the connected element-wise operators of the compiled fields by one generated function
+    "fuse_expressions": False,
+    # evaluate every operator column-wise on a (time x instrument) panel of all the instruments in one process
+    # instead of instrument by instrument in joblib workers, it works best with `PanelFeatureStorage`
+    "panel_evaluation": False,
     # for simple dataset cache
     "local_cache_path": None,
     # kernels can be a fixed value or a callable function lie `def (freq: str) -> int`
@@ -131,17 +140,54 @@ _default_config = {
     "dump_protocol_version": PROTOCOL_VERSION,
     # How many tasks belong to one process. Recommend 1 for high-frequency data and None for daily data.
     "maxtasksperchild": None,
+    # keep a pool of `kernels` worker processes for `D.features` from `qlib.init` on instead of starting new ones for
+    # every call, the workers keep the calendars, the parsed fields and the memory caches between the calls
+    "worker_pool": False,
+    # the resident memory in bytes after which a worker of the pool is replaced, None to keep the workers
+    "worker_pool_memory_limit": None,
     # If joblib_backend is None, use loky
     "joblib_backend": "multiprocessing",
     "default_disk_cache": 1,  # 0:skip/1:use
     "mem_cache_size_limit": 500,
     "mem_cache_limit_type": "length",
+    # the budget of the feature cache `H["f"]` in bytes, None to limit it the same as the others
+    "feature_mem_cache_nbytes_limit": 512 * 1024**2,
+    # share the features loaded by the joblib workers of `D.features` in `multiprocessing.shared_memory`
+    # only POSIX shared memory (`/dev/shm`) is supported, the segments are removed when the main process exits
+    "shared_mem_cache": False,
+    # the budget of the segments of `shared_mem_cache` in bytes, None to limit them by the free space of `/dev/shm` only
+    "shared_mem_cache_nbytes_limit": 2 * 1024**3,
+    # send the instruments to the joblib workers of `D.features` in balanced chunks and collect the results in a
+    # float32 array in POSIX shared memory instead of pickling and concatenating a data frame per instrument
+    "shared_mem_dataset": False,
+    # the directory of the on-disk cache of the parsed fields, one file per field set, None to disable it
+    # the workers which do not fork from the main process (e.g. the `loky` backend of joblib) load them from it
+    "parsed_fields_cache_dir": None,
+    # max number of `np.memmap` handles kept open by `MmapFileFeatureStorage`
+    # each handle holds a file descriptor, so keep it below `ulimit -n`
+    "mmap_pool_size": 512,
     # memory cache expire second, only in used 'DatasetURICache' and 'client D.calendar'
     # default 1 hour
     "mem_cache_expire": 60 * 60,
     # cache dir name
     "dataset_cache_dir_name": "dataset_cache",
     "features_cache_dir_name": "features_cache",
+    # the format of the caches generated by `DiskDatasetCache`, the existing caches are read in their own format
+    # "hdf": a `pd.HDFStore`
+    # "npy": a column-major `.npy` block which is memory mapped on reading, please refer to `DiskDatasetCache`
+    "dataset_cache_format": "hdf",
+    # the budget in bytes of the disk caches (`DiskExpressionCache` and `DiskDatasetCache`) of each data uri, None for
+    # no limit, the entries beyond it are evicted by `qlib.data.cache.DiskCacheEvictor`
+    # the expression caches are read under the reader lock if it is set, so set it in the processes reading the caches
+    # evicted by `scripts/evict_cache.py` too
+    "disk_cache_size_limit": None,
+    # evict the disk caches every `disk_cache_evict_interval` seconds in a background thread of the process calling
+    # `qlib.init`, None to evict them by `scripts/evict_cache.py` only
+    "disk_cache_evict_interval": None,
+    # the locks of `DiskExpressionCache` and `DiskDatasetCache`, please refer to `qlib.data.cache.get_cache_lock`
+    # "RedisCacheLock": on redis, the disk caches are disabled if redis is not available
+    # "FileCacheLock": on files (e.g. `{"class": "FileCacheLock", "kwargs": {"lock_dir": ...}}`), no redis is needed
+    "cache_lock": "RedisCacheLock",
     # redis
     # in order to use cache
     "redis_host": "127.0.0.1",
@@ -356,9 +402,16 @@ class QlibConfig(Config):
         # raise KeyError
         self.update(_default_region_config[region])
 
-    @staticmethod
-    def is_depend_redis(cache_name: str):
-        return cache_name in DEPENDENCY_REDIS_CACHE
+    def is_depend_redis(self, cache_name: str):
+        if cache_name not in DEPENDENCY_REDIS_CACHE:
+            return False
+        # the disk caches need redis only for the locks
+        cache_lock = self.get("cache_lock", "RedisCacheLock")
+        if isinstance(cache_lock, dict):
+            cache_lock = cache_lock.get("class")
+        elif not isinstance(cache_lock, str):
+            cache_lock = type(cache_lock).__name__
+        return cache_lock == "RedisCacheLock"
 
     @property
     def dpm(self):
@@ -425,7 +478,7 @@ class QlibConfig(Config):
 
         self.resolve_path()
 
-        if not (self["expression_cache"] is None and self["dataset_cache"] is None):
+        if self.is_depend_redis(self["expression_cache"]) or self.is_depend_redis(self["dataset_cache"]):
             # check redis
             if not can_use_cache():
                 log_str = ""
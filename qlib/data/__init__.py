@@ -34,6 +34,10 @@ from .cache import (
     SimpleDatasetCache,
     DatasetURICache,
     MemoryCalendarCache,
+    CacheLock,
+    RedisCacheLock,
+    FileCacheLock,
+    DiskCacheEvictor,
 )
 
 
@@ -63,4 +67,8 @@ __all__ = [
     "SimpleDatasetCache",
     "DatasetURICache",
     "MemoryCalendarCache",
+    "CacheLock",
+    "RedisCacheLock",
+    "FileCacheLock",
+    "DiskCacheEvictor",
 ]
@@ -4,9 +4,11 @@ cimport cython
 cimport numpy as np
 import numpy as np
 
-from libc.math cimport sqrt, isnan, NAN
+from libc.math cimport sqrt, pow, isnan, NAN
 from libcpp.vector cimport vector
 
+from . import rolling as _rolling
+
 
 cdef class Expanding:
     """1-D array expanding"""
@@ -127,12 +129,35 @@ cdef class Rsquare(Expanding):
         return rvalue * rvalue
 
 
+cdef class EMA(Expanding):
+    """1-D array expanding exponential mean, the span of the weights is the size of the window"""
+    cdef double update(self, double val):
+        self.barv.push_back(val)
+        if isnan(val):
+            self.na_count += 1
+        cdef size_t size = self.barv.size()
+        if self.na_count == size:
+            return NAN
+        cdef double a = 1 - 2. / (1 + size)
+        cdef double w_sum = 0
+        cdef double vsum = 0
+        cdef double w
+        cdef size_t i
+        for i in range(size):
+            w = pow(a, size - 1 - i)
+            w_sum += w
+            if not isnan(self.barv[i]):
+                vsum += w * self.barv[i]
+        return vsum / w_sum
+
+
 cdef np.ndarray[double, ndim=1] expanding(Expanding r, np.ndarray a):
     cdef int  i
     cdef int  N = len(a)
+    cdef const double[:] values = np.ascontiguousarray(a, dtype=np.float64)
     cdef np.ndarray[double, ndim=1] ret = np.empty(N)
     for i in range(N):
-        ret[i] = r.update(a[i])
+        ret[i] = r.update(values[i])
     return ret
 
 def expanding_mean(np.ndarray a):
@@ -150,3 +175,55 @@ def expanding_rsquare(np.ndarray a):
 def expanding_resi(np.ndarray a):
     cdef Resi r = Resi()
     return expanding(r, a)
+
+def expanding_ema(np.ndarray a):
+    cdef EMA r = EMA()
+    return expanding(r, a)
+
+
+
+# an expanding window is a rolling window as large as the array
+def expanding_var(np.ndarray a):
+    return _rolling.rolling_var(a, max(len(a), 1))
+
+def expanding_std(np.ndarray a):
+    return _rolling.rolling_std(a, max(len(a), 1))
+
+def expanding_skew(np.ndarray a):
+    return _rolling.rolling_skew(a, max(len(a), 1))
+
+def expanding_kurt(np.ndarray a):
+    return _rolling.rolling_kurt(a, max(len(a), 1))
+
+def expanding_max(np.ndarray a):
+    return _rolling.rolling_max(a, max(len(a), 1))
+
+def expanding_min(np.ndarray a):
+    return _rolling.rolling_min(a, max(len(a), 1))
+
+def expanding_idxmax(np.ndarray a):
+    return _rolling.rolling_idxmax(a, max(len(a), 1))
+
+def expanding_idxmin(np.ndarray a):
+    return _rolling.rolling_idxmin(a, max(len(a), 1))
+
+def expanding_median(np.ndarray a):
+    return _rolling.rolling_median(a, max(len(a), 1))
+
+def expanding_rank(np.ndarray a):
+    return _rolling.rolling_rank(a, max(len(a), 1))
+
+def expanding_mad(np.ndarray a):
+    return _rolling.rolling_mad(a, max(len(a), 1))
+
+def expanding_wma(np.ndarray a):
+    return _rolling.rolling_wma(a, max(len(a), 1))
+
+def expanding_quantile(np.ndarray a, double qscore):
+    return _rolling.rolling_quantile(a, max(len(a), 1), qscore)
+
+def expanding_cov(np.ndarray a, np.ndarray b):
+    return _rolling.rolling_cov(a, b, max(len(a), 1))
+
+def expanding_corr(np.ndarray a, np.ndarray b):
+    return _rolling.rolling_corr(a, b, max(len(a), 1))
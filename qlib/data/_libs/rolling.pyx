@@ -4,8 +4,10 @@ cimport cython
 cimport numpy as np
 import numpy as np
 
-from libc.math cimport sqrt, isnan, NAN
+from libc.math cimport sqrt, fabs, isnan, isfinite, NAN
 from libcpp.deque cimport deque
+from libcpp.vector cimport vector
+from libcpp.algorithm cimport lower_bound, upper_bound
 
 
 cdef class Rolling:
@@ -23,6 +25,10 @@ cdef class Rolling:
     cdef double update(self, double val):
         pass
 
+    def step(self, np.ndarray a):
+        """update the window with the values of `a` one by one and return the results, the window is kept"""
+        return rolling(self, a)
+
 
 cdef class Mean(Rolling):
     """1-D array rolling mean"""
@@ -46,6 +52,41 @@ cdef class Mean(Rolling):
         return self.vsum / (self.window - self.na_count)
 
 
+cdef class Sum(Rolling):
+    """1-D array rolling sum"""
+    cdef double vsum
+    def __init__(self, int window):
+        super(Sum, self).__init__(window)
+        self.vsum = 0
+
+    cdef double update(self, double val):
+        self.barv.push_back(val)
+        if not isnan(self.barv.front()):
+            self.vsum -= self.barv.front()
+        else:
+            self.na_count -= 1
+        self.barv.pop_front()
+        if isnan(val):
+            self.na_count += 1
+        else:
+            self.vsum += val
+        if self.na_count == self.window:
+            return NAN
+        return self.vsum
+
+
+cdef class Count(Rolling):
+    """1-D array rolling count of the valid values"""
+    cdef double update(self, double val):
+        self.barv.push_back(val)
+        if isnan(self.barv.front()):
+            self.na_count -= 1
+        self.barv.pop_front()
+        if isnan(val):
+            self.na_count += 1
+        return self.window - self.na_count
+
+
 cdef class Slope(Rolling):
     """1-D array rolling slope"""
     cdef double i_sum # can be used as i2_sum
@@ -182,14 +223,583 @@ cdef class Rsquare(Rolling):
         return rvalue * rvalue
 
     
+cdef class Moment(Rolling):
+    """1-D array rolling moments
+
+    The variance is updated with the Welford's method when a value enters or leaves the window. Like pandas, a window
+    of the same values is detected by counting the consecutive same values to remove the floating point artifacts.
+    The higher moments are calculated from the Kahan sums of the powers of the values as pandas does. The values are
+    shifted by the mean to reduce the cancellation of the sums, the shift and the sums are renewed with the values in
+    the window once every `window` steps, which keeps the update O(1) amortized and stops the error from growing.
+    The infinite values are taken as NaN like pandas, otherwise they would make the sums NaN for good.
+    """
+    cdef int nobs
+    cdef double mean
+    cdef double m2
+    cdef int n_same
+    cdef double last
+    cdef double shift
+    cdef double psum[5]  # the sums of the powers of the shifted values
+    cdef double pcomp[5]  # the compensations of the Kahan summation of `psum`
+    cdef int n_roll  # the steps since `psum` was renewed
+    def __init__(self, int window):
+        super(Moment, self).__init__(window)
+        self.nobs = 0
+        self.mean = 0
+        self.m2 = 0
+        self.n_same = 0
+        self.last = NAN
+        self.shift = 0
+        self.n_roll = 0
+        self.reset_powers()
+
+    cdef void reset_powers(self):
+        cdef int k
+        for k in range(5):
+            self.psum[k] = 0
+            self.pcomp[k] = 0
+
+    cdef void accumulate(self, double val, double sign):
+        """add (`sign` is 1) or remove (`sign` is -1) the powers of `val`"""
+        cdef double p = sign
+        cdef double d = val - self.shift
+        cdef double y, t
+        cdef int k
+        for k in range(1, 5):
+            p *= d
+            y = p - self.pcomp[k]
+            t = self.psum[k] + y
+            self.pcomp[k] = t - self.psum[k] - y
+            self.psum[k] = t
+
+    cdef void renew_powers(self):
+        self.n_roll = 0
+        self.shift = self.mean
+        self.reset_powers()
+        cdef double _val
+        for _val in self.barv:
+            if not isnan(_val):
+                self.accumulate(_val, 1)
+
+    cdef void add(self, double val):
+        if self.nobs == 0:
+            self.shift = val
+            self.reset_powers()
+        self.nobs += 1
+        cdef double delta = val - self.mean
+        self.mean += delta / self.nobs
+        self.m2 += delta * (val - self.mean)
+        self.accumulate(val, 1)
+        if val == self.last:
+            self.n_same += 1
+        else:
+            self.n_same = 1
+        self.last = val
+
+    cdef void remove(self, double val):
+        if self.nobs == 1:
+            self.nobs = 0
+            self.mean = 0
+            self.m2 = 0
+            return
+        cdef double mean = self.mean - (val - self.mean) / (self.nobs - 1)
+        self.m2 -= (val - mean) * (val - self.mean)
+        self.mean = mean
+        self.accumulate(val, -1)
+        self.nobs -= 1
+
+    cdef void roll(self, double val):
+        if not isfinite(val):
+            val = NAN
+        self.barv.push_back(val)
+        if not isnan(self.barv.front()):
+            self.remove(self.barv.front())
+        self.barv.pop_front()
+        if not isnan(val):
+            self.add(val)
+        self.n_roll += 1
+        if self.n_roll >= self.window:
+            self.renew_powers()
+
+    cdef double var(self):
+        if self.nobs < 2:
+            return NAN
+        if self.n_same >= self.nobs or self.m2 < 0:
+            return 0
+        return self.m2 / (self.nobs - 1)
+
+    cdef double skew(self):
+        if self.nobs < 3:
+            return NAN
+        if self.n_same >= self.nobs:
+            return 0
+        cdef double N = self.nobs
+        cdef double A = self.psum[1] / N
+        cdef double B = self.psum[2] / N - A * A
+        if B <= 1e-14:
+            return NAN
+        cdef double C = self.psum[3] / N - A * A * A - 3 * A * B
+        return sqrt(N * (N - 1)) * C / ((N - 2) * B * sqrt(B))
+
+    cdef double kurt(self):
+        if self.nobs < 4:
+            return NAN
+        if self.n_same >= self.nobs:
+            return -3
+        cdef double N = self.nobs
+        cdef double A = self.psum[1] / N
+        cdef double B = self.psum[2] / N - A * A
+        if B <= 1e-14:
+            return NAN
+        cdef double C = self.psum[3] / N - A * A * A - 3 * A * B
+        cdef double D = self.psum[4] / N - A * A * A * A - 6 * B * A * A - 4 * C * A
+        return ((N * N - 1) * D / (B * B) - 3 * (N - 1) * (N - 1)) / ((N - 2) * (N - 3))
+
+
+cdef class Var(Moment):
+    """1-D array rolling variance"""
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.var()
+
+
+cdef class Std(Moment):
+    """1-D array rolling standard deviation"""
+    cdef double update(self, double val):
+        self.roll(val)
+        return sqrt(self.var())
+
+
+cdef class Skew(Moment):
+    """1-D array rolling skewness"""
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.skew()
+
+
+cdef class Kurt(Moment):
+    """1-D array rolling kurtosis"""
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.kurt()
+
+
+cdef class Extremum(Rolling):
+    """1-D array rolling extremum with a monotonic deque
+
+    The deque keeps the index of the candidates in the window, their values are monotonic from the front to the
+    back, so the front is the extremum. As `np.argmax` and `np.argmin` do, NaN is the extremum if `nan_first`,
+    otherwise NaN is skipped.
+    """
+    cdef deque[double] values
+    cdef deque[long] indexes
+    cdef long i
+    cdef bint nan_first
+    def __init__(self, int window, bint nan_first):
+        super(Extremum, self).__init__(window)
+        self.i = -1
+        self.nan_first = nan_first
+
+    cdef bint before(self, double a, double b):
+        """whether `a` is strictly before `b` in the order of the extremum"""
+        pass
+
+    cdef void roll(self, double val):
+        self.i += 1
+        self.barv.push_back(val)
+        if isnan(self.barv.front()):
+            self.na_count -= 1
+        self.barv.pop_front()
+        if isnan(val):
+            self.na_count += 1
+        if not self.indexes.empty() and self.indexes.front() <= self.i - self.window:
+            self.values.pop_front()
+            self.indexes.pop_front()
+        if isnan(val) and not self.nan_first:
+            return
+        while not self.values.empty() and self.before(val, self.values.back()):
+            self.values.pop_back()
+            self.indexes.pop_back()
+        self.values.push_back(val)
+        self.indexes.push_back(self.i)
+
+    cdef double extremum(self):
+        if self.values.empty():
+            return NAN
+        return self.values.front()
+
+    cdef double index(self):
+        """the 1-based position of the extremum in the window"""
+        if self.na_count == self.window:
+            return NAN
+        cdef long start = self.i - self.window + 1
+        if start < 0:
+            start = 0
+        return self.indexes.front() - start + 1
+
+
+cdef class Max(Extremum):
+    """1-D array rolling max"""
+    def __init__(self, int window):
+        super(Max, self).__init__(window, False)
+
+    cdef bint before(self, double a, double b):
+        return a > b
+
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.extremum()
+
+
+cdef class Min(Extremum):
+    """1-D array rolling min"""
+    def __init__(self, int window):
+        super(Min, self).__init__(window, False)
+
+    cdef bint before(self, double a, double b):
+        return a < b
+
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.extremum()
+
+
+cdef class IdxMax(Extremum):
+    """1-D array rolling argmax (1-based)"""
+    def __init__(self, int window):
+        super(IdxMax, self).__init__(window, True)
+
+    cdef bint before(self, double a, double b):
+        return not isnan(b) and (isnan(a) or a > b)
+
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.index()
+
+
+cdef class IdxMin(Extremum):
+    """1-D array rolling argmin (1-based)"""
+    def __init__(self, int window):
+        super(IdxMin, self).__init__(window, True)
+
+    cdef bint before(self, double a, double b):
+        return not isnan(b) and (isnan(a) or a < b)
+
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.index()
+
+
+cdef class OrderStatistic(Rolling):
+    """1-D array rolling order statistics
+
+    The valid values in the window are kept sorted, a value is inserted or erased with a binary search.
+    """
+    cdef vector[double] sorted
+    def __init__(self, int window):
+        super(OrderStatistic, self).__init__(window)
+
+    cdef void roll(self, double val):
+        self.barv.push_back(val)
+        cdef double _val = self.barv.front()
+        if not isnan(_val):
+            self.sorted.erase(lower_bound(self.sorted.begin(), self.sorted.end(), _val))
+        self.barv.pop_front()
+        if not isnan(val):
+            self.sorted.insert(upper_bound(self.sorted.begin(), self.sorted.end(), val), val)
+
+    cdef double quantile(self, double qscore):
+        cdef size_t N = self.sorted.size()
+        if N == 0:
+            return NAN
+        if N == 1:
+            return self.sorted[0]
+        cdef double idx_with_fraction = qscore * (N - 1)
+        cdef size_t idx = <size_t> idx_with_fraction
+        cdef double vlow = self.sorted[idx]
+        if idx == idx_with_fraction:
+            return vlow
+        return vlow + (self.sorted[idx + 1] - vlow) * (idx_with_fraction - idx)
+
+    cdef double median(self):
+        cdef size_t N = self.sorted.size()
+        if N == 0:
+            return NAN
+        if N % 2:
+            return self.sorted[N // 2]
+        return (self.sorted[N // 2] + self.sorted[N // 2 - 1]) / 2
+
+    cdef double rank(self, double val):
+        """the average rank of `val` in percentile"""
+        if isnan(val):
+            return NAN
+        cdef double rank_min = lower_bound(self.sorted.begin(), self.sorted.end(), val) - self.sorted.begin() + 1
+        cdef double rank_max = upper_bound(self.sorted.begin(), self.sorted.end(), val) - self.sorted.begin()
+        return (rank_min + rank_max) / 2 / self.sorted.size()
+
+
+cdef class Quantile(OrderStatistic):
+    """1-D array rolling quantile"""
+    cdef double qscore
+    def __init__(self, int window, double qscore):
+        super(Quantile, self).__init__(window)
+        self.qscore = qscore
+
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.quantile(self.qscore)
+
+
+cdef class Median(OrderStatistic):
+    """1-D array rolling median"""
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.median()
+
+
+cdef class Rank(OrderStatistic):
+    """1-D array rolling rank (percentile)"""
+    cdef double update(self, double val):
+        self.roll(val)
+        return self.rank(val)
+
+
+cdef class Mad(Rolling):
+    """1-D array rolling mean absolute deviation, the infinite values are taken as NaN like pandas"""
+    cdef double vsum
+    def __init__(self, int window):
+        super(Mad, self).__init__(window)
+        self.vsum = 0
+
+    cdef double update(self, double val):
+        if not isfinite(val):
+            val = NAN
+        self.barv.push_back(val)
+        if not isnan(self.barv.front()):
+            self.vsum -= self.barv.front()
+        else:
+            self.na_count -= 1
+        self.barv.pop_front()
+        if isnan(val):
+            self.na_count += 1
+        else:
+            self.vsum += val
+        cdef int N = self.window - self.na_count
+        if N == 0:
+            return NAN
+        cdef double mean = self.vsum / N
+        cdef double dev = 0
+        cdef double _val
+        for _val in self.barv:
+            if not isnan(_val):
+                dev += fabs(_val - mean)
+        return dev / N
+
+
+cdef class WMA(Rolling):
+    """1-D array rolling weighted moving average
+
+    The weights are linear in the position of the window and the weighted values are averaged over the valid ones.
+    """
+    cdef long size
+    def __init__(self, int window):
+        super(WMA, self).__init__(window)
+        self.size = 0
+
+    cdef double update(self, double val):
+        self.barv.push_back(val)
+        if isnan(self.barv.front()):
+            self.na_count -= 1
+        self.barv.pop_front()
+        if isnan(val):
+            self.na_count += 1
+        if self.size < self.window:
+            self.size += 1
+        cdef int N = self.window - self.na_count
+        if N == 0:
+            return NAN
+        cdef double w_sum = self.size * (self.size + 1) / 2
+        cdef double vsum = 0
+        cdef long i
+        cdef double _val
+        for i in range(self.size):
+            _val = self.barv[self.window - self.size + i]
+            if not isnan(_val):
+                vsum += (i + 1) / w_sum * _val
+        return vsum / N
+
+
+cdef class PairRolling:
+    """1-D arrays pair rolling"""
+    cdef int window
+    cdef deque[double] barx
+    cdef deque[double] bary
+    def __init__(self, int window):
+        self.window = window
+        cdef int i
+        for i in range(window):
+            self.barx.push_back(NAN)
+            self.bary.push_back(NAN)
+
+    cdef double update(self, double x, double y):
+        pass
+
+    def step(self, np.ndarray a, np.ndarray b):
+        """update the windows with the values of `a` and `b` one by one and return the results, the windows are kept"""
+        return pair_rolling(self, a, b)
+
+
+cdef class CoMoment(PairRolling):
+    """1-D arrays rolling co-moment with the Welford's method, the pairs with NaN (or infinite values, like pandas)
+    are skipped"""
+    cdef int nobs
+    cdef double x_mean
+    cdef double y_mean
+    cdef double x_m2
+    cdef double y_m2
+    cdef double xy_m2
+    def __init__(self, int window):
+        super(CoMoment, self).__init__(window)
+        self.nobs = 0
+        self.x_mean = 0
+        self.y_mean = 0
+        self.x_m2 = 0
+        self.y_m2 = 0
+        self.xy_m2 = 0
+
+    cdef void add(self, double x, double y):
+        self.nobs += 1
+        cdef double dx = x - self.x_mean
+        cdef double dy = y - self.y_mean
+        self.x_mean += dx / self.nobs
+        self.y_mean += dy / self.nobs
+        self.x_m2 += dx * (x - self.x_mean)
+        self.y_m2 += dy * (y - self.y_mean)
+        self.xy_m2 += dx * (y - self.y_mean)
+
+    cdef void remove(self, double x, double y):
+        if self.nobs == 1:
+            self.nobs = 0
+            self.x_mean = 0
+            self.y_mean = 0
+            self.x_m2 = 0
+            self.y_m2 = 0
+            self.xy_m2 = 0
+            return
+        cdef double x_mean = self.x_mean - (x - self.x_mean) / (self.nobs - 1)
+        cdef double y_mean = self.y_mean - (y - self.y_mean) / (self.nobs - 1)
+        self.x_m2 -= (x - x_mean) * (x - self.x_mean)
+        self.y_m2 -= (y - y_mean) * (y - self.y_mean)
+        self.xy_m2 -= (x - x_mean) * (y - self.y_mean)
+        self.x_mean = x_mean
+        self.y_mean = y_mean
+        self.nobs -= 1
+
+    cdef void roll(self, double x, double y):
+        if not isfinite(x) or not isfinite(y):
+            x = y = NAN
+        self.barx.push_back(x)
+        self.bary.push_back(y)
+        cdef double _x = self.barx.front()
+        cdef double _y = self.bary.front()
+        if not isnan(_x) and not isnan(_y):
+            self.remove(_x, _y)
+        self.barx.pop_front()
+        self.bary.pop_front()
+        if not isnan(x) and not isnan(y):
+            self.add(x, y)
+
+
+cdef class Cov(CoMoment):
+    """1-D arrays rolling covariance"""
+    cdef double update(self, double x, double y):
+        self.roll(x, y)
+        if self.nobs < 2:
+            return NAN
+        return self.xy_m2 / (self.nobs - 1)
+
+
+cdef class Corr(CoMoment):
+    """1-D arrays rolling correlation
+
+    The correlation is NaN if either variance of the pairs is no more than the floating point error of the sums of
+    squares, i.e. the values of either side are the same in the window.
+    """
+    cdef double update(self, double x, double y):
+        self.roll(x, y)
+        if self.nobs < 2:
+            return NAN
+        if self.x_m2 <= 1e-12 * (self.nobs * self.x_mean * self.x_mean + fabs(self.x_m2)):
+            return NAN
+        if self.y_m2 <= 1e-12 * (self.nobs * self.y_mean * self.y_mean + fabs(self.y_m2)):
+            return NAN
+        return self.xy_m2 / sqrt(self.x_m2 * self.y_m2)
+
+
 cdef np.ndarray[double, ndim=1] rolling(Rolling r, np.ndarray a):
     cdef int  i
     cdef int  N = len(a)
+    cdef const double[:] values = np.ascontiguousarray(a, dtype=np.float64)
+    cdef np.ndarray[double, ndim=1] ret = np.empty(N)
+    for i in range(N):
+        ret[i] = r.update(values[i])
+    return ret
+
+cdef np.ndarray[double, ndim=1] pair_rolling(PairRolling r, np.ndarray a, np.ndarray b):
+    cdef int  i
+    cdef int  N = len(a)
+    cdef const double[:] x = np.ascontiguousarray(a, dtype=np.float64)
+    cdef const double[:] y = np.ascontiguousarray(b, dtype=np.float64)
     cdef np.ndarray[double, ndim=1] ret = np.empty(N)
     for i in range(N):
-        ret[i] = r.update(a[i])
+        ret[i] = r.update(x[i], y[i])
     return ret
 
+cdef class EWMean:
+    """1-D array exponentially weighted mean, the same as `ewm(alpha=alpha, min_periods=1).mean()` in pandas
+
+    The state is the weighted mean and the weight of it, so it can be resumed (and pickled) at any position.
+    """
+    cdef double alpha
+    cdef double weighted
+    cdef double old_wt
+    def __init__(self, double alpha, double weighted=NAN, double old_wt=1.):
+        self.alpha = alpha
+        self.weighted = weighted
+        self.old_wt = old_wt
+
+    def __reduce__(self):
+        return EWMean, (self.alpha, self.weighted, self.old_wt)
+
+    def step(self, np.ndarray a):
+        """update the mean with the values of `a` one by one and return the results"""
+        cdef int  i
+        cdef int  N = len(a)
+        cdef const double[:] values = np.ascontiguousarray(a, dtype=np.float64)
+        cdef np.ndarray[double, ndim=1] ret = np.empty(N)
+        cdef double old_wt_factor = 1. - self.alpha
+        cdef double old_wt = self.old_wt
+        cdef double weighted = self.weighted
+        cdef double val
+        for i in range(N):
+            val = values[i]
+            if not isnan(weighted):
+                old_wt *= old_wt_factor
+                if not isnan(val):
+                    if weighted != val:
+                        weighted = (old_wt * weighted + val) / (old_wt + 1.)
+                    old_wt += 1.
+            elif not isnan(val):
+                weighted = val
+            ret[i] = weighted
+        self.old_wt = old_wt
+        self.weighted = weighted
+        return ret
+
+def ewm_mean(np.ndarray a, double alpha):
+    """exponentially weighted mean, the same as `ewm(alpha=alpha, min_periods=1).mean()` in pandas"""
+    return EWMean(alpha).step(a)
+
 def rolling_mean(np.ndarray a, int window):
     cdef Mean r = Mean(window)
     return rolling(r, a)
@@ -205,3 +815,63 @@ def rolling_rsquare(np.ndarray a, int window):
 def rolling_resi(np.ndarray a, int window):
     cdef Resi r = Resi(window)
     return rolling(r, a)
+
+def rolling_var(np.ndarray a, int window):
+    cdef Var r = Var(window)
+    return rolling(r, a)
+
+def rolling_std(np.ndarray a, int window):
+    cdef Std r = Std(window)
+    return rolling(r, a)
+
+def rolling_skew(np.ndarray a, int window):
+    cdef Skew r = Skew(window)
+    return rolling(r, a)
+
+def rolling_kurt(np.ndarray a, int window):
+    cdef Kurt r = Kurt(window)
+    return rolling(r, a)
+
+def rolling_max(np.ndarray a, int window):
+    cdef Max r = Max(window)
+    return rolling(r, a)
+
+def rolling_min(np.ndarray a, int window):
+    cdef Min r = Min(window)
+    return rolling(r, a)
+
+def rolling_idxmax(np.ndarray a, int window):
+    cdef IdxMax r = IdxMax(window)
+    return rolling(r, a)
+
+def rolling_idxmin(np.ndarray a, int window):
+    cdef IdxMin r = IdxMin(window)
+    return rolling(r, a)
+
+def rolling_quantile(np.ndarray a, int window, double qscore):
+    cdef Quantile r = Quantile(window, qscore)
+    return rolling(r, a)
+
+def rolling_median(np.ndarray a, int window):
+    cdef Median r = Median(window)
+    return rolling(r, a)
+
+def rolling_rank(np.ndarray a, int window):
+    cdef Rank r = Rank(window)
+    return rolling(r, a)
+
+def rolling_mad(np.ndarray a, int window):
+    cdef Mad r = Mad(window)
+    return rolling(r, a)
+
+def rolling_wma(np.ndarray a, int window):
+    cdef WMA r = WMA(window)
+    return rolling(r, a)
+
+def rolling_cov(np.ndarray a, np.ndarray b, int window):
+    cdef Cov r = Cov(window)
+    return pair_rolling(r, a, b)
+
+def rolling_corr(np.ndarray a, np.ndarray b, int window):
+    cdef Corr r = Corr(window)
+    return pair_rolling(r, a, b)
@@ -6,8 +6,41 @@ from __future__ import division
 from __future__ import print_function
 
 import abc
+import numpy as np
 import pandas as pd
+from typing import List, Tuple, Union
 from ..log import get_module_logger
+from .profiler import Profiler
+
+
+class ArrayConversionError(ValueError):
+    """the data can not be represented by an array of a continuous calendar index range"""
+
+
+def series_to_array(series: pd.Series) -> Tuple[int, np.ndarray]:
+    """convert the result of `Expression.load` to the `(start_index, values)` of `Expression.load_array`
+
+    Raises
+    ------
+    ArrayConversionError
+        if the index of the series is not a continuous range of integers (e.g. the datetime index after resampling)
+    """
+    index = series.index
+    if len(index) == 0:
+        return 0, series.values
+    if isinstance(index, pd.RangeIndex):
+        if index.step == 1:
+            return index.start, series.values
+    elif pd.api.types.is_integer_dtype(index.dtype) and index.is_monotonic_increasing and index.is_unique:
+        if index[-1] - index[0] + 1 == len(index):
+            return int(index[0]), series.values
+    raise ArrayConversionError("The index of the series is not a continuous range of integers")
+
+
+def array_to_series(data: Tuple[int, np.ndarray], name=None) -> pd.Series:
+    """convert the `(start_index, values)` of `Expression.load_array` to the result of `Expression.load`"""
+    start_index, values = data
+    return pd.Series(values, index=pd.RangeIndex(start_index, start_index + len(values)), name=name)
 
 
 class Expression(abc.ABC):
@@ -181,16 +214,73 @@ class Expression(abc.ABC):
         pd.Series
             feature series: The index of the series is the calendar index
         """
-        from .cache import H  # pylint: disable=C0415
+        data = self._load_data(instrument, start_index, end_index, *args)
+        if isinstance(data, tuple):
+            return array_to_series(data, name=str(self))
+        return data
+
+    def load_array(self, instrument, start_index, end_index, *args) -> Tuple[int, np.ndarray]:
+        """load feature as an array
+
+        The operators which `support_array` exchange the `(start_index, values)` of the calendar index range
+        [start_index, start_index + len(values) - 1] instead of pd.Series, so no index is created and aligned for the
+        intermediate results. The other expressions are loaded by `load` and converted by `series_to_array`.
+
+        Parameters
+        ----------
+        the same as `load`
 
+        Returns
+        ----------
+        Tuple[int, np.ndarray]
+            the calendar index of the first value and the values
+
+        Raises
+        ------
+        ArrayConversionError
+            if the result of `load` can not be converted to an array
+        """
+        if not self.support_array():
+            # `load` may be overridden, e.g. `ChangeInstrument`
+            return series_to_array(self.load(instrument, start_index, end_index, *args))
+        data = self._load_data(instrument, start_index, end_index, *args)
+        if isinstance(data, tuple):
+            return data
+        return series_to_array(data)
+
+    def _load_data(self, instrument, start_index, end_index, *args) -> Union[pd.Series, Tuple[int, np.ndarray]]:
+        """load the cached or calculated result in the form it is calculated, a pd.Series or an array"""
+        from .cache import H  # pylint: disable=C0415
+        from .compiler import lookup  # pylint: disable=C0415
+
+        # the sub-expression may have been evaluated by the compiled DAG of the fields
+        data = lookup(self, instrument, start_index, end_index, *args)
+        if data is not None:
+            if Profiler.enabled:
+                Profiler.hit(self)
+            return data
         # cache
         cache_key = str(self), instrument, start_index, end_index, *args
         if cache_key in H["f"]:
+            if Profiler.enabled:
+                Profiler.hit(self)
             return H["f"][cache_key]
         if start_index is not None and end_index is not None and start_index > end_index:
             raise ValueError("Invalid index range: {} {}".format(start_index, end_index))
+        profiling = Profiler.enabled
+        if profiling:
+            start = Profiler.start()
         try:
-            series = self._load_internal(instrument, start_index, end_index, *args)
+            data = None
+            if self.support_array() and isinstance(start_index, (int, np.integer)):
+                try:
+                    data = self._load_array_internal(instrument, start_index, end_index, *args)
+                except ArrayConversionError:
+                    # some sub-expressions can not be loaded as arrays
+                    pass
+            if data is None:
+                data = self._load_internal(instrument, start_index, end_index, *args)
+                data.name = str(self)
         except Exception as e:
             get_module_logger("data").debug(
                 f"Loading data error: instrument={instrument}, expression={str(self)}, "
@@ -198,14 +288,104 @@ class Expression(abc.ABC):
                 f"error info: {str(e)}"
             )
             raise
-        series.name = str(self)
-        H["f"][cache_key] = series
-        return series
+        finally:
+            if profiling:
+                Profiler.stop(self, start, data)
+        H["f"][cache_key] = data
+        return data
 
     @abc.abstractmethod
     def _load_internal(self, instrument, start_index, end_index, *args) -> pd.Series:
         raise NotImplementedError("This function must be implemented in your newly defined feature")
 
+    def _load_array_internal(self, instrument, start_index, end_index, *args) -> Tuple[int, np.ndarray]:
+        raise NotImplementedError("Implement this method if the feature can be calculated with arrays")
+
+    def support_array(self) -> bool:
+        """whether the expression can be calculated with arrays by `_load_array_internal`
+
+        The same as `support_panel`, an operator overriding `_load_internal` is loaded by it as a pd.Series.
+        """
+        return _implements_before(type(self), "_load_array_internal", "_load_internal")
+
+    def load_panel(self, instruments: List[str], start_index, end_index, *args) -> pd.DataFrame:
+        """load the feature of several instruments as a panel
+
+        The expressions which `support_panel` are calculated column-wise for all the instruments at once,
+        the others are loaded instrument by instrument with `load`.
+
+        Parameters
+        ----------
+        instruments : List[str]
+            instrument codes.
+        start_index : int
+            feature start index [in calendar].
+        end_index : int
+            feature end  index  [in calendar].
+
+        *args: the same as `load`
+
+        Returns
+        ----------
+        pd.DataFrame
+            index: calendar index in [start_index, end_index], columns: instruments.
+            The cells out of the data range of an instrument are NaN.
+        """
+        from .compiler import lookup  # pylint: disable=C0415
+
+        panel = lookup(self, instruments, start_index, end_index, *args)
+        if panel is not None:
+            if Profiler.enabled:
+                Profiler.hit(self)
+            return panel
+        if start_index > end_index:
+            raise ValueError("Invalid index range: {} {}".format(start_index, end_index))
+        if not self.support_panel():
+            return self._load_panel_by_instrument(instruments, start_index, end_index, *args)[0]
+        profiling = Profiler.enabled
+        if profiling:
+            start = Profiler.start()
+        try:
+            panel = self._load_panel_internal(instruments, start_index, end_index, *args)
+        except Exception as e:
+            get_module_logger("data").debug(
+                f"Loading panel error: expression={str(self)}, "
+                f"start_index={start_index}, end_index={end_index}, args={args}. "
+                f"error info: {str(e)}"
+            )
+            raise
+        finally:
+            if profiling:
+                Profiler.stop(self, start, panel)
+        return panel
+
+    def _load_panel_internal(self, instruments, start_index, end_index, *args) -> pd.DataFrame:
+        raise NotImplementedError("Implement this method if the feature can be calculated as a panel")
+
+    def _load_panel_by_instrument(self, instruments, start_index, end_index, *args) -> Tuple[pd.DataFrame, np.ndarray]:
+        """load the panel with `load` instrument by instrument
+
+        Returns
+        ----------
+        Tuple[pd.DataFrame, np.ndarray]
+            the panel and a bool array of the same shape, whether a cell is in the index of the result of `load`
+        """
+        index = pd.RangeIndex(start_index, end_index + 1)
+        panel, in_index = {}, np.zeros((len(index), len(instruments)), dtype=bool)
+        for i, inst in enumerate(instruments):
+            series = self.load(inst, start_index, end_index, *args)
+            panel[inst] = series
+            in_index[:, i] = index.isin(series.index)
+        return pd.DataFrame(panel, index=index, columns=instruments), in_index
+
+    def support_panel(self) -> bool:
+        """whether the expression can be calculated column-wise by `_load_panel_internal`
+
+        It is supported only if `_load_panel_internal` is implemented by the same class as `_load_internal` (or a
+        subclass of it), so an operator overriding `_load_internal` is loaded instrument by instrument.
+        """
+        return _implements_before(type(self), "_load_panel_internal", "_load_internal")
+
     @abc.abstractmethod
     def get_longest_back_rolling(self):
         """Get the longest length of historical data the feature has accessed
@@ -235,6 +415,23 @@ class Expression(abc.ABC):
         raise NotImplementedError("This function must be implemented in your newly defined feature")
 
 
+_IMPLEMENTS_BEFORE = {}
+
+
+def _implements_before(klass: type, method: str, other: str) -> bool:
+    """whether `method` is implemented by the same class as `other` or a subclass of it in the MRO of `klass`"""
+    key = klass, method, other
+    if key not in _IMPLEMENTS_BEFORE:
+        _IMPLEMENTS_BEFORE[key] = False
+        for _klass in klass.__mro__:
+            if method in vars(_klass):
+                _IMPLEMENTS_BEFORE[key] = True
+                break
+            if other in vars(_klass):
+                break
+    return _IMPLEMENTS_BEFORE[key]
+
+
 class Feature(Expression):
     """Static Expression
 
@@ -256,6 +453,20 @@ class Feature(Expression):
 
         return FeatureD.feature(instrument, str(self), start_index, end_index, freq)
 
+    def _load_array_internal(self, instrument, start_index, end_index, freq):
+        return series_to_array(self._load_internal(instrument, start_index, end_index, freq))
+
+    def _load_panel_internal(self, instruments, start_index, end_index, freq):
+        from .data import FeatureD  # pylint: disable=C0415
+
+        return FeatureD.feature_panel(instruments, str(self), start_index, end_index, freq)
+
+    def load_panel_index(self, instruments, start_index, end_index, freq) -> np.ndarray:
+        """whether each cell of the panel is in the data range of the instrument"""
+        from .data import FeatureD  # pylint: disable=C0415
+
+        return FeatureD.feature_panel_index(instruments, str(self), start_index, end_index, freq)
+
     def get_longest_back_rolling(self):
         return 0
 
@@ -10,6 +10,7 @@ import sys
 import stat
 import time
 import pickle
+import threading
 import traceback
 import redis_lock
 import contextlib
@@ -25,7 +26,6 @@ from ..utils import (
     hash_args,
     get_redis_connection,
     read_bin,
-    parse_field,
     remove_fields_space,
     normalize_cache_fields,
     normalize_cache_instruments,
@@ -40,13 +40,35 @@ class QlibCacheException(RuntimeError):
     pass
 
 
+def get_nbytes(value) -> int:
+    """the size of `value` in bytes, including the data of the np.ndarray and pandas objects in it"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage())
+    if isinstance(value, (tuple, list)):
+        # e.g. the `(start_index, np.ndarray)` results of the expressions
+        return sys.getsizeof(value) + sum(map(get_nbytes, value))
+    return sys.getsizeof(value)
+
+
 class MemCacheUnit(abc.ABC):
-    """Memory Cache Unit."""
+    """Memory Cache Unit.
+
+    The hits and misses are counted by the membership tests (`key in unit`), which is how the cache is queried.
+    """
 
     def __init__(self, *args, **kwargs):
         self.size_limit = kwargs.pop("size_limit", 0)
         self._size = 0
         self.od = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def __setitem__(self, key, value):
         # TODO: thread safe?__setitem__ failure might cause inconsistent size?
@@ -63,6 +85,7 @@ class MemCacheUnit(abc.ABC):
             # pop the oldest items beyond size limit
             while self._size > self.size_limit:
                 self.popitem(last=False)
+                self.evictions += 1
 
     def __getitem__(self, key):
         v = self.od.__getitem__(key)
@@ -70,7 +93,11 @@ class MemCacheUnit(abc.ABC):
         return v
 
     def __contains__(self, key):
-        return key in self.od
+        if key in self.od:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
 
     def __len__(self):
         return self.od.__len__()
@@ -90,9 +117,22 @@ class MemCacheUnit(abc.ABC):
     def total_size(self):
         return self._size
 
+    @property
+    def stats(self) -> dict:
+        """the counters of the unit"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "length": len(self.od),
+            "total_size": self._size,
+            "size_limit": self.size_limit,
+        }
+
     def clear(self):
         self._size = 0
         self.od.clear()
+        self.hits = self.misses = self.evictions = 0
 
     def popitem(self, last=True):
         k, v = self.od.popitem(last=last)
@@ -130,7 +170,7 @@ class MemCacheSizeofUnit(MemCacheUnit):
         super().__init__(size_limit=size_limit)
 
     def _get_value_size(self, value):
-        return sys.getsizeof(value)
+        return get_nbytes(value)
 
 
 class MemCache:
@@ -144,7 +184,9 @@ class MemCache:
         mem_cache_size_limit:
             cache max size.
         limit_type:
-            length or sizeof; length(call fun: len), size(call fun: sys.getsizeof).
+            length or sizeof; length(call fun: len), sizeof(the size in bytes, please refer to `get_nbytes`).
+
+        The feature cache `H["f"]` is limited by `C.feature_mem_cache_nbytes_limit` bytes instead if it is set.
         """
 
         size_limit = C.mem_cache_size_limit if mem_cache_size_limit is None else mem_cache_size_limit
@@ -159,7 +201,13 @@ class MemCache:
 
         self.__calendar_mem_cache = klass(size_limit)
         self.__instrument_mem_cache = klass(size_limit)
-        self.__feature_mem_cache = klass(size_limit)
+        nbytes_limit = C.get("feature_mem_cache_nbytes_limit")
+        if nbytes_limit is None:
+            self.__feature_mem_cache = klass(size_limit)
+        else:
+            self.__feature_mem_cache = MemCacheSizeofUnit(nbytes_limit)
+        # the handle pool is always bounded by count, each entry holds an open file descriptor
+        self.__mmap_mem_cache = MemCacheLengthUnit(C.mmap_pool_size)
 
     def __getitem__(self, key):
         if key == "c":
@@ -168,6 +216,8 @@ class MemCache:
             return self.__instrument_mem_cache
         elif key == "f":
             return self.__feature_mem_cache
+        elif key == "m":
+            return self.__mmap_mem_cache
         else:
             raise KeyError("Unknown memcache unit")
 
@@ -175,6 +225,162 @@ class MemCache:
         self.__calendar_mem_cache.clear()
         self.__instrument_mem_cache.clear()
         self.__feature_mem_cache.clear()
+        self.__mmap_mem_cache.clear()
+        # the shared features may be outdated too
+        SharedMemCache.clear()
+
+    def stats(self) -> dict:
+        """the counters of the units, e.g. `H.stats()["f"]["hits"]`"""
+        return {key: self[key].stats for key in ["c", "i", "f", "m"]}
+
+
+class SharedMemCache:
+    """The cross-process tier of the leaf features on `multiprocessing.shared_memory`
+
+    The joblib workers of `DatasetProvider.dataset_processor` are separate processes, so a feature loaded by one of
+    them (e.g. the benchmark loaded by `ChangeInstrument` for every instrument, or the `$close` of both the features
+    and the labels) is loaded again by the others. When `C.shared_mem_cache` is enabled, the main process starts a
+    session and the whole series of every leaf feature is put into a named shared memory segment by the first worker
+    loading it. The other workers map the segment and use the values without copying them, so the arrays are
+    read-only.
+
+    A segment is `[ready, start_index, length, dtype]` as int64 followed by the values, `ready` is set after the
+    values are written. The segments are not tracked by the workers, they are removed by the main process with
+    `clear` (e.g. by `H.clear` when the memory caches are cleared) or at exit.
+
+    The segments of a session take at most `C.shared_mem_cache_nbytes_limit` bytes, the bytes used are counted in the
+    `<session>_nbytes` file locked by the writers. A feature is not shared if it is beyond the budget or the free
+    space of `/dev/shm`, since writing to a segment which is larger than the free space crashes with SIGBUS.
+    """
+
+    SHM_DIR = Path("/dev/shm")
+    HEADER_SIZE = 4 * 8
+    # the segments mapped by the current process, they must be kept open while their arrays are used
+    _segments = {}
+    _session = None
+    # the session of the mapped segments
+    _mapped_session = None
+
+    @classmethod
+    def start_session(cls):
+        """start the session of the current process if the shared memory cache is enabled"""
+        if not C.get("shared_mem_cache") or C.get("shared_mem_cache_session") is not None:
+            return
+        if not cls.SHM_DIR.is_dir():
+            get_module_logger("SharedMemCache").warning("The shared memory cache needs POSIX shared memory")
+            return
+        import atexit  # pylint: disable=C0415
+
+        cls._session = f"qlib{os.getpid()}x{int(time.time() * 1000) % 10**8}"
+        C["shared_mem_cache_session"] = cls._session
+        (cls.SHM_DIR / f"{cls._session}_nbytes").write_bytes(np.int64(0).tobytes())
+        atexit.register(cls.clear)
+
+    @classmethod
+    def _close_segments(cls):
+        while cls._segments:
+            shm = cls._segments.popitem()[1][0]
+            # the arrays still used elsewhere keep the mapping until they are released
+            with contextlib.suppress(BufferError):
+                shm.close()
+
+    @classmethod
+    def clear(cls):
+        """close the segments mapped by the current process and remove the segments of the session it started"""
+        cls._close_segments()
+        if cls._session is None or not cls._session.startswith(f"qlib{os.getpid()}x"):
+            # e.g. the forked workers inherit the session of the main process
+            return
+        for path in cls.SHM_DIR.glob(f"{cls._session}_*"):
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+        if C.get("shared_mem_cache_session") == cls._session:
+            C["shared_mem_cache_session"] = None
+        cls._session = None
+
+    @staticmethod
+    def enabled() -> bool:
+        return C.get("shared_mem_cache_session") is not None
+
+    @staticmethod
+    def _name(key: tuple) -> str:
+        return f"{C['shared_mem_cache_session']}_{hash_args(*key)[:24]}"
+
+    @classmethod
+    def _open(cls, name: str, size: int = 0):
+        from multiprocessing import shared_memory, resource_tracker  # pylint: disable=C0415
+
+        shm = shared_memory.SharedMemory(name=name, create=size > 0, size=size)
+        # the segment is removed by the main process instead of the resource tracker of the worker
+        resource_tracker.unregister(shm._name, "shared_memory")  # pylint: disable=W0212
+        return shm
+
+    @classmethod
+    def _reserve(cls, nbytes: int) -> bool:
+        """count `nbytes` in the bytes used by the session, return False if they are beyond the budget"""
+        import fcntl  # pylint: disable=C0415
+
+        limit = C.get("shared_mem_cache_nbytes_limit")
+        stat = os.statvfs(cls.SHM_DIR)
+        if nbytes >= stat.f_bavail * stat.f_frsize:
+            return False
+        try:
+            f = open(cls.SHM_DIR / f"{C['shared_mem_cache_session']}_nbytes", "r+b")
+        except FileNotFoundError:
+            # the session is cleared
+            return False
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            used = int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+            if limit is not None and used + nbytes > limit:
+                return False
+            f.seek(0)
+            f.write(np.int64(used + nbytes).tobytes())
+        return True
+
+    @classmethod
+    def get(cls, key: tuple) -> Union[tuple, None]:
+        """get the `(start_index, values)` of `key`, return None if it is missing"""
+        if cls._mapped_session != C["shared_mem_cache_session"]:
+            # the segments of the previous sessions are removed
+            cls._close_segments()
+            cls._mapped_session = C["shared_mem_cache_session"]
+        name = cls._name(key)
+        if name not in cls._segments:
+            try:
+                shm = cls._open(name)
+            except FileNotFoundError:
+                return None
+            header = np.ndarray(4, dtype=np.int64, buffer=shm.buf)
+            start_index, length, dtype = header[1:]
+            if header[0] == 0:
+                # another process is writing it
+                del header
+                shm.close()
+                return None
+            values = np.ndarray(length, dtype=np.dtype(chr(dtype)), buffer=shm.buf, offset=cls.HEADER_SIZE)
+            values.flags.writeable = False
+            cls._segments[name] = shm, int(start_index), values
+        return cls._segments[name][1:]
+
+    @classmethod
+    def set(cls, key: tuple, start_index: int, values: np.ndarray):
+        """put the `(start_index, values)` of `key`, it is skipped if another process has put it or it is beyond the
+        budget"""
+        name = cls._name(key)
+        size = cls.HEADER_SIZE + max(values.nbytes, 1)
+        if (cls.SHM_DIR / name).exists() or not cls._reserve(size):
+            return
+        try:
+            shm = cls._open(name, size=size)
+        except FileExistsError:
+            return
+        header = np.ndarray(4, dtype=np.int64, buffer=shm.buf)
+        header[1:] = start_index, len(values), ord(values.dtype.char)
+        np.ndarray(len(values), dtype=values.dtype, buffer=shm.buf, offset=cls.HEADER_SIZE)[:] = values
+        header[0] = 1
+        del header
+        shm.close()
 
 
 class MemCacheExpire:
@@ -291,6 +497,141 @@ class CacheUtils:
             current_cache_wlock.release()
 
 
+class CacheLock:
+    """The reader and writer locks of the disk caches shared by the processes using them
+
+    The backend is set by `C.cache_lock`, please refer to `get_cache_lock`.
+    """
+
+    def reader_lock(self, lock_name: str):
+        """the context of reading the cache `lock_name`, the readers of a cache share the lock"""
+        raise NotImplementedError
+
+    def writer_lock(self, lock_name: str):
+        """the context of writing the cache `lock_name`, the writer of a cache excludes the others"""
+        raise NotImplementedError
+
+
+class RedisCacheLock(CacheLock):
+    """The locks on redis (`C.redis_host`, `C.redis_port`, `C.redis_task_db`)
+
+    The disk caches are disabled by `qlib.init` if redis is not available.
+    """
+
+    def __init__(self):
+        self.r = get_redis_connection()
+
+    def reader_lock(self, lock_name: str):
+        return CacheUtils.reader_lock(self.r, lock_name)
+
+    def writer_lock(self, lock_name: str):
+        return CacheUtils.writer_lock(self.r, lock_name)
+
+
+class FileCacheLock(CacheLock):
+    """The locks on the files of `lock_dir` by `fcntl.lockf`, no redis is needed
+
+    The readers take a shared lock and the writer an exclusive lock of the file of the cache, so the processes on
+    one host, or on the hosts mounting `lock_dir` from a shared filesystem supporting POSIX locks (e.g. NFS), are
+    synchronized. The locks are released by the system if a process exits, so no lock is left behind. The lock files
+    are kept.
+
+    The POSIX locks are owned by processes, and closing any file of a process releases all its locks of the file. So
+    the thread locks of the lock files are shared by all the instances in a process (e.g. the caches and the
+    `DiskCacheEvictor` thread), the threads of one process take the lock of a cache one at a time and only the
+    holder has the lock file open. Only POSIX systems are supported.
+    """
+
+    # the path of the lock file -> the thread lock of the process
+    _thread_locks = {}
+    _thread_locks_lock = threading.Lock()
+
+    def __init__(self, lock_dir: Union[str, Path, None] = None, timeout: Union[float, None] = None):
+        """
+        Parameters
+        ----------
+        lock_dir : Union[str, Path, None]
+            the directory of the lock files, `.cache_locks` of the data directory by default.
+        timeout : Union[float, None]
+            the seconds to wait for a lock before raising `QlibCacheException`, None to wait forever.
+        """
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+
+    def _path(self, lock_name: str) -> Path:
+        lock_dir = Path(C.dpm.get_data_uri()).joinpath(".cache_locks") if self.lock_dir is None else self.lock_dir
+        lock_dir = Path(lock_dir).expanduser()
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        return lock_dir.joinpath(hash_args(lock_name) + ".lock")
+
+    @classmethod
+    def _thread_lock(cls, path: Path) -> threading.Lock:
+        with cls._thread_locks_lock:
+            return cls._thread_locks.setdefault(str(path), threading.Lock())
+
+    @classmethod
+    def _reset_thread_locks(cls):
+        # the locks held by the other threads of the parent are never released in a forked child
+        cls._thread_locks = {}
+        cls._thread_locks_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _lock(self, lock_name: str, operation: int):
+        import fcntl  # pylint: disable=C0415
+
+        path = self._path(lock_name)
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        thread_lock = self._thread_lock(path)
+        if not thread_lock.acquire(timeout=-1 if deadline is None else max(deadline - time.time(), 0)):
+            raise QlibCacheException(f"Timeout of waiting for the cache lock {lock_name}")
+        try:
+            with path.open("a+") as f:
+                if deadline is None:
+                    fcntl.lockf(f, operation)
+                else:
+                    while True:
+                        try:
+                            fcntl.lockf(f, operation | fcntl.LOCK_NB)
+                            break
+                        except OSError as e:
+                            if time.time() > deadline:
+                                raise QlibCacheException(f"Timeout of waiting for the cache lock {lock_name}") from e
+                            time.sleep(0.05)
+                try:
+                    yield
+                finally:
+                    fcntl.lockf(f, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+
+    def reader_lock(self, lock_name: str):
+        import fcntl  # pylint: disable=C0415
+
+        return self._lock(lock_name, fcntl.LOCK_SH)
+
+    def writer_lock(self, lock_name: str):
+        import fcntl  # pylint: disable=C0415
+
+        return self._lock(lock_name, fcntl.LOCK_EX)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=FileCacheLock._reset_thread_locks)
+
+
+def get_cache_lock() -> CacheLock:
+    """the lock backend of the disk caches by `C.cache_lock`
+
+    It is the name of a class in `qlib.data` (e.g. "RedisCacheLock" or "FileCacheLock"), a config of a subclass of
+    `CacheLock` (e.g. `{"class": "FileCacheLock", "kwargs": {"lock_dir": "/mnt/shared/locks"}}`) or an instance.
+    """
+    from ..utils import init_instance_by_config, get_module_by_module_path  # pylint: disable=C0415
+
+    return init_instance_by_config(
+        C.get("cache_lock", "RedisCacheLock"), get_module_by_module_path("qlib.data"), accept_types=CacheLock
+    )
+
+
 class BaseProviderCache:
     """Provider cache base class"""
 
@@ -344,6 +685,17 @@ class ExpressionCache(BaseProviderCache):
         except NotImplementedError:
             return self.provider.expression(instrument, field, start_time, end_time, freq)
 
+    def expressions(self, instrument, fields, start_time, end_time, freq):
+        """Get the data of several expressions, each of them is loaded by `expression` to make use of the cache.
+
+        .. note:: Same interface as `expressions` method in expression provider
+        """
+        return {field: self.expression(instrument, field, start_time, end_time, freq) for field in fields}
+
+    def expression_panels(self, instruments, fields, start_time, end_time, freq):
+        """The expression cache works instrument by instrument, so the panels are not supported."""
+        raise NotImplementedError("The expressions can't be evaluated as panels with expression cache")
+
     def _uri(self, instrument, field, start_time, end_time, freq):
         """Get expression cache file uri.
 
@@ -491,7 +843,7 @@ class DiskExpressionCache(ExpressionCache):
 
     def __init__(self, provider, **kwargs):
         super(DiskExpressionCache, self).__init__(provider)
-        self.r = get_redis_connection()
+        self.lock = get_cache_lock()
         # remote==True means client is using this module, writing behaviour will not be allowed.
         self.remote = kwargs.get("remote", False)
 
@@ -503,6 +855,13 @@ class DiskExpressionCache(ExpressionCache):
         instrument = str(instrument).lower()
         return hash_args(instrument, field, freq)
 
+    def _reader_lock(self, cache_uri, freq):
+        """the reader lock of an entry if the disk caches are limited, otherwise the entries are never removed while
+        they are read (please refer to `DiskCacheEvictor`)"""
+        if C.get("disk_cache_size_limit") is None:
+            return contextlib.nullcontext()
+        return self.lock.reader_lock(f"{str(C.dpm.get_data_uri(freq))}:expression-{cache_uri}")
+
     def _expression(self, instrument, field, start_time=None, end_time=None, freq="day"):
         _cache_uri = self._uri(instrument=instrument, field=field, start_time=None, end_time=None, freq=freq)
         _instrument_dir = self.get_cache_dir(freq).joinpath(instrument.lower())
@@ -521,32 +880,37 @@ class DiskExpressionCache(ExpressionCache):
 
             """
             # FIXME: Removing the reader lock may result in conflicts.
-            # with CacheUtils.reader_lock(self.r, 'expression-%s' % _cache_uri):
-
-            # modify expression cache meta file
-            try:
-                # FIXME: Multiple readers may result in error visit number
-                if not self.remote:
-                    CacheUtils.visit(cache_path)
-                series = read_bin(cache_path, start_index, end_index)
-                return series
-            except Exception:
-                series = None
-                self.logger.error("reading %s file error : %s" % (cache_path, traceback.format_exc()))
-            return series
+            # The lock is only taken if the entries may be removed by `DiskCacheEvictor`.
+            with self._reader_lock(_cache_uri, freq):
+                # the entry may be evicted before the lock is acquired
+                if self.check_cache_exists(cache_path, suffix_list=[".meta"]):
+                    # modify expression cache meta file
+                    try:
+                        # FIXME: Multiple readers may result in error visit number
+                        if not self.remote:
+                            CacheUtils.visit(cache_path)
+                        series = read_bin(cache_path, start_index, end_index)
+                        return series
+                    except Exception:
+                        series = None
+                        self.logger.error("reading %s file error : %s" % (cache_path, traceback.format_exc()))
+                    return series
+            # the evicted entry is generated again
+            return self._expression(instrument, field, start_time, end_time, freq)
         else:
             # normalize field
             field = remove_fields_space(field)
             # cache unavailable, generate the cache
             _instrument_dir.mkdir(parents=True, exist_ok=True)
-            if not isinstance(eval(parse_field(field)), Feature):
+            if not isinstance(self.provider.get_expression_instance(field), Feature):
                 # When the expression is not a raw feature
                 # generate expression cache if the feature is not a Feature
                 # instance
+                start = time.time()
                 series = self.provider.expression(instrument, field, _calendar[0], _calendar[-1], freq)
                 if not series.empty:
                     # This expression is empty, we don't generate any cache for it.
-                    with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:expression-{_cache_uri}"):
+                    with self.lock.writer_lock(f"{str(C.dpm.get_data_uri(freq))}:expression-{_cache_uri}"):
                         self.gen_expression_cache(
                             expression_data=series,
                             cache_path=cache_path,
@@ -554,6 +918,7 @@ class DiskExpressionCache(ExpressionCache):
                             field=field,
                             freq=freq,
                             last_update=str(_calendar[-1]),
+                            compute_time=time.time() - start,
                         )
                     return series.loc[start_index:end_index]
                 else:
@@ -562,13 +927,16 @@ class DiskExpressionCache(ExpressionCache):
                 # If the expression is a raw feature(such as $close, $open)
                 return self.provider.expression(instrument, field, start_time, end_time, freq)
 
-    def gen_expression_cache(self, expression_data, cache_path, instrument, field, freq, last_update):
-        """use bin file to save like feature-data."""
+    def gen_expression_cache(self, expression_data, cache_path, instrument, field, freq, last_update, compute_time=0.0):
+        """use bin file to save like feature-data.
+
+        `compute_time` is the seconds taken to calculate `expression_data`, please refer to `DiskCacheEvictor`.
+        """
         # Make sure the cache runs right when the directory is deleted
         # while running
         meta = {
             "info": {"instrument": instrument, "field": field, "freq": freq, "last_update": last_update},
-            "meta": {"last_visit": time.time(), "visits": 1},
+            "meta": {"last_visit": time.time(), "visits": 1, "compute_time": compute_time},
         }
         self.logger.debug(f"generating expression cache: {meta}")
         self.clear_cache(cache_path)
@@ -590,7 +958,7 @@ class DiskExpressionCache(ExpressionCache):
             self.clear_cache(cp_cache_uri)
             return 2
 
-        with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri())}:expression-{cache_uri}"):
+        with self.lock.writer_lock(f"{str(C.dpm.get_data_uri())}:expression-{cache_uri}"):
             with meta_path.open("rb") as f:
                 d = pickle.load(f)
             instrument = d["info"]["instrument"]
@@ -648,7 +1016,7 @@ class DiskDatasetCache(DatasetCache):
 
     def __init__(self, provider, **kwargs):
         super(DiskDatasetCache, self).__init__(provider)
-        self.r = get_redis_connection()
+        self.lock = get_cache_lock()
         self.remote = kwargs.get("remote", False)
 
     @staticmethod
@@ -670,6 +1038,8 @@ class DiskDatasetCache(DatasetCache):
         :param fields: The fields order of the dataset cache is sorted. So rearrange the columns to make it consistent.
         :return:
         """
+        if cls.is_npy_cache(cache_path):
+            return cls.read_npy_cache(cache_path, start_time, end_time, fields)
 
         im = DiskDatasetCache.IndexManager(cache_path)
         index_data = im.get_index(start_time, end_time)
@@ -692,6 +1062,126 @@ class DiskDatasetCache(DatasetCache):
                 df = pd.DataFrame(columns=fields)
         return df
 
+    @staticmethod
+    def is_npy_cache(cache_path: Union[str, Path]) -> bool:
+        """whether the cache is in the "npy" format, otherwise it is a HDF file"""
+        with Path(cache_path).open("rb") as f:
+            return f.read(len(np.lib.format.MAGIC_PREFIX)) == np.lib.format.MAGIC_PREFIX
+
+    @staticmethod
+    def load_npy_index(cache_path: Union[str, Path]) -> dict:
+        """load the index of a cache in the "npy" format
+
+        :return: a dict of
+            - datetime: the datetimes of the cache, sorted;
+            - end: the end (excluded) of the rows of each datetime, the rows are sorted by <datetime, instrument>;
+            - instruments: the instruments of the cache, sorted;
+            - instrument: the position in `instruments` of each row;
+            - fields: the cache fields of the columns.
+        """
+        with np.load(Path(cache_path).with_suffix(".index")) as index:
+            return {key: index[key] for key in index.files}
+
+    @classmethod
+    def read_npy_cache(cls, cache_path: Union[str, Path], start_time, end_time, fields):
+        """read the data between `start_time` and `end_time` from a cache in the "npy" format
+
+        The rows of the datetimes are contiguous, so they are located by the index and sliced as a view of the memory
+        mapped data file without reading the others. The pages read are in the page cache and shared by all the
+        processes reading the cache.
+
+        .. note:: The rows are stored by <datetime, instrument> so that `update` appends the new dates without
+            rewriting the file, but the result is ordered by <instrument, datetime>. So the slice is copied once by a
+            gather in the stable order of the instruments (the datetimes are already sorted), the cost is linear in
+            the size of the slice, not of the cache.
+        """
+        index = cls.load_npy_index(cache_path)
+        calendar = pd.DatetimeIndex(index["datetime"])
+        left, right, _ = calendar.slice_indexer(start_time, end_time).indices(len(calendar))
+        right = max(left, right)
+        bounds = np.concatenate([[0], index["end"]])[left : right + 1]
+        start, stop = bounds[0], bounds[-1]
+
+        columns = pd.Index(index["fields"]).get_indexer(remove_fields_space(fields))
+        if (columns < 0).any():
+            raise KeyError(f"{[f for f, c in zip(fields, columns) if c < 0]} not in the dataset cache {cache_path}")
+        inst_codes = index["instrument"][start:stop]
+        dt_codes = np.repeat(np.arange(right - left), np.diff(bounds))
+        order = np.argsort(inst_codes, kind="stable")
+        values = np.load(cache_path, mmap_mode="r")[:, start:stop]
+        data = np.asarray(values[columns[:, None], order])
+
+        df_index = pd.MultiIndex(
+            levels=[pd.Index(index["instruments"].tolist()), calendar[left:right]],
+            codes=[inst_codes[order], dt_codes[order]],
+            names=["instrument", "datetime"],
+            verify_integrity=False,
+        ).remove_unused_levels()
+        return pd.DataFrame(data.T, index=df_index, columns=[str(i) for i in fields])
+
+    @staticmethod
+    def write_npy_cache(cache_path: Path, data: pd.DataFrame, n_keep: int = 0):
+        """write `data` to a cache in the "npy" format after the first `n_keep` rows of the existing cache
+
+        .. note:: This function does not consider the cache read write lock.
+
+        The data and the index are written to temporary files, then the data replaces `cache_path` before the index is
+        replaced. So the index never describes more rows than the data, even for the readers without the lock (the
+        processes which mapped the old data file keep reading it).
+
+        :param cache_path: The path of the cache.
+        :param data: The data indexed by <datetime, instrument> and sorted, with the cache fields as columns.
+        :param n_keep: The number of rows of the existing cache to keep, 0 to write a new cache.
+        """
+        data_index = data.index.remove_unused_levels()
+        new_calendar, new_instruments = data_index.levels
+        new_ends = np.cumsum(np.bincount(data_index.codes[0], minlength=len(new_calendar)))
+        if n_keep > 0:
+            index = DiskDatasetCache.load_npy_index(cache_path)
+            old_values = np.load(cache_path, mmap_mode="r")
+            fields = list(index["fields"])
+            n_dates = np.searchsorted(index["end"], n_keep, side="right")
+            instruments = pd.Index(index["instruments"].tolist()).union(new_instruments)
+            old_codes = instruments.get_indexer(index["instruments"].tolist())[index["instrument"][:n_keep]]
+            calendar = np.concatenate([index["datetime"][:n_dates], new_calendar.values])
+            ends = np.concatenate([index["end"][:n_dates], n_keep + new_ends])
+            dtype = old_values.dtype
+        else:
+            old_values = None
+            fields = list(data.columns)
+            instruments = new_instruments
+            old_codes = np.empty(0, dtype=np.int32)
+            calendar, ends = new_calendar.values, new_ends
+            dtype = np.result_type(*data.dtypes)
+        codes = np.concatenate([old_codes, instruments.get_indexer(new_instruments)[data_index.codes[1]]])
+
+        # one contiguous block per field, so a field of a time slice is a contiguous range of the file
+        values = np.lib.format.open_memmap(
+            cache_path.with_suffix(".data"), mode="w+", dtype=dtype, shape=(len(fields), n_keep + len(data))
+        )
+        for i, field in enumerate(fields):
+            if old_values is not None:
+                values[i, :n_keep] = old_values[i, :n_keep]
+            values[i, n_keep:] = data[field].values
+        values.flush()
+        del values, old_values
+
+        index_path = cache_path.with_suffix(".index")
+        tmp_path = cache_path.with_suffix(".index_tmp")
+        with tmp_path.open("wb") as f:
+            np.savez(
+                f,
+                datetime=calendar,
+                end=ends.astype(np.int64),
+                instruments=np.array(list(instruments), dtype=str),
+                instrument=codes.astype(np.int32),
+                fields=np.array(fields, dtype=str),
+            )
+        os.replace(cache_path.with_suffix(".data"), cache_path)
+        os.replace(tmp_path, index_path)
+        # The index should be readable for all users
+        index_path.chmod(stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH)
+
     def _dataset(
         self, instruments, fields, start_time=None, end_time=None, freq="day", disk_cache=0, inst_processors=[]
     ):
@@ -724,9 +1214,13 @@ class DiskDatasetCache(DatasetCache):
         if self.check_cache_exists(cache_path):
             if disk_cache == 1:
                 # use cache
-                with CacheUtils.reader_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
-                    CacheUtils.visit(cache_path)
-                    features = self.read_data_from_cache(cache_path, start_time, end_time, fields)
+                with self.lock.reader_lock(f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
+                    # the entry may be evicted before the lock is acquired, it is generated again
+                    if self.check_cache_exists(cache_path):
+                        CacheUtils.visit(cache_path)
+                        features = self.read_data_from_cache(cache_path, start_time, end_time, fields)
+                    else:
+                        gen_flag = True
             elif disk_cache == 2:
                 gen_flag = True
         else:
@@ -734,7 +1228,7 @@ class DiskDatasetCache(DatasetCache):
 
         if gen_flag:
             # cache unavailable, generate the cache
-            with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
+            with self.lock.writer_lock(f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
                 features = self.gen_dataset_cache(
                     cache_path=cache_path,
                     instruments=instruments,
@@ -775,12 +1269,12 @@ class DiskDatasetCache(DatasetCache):
 
         if self.check_cache_exists(cache_path):
             self.logger.debug(f"The cache dataset has already existed {cache_path}. Return the uri directly")
-            with CacheUtils.reader_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
+            with self.lock.reader_lock(f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
                 CacheUtils.visit(cache_path)
             return _cache_uri
         else:
             # cache unavailable, generate the cache
-            with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
+            with self.lock.writer_lock(f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
                 self.gen_dataset_cache(
                     cache_path=cache_path,
                     instruments=instruments,
@@ -884,6 +1378,10 @@ class DiskDatasetCache(DatasetCache):
 
             - This is a hdf file sorted by datetime
 
+        If `C.dataset_cache_format` is "npy", the data is a `.npy` file of shape (fields, rows), one contiguous block
+        per field with the rows sorted by <datetime, instrument>, and the index is a `.npz` file of the datetimes, the
+        end of their rows, and the instrument of each row. Please refer to `load_npy_index`.
+
         :param cache_path:  The path to store the cache.
         :param instruments:  The instruments to store the cache.
         :param fields:  The fields to store the cache.
@@ -902,9 +1400,11 @@ class DiskDatasetCache(DatasetCache):
         # while running
         self.clear_cache(cache_path)
 
+        start = time.time()
         features = self.provider.dataset(
             instruments, fields, _calendar[0], _calendar[-1], freq, inst_processors=inst_processors
         )
+        compute_time = time.time() - start
 
         if features.empty:
             return features
@@ -912,16 +1412,22 @@ class DiskDatasetCache(DatasetCache):
         # swap index and sorted
         features = features.swaplevel("instrument", "datetime").sort_index()
 
+        cache_format = C.get("dataset_cache_format", "hdf")
+        if cache_format not in ("hdf", "npy"):
+            raise ValueError(f"Unsupported dataset cache format: {cache_format}")
+        cache_to_orig_map = dict(zip(remove_fields_space(features.columns), features.columns))
+        orig_to_cache_map = dict(zip(features.columns, remove_fields_space(features.columns)))
+        cache_features = features[list(cache_to_orig_map.values())].rename(columns=orig_to_cache_map)
+        # cache columns
+        cache_columns = sorted(cache_features.columns)
+        cache_features = cache_features.loc[:, cache_columns]
+        cache_features = cache_features.loc[:, ~cache_features.columns.duplicated()]
         # write cache data
-        with pd.HDFStore(str(cache_path.with_suffix(".data"))) as store:
-            cache_to_orig_map = dict(zip(remove_fields_space(features.columns), features.columns))
-            orig_to_cache_map = dict(zip(features.columns, remove_fields_space(features.columns)))
-            cache_features = features[list(cache_to_orig_map.values())].rename(columns=orig_to_cache_map)
-            # cache columns
-            cache_columns = sorted(cache_features.columns)
-            cache_features = cache_features.loc[:, cache_columns]
-            cache_features = cache_features.loc[:, ~cache_features.columns.duplicated()]
-            store.append(DatasetCache.HDF_KEY, cache_features, append=False)
+        if cache_format == "npy":
+            self.write_npy_cache(cache_path, cache_features)
+        else:
+            with pd.HDFStore(str(cache_path.with_suffix(".data"))) as store:
+                store.append(DatasetCache.HDF_KEY, cache_features, append=False)
         # write meta file
         meta = {
             "info": {
@@ -931,20 +1437,21 @@ class DiskDatasetCache(DatasetCache):
                 "last_update": str(_calendar[-1]),  # The last_update to store the cache
                 "inst_processors": inst_processors,  # The last_update to store the cache
             },
-            "meta": {"last_visit": time.time(), "visits": 1},
+            "meta": {"last_visit": time.time(), "visits": 1, "compute_time": compute_time},
         }
         with cache_path.with_suffix(".meta").open("wb") as f:
             pickle.dump(meta, f, protocol=C.dump_protocol_version)
         cache_path.with_suffix(".meta").chmod(stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH)
         # write index file
-        im = DiskDatasetCache.IndexManager(cache_path)
-        index_data = im.build_index_from_data(features)
-        im.update(index_data)
-
-        # rename the file after the cache has been generated
-        # this doesn't work well on windows, but our server won't use windows
-        # temporarily
-        cache_path.with_suffix(".data").rename(cache_path)
+        if cache_format == "hdf":
+            im = DiskDatasetCache.IndexManager(cache_path)
+            index_data = im.build_index_from_data(features)
+            im.update(index_data)
+
+            # rename the file after the cache has been generated
+            # this doesn't work well on windows, but our server won't use windows
+            # temporarily
+            cache_path.with_suffix(".data").rename(cache_path)
         # the fields of the cached features are converted to the original fields
         return features.swaplevel("datetime", "instrument")
 
@@ -957,7 +1464,7 @@ class DiskDatasetCache(DatasetCache):
             return 2
 
         im = DiskDatasetCache.IndexManager(cp_cache_uri)
-        with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri())}:dataset-{cache_uri}"):
+        with self.lock.writer_lock(f"{str(C.dpm.get_data_uri())}:dataset-{cache_uri}"):
             with meta_path.open("rb") as f:
                 d = pickle.load(f)
             instruments = d["info"]["instruments"]
@@ -965,7 +1472,15 @@ class DiskDatasetCache(DatasetCache):
             freq = d["info"]["freq"]
             last_update_time = d["info"]["last_update"]
             inst_processors = d["info"].get("inst_processors", [])
-            index_data = im.get_index()
+            is_npy = self.is_npy_cache(cp_cache_uri)
+            if is_npy:
+                npy_index = self.load_npy_index(cp_cache_uri)
+                index_data = pd.DataFrame(
+                    {"start": np.concatenate([[0], npy_index["end"][:-1]]), "end": npy_index["end"]},
+                    index=pd.DatetimeIndex(npy_index["datetime"]),
+                )
+            else:
+                index_data = im.get_index()
 
             self.logger.debug("Updating dataset: {}".format(d))
             from .data import Inst  # pylint: disable=C0415
@@ -1030,28 +1545,33 @@ class DiskDatasetCache(DatasetCache):
                 else:
                     return 0  # No data to update cache
 
-                store = pd.HDFStore(cp_cache_uri)
-                # FIXME:
-                # Because the feature cache are stored as .bin file.
-                # So the series read from features are all float32.
-                # However, the first dataset cache is calculated based on the
-                # raw data. So the data type may be float64.
-                # Different data type will result in failure of appending data
-                if "/{}".format(DatasetCache.HDF_KEY) in store.keys():
-                    schema = store.select(DatasetCache.HDF_KEY, start=0, stop=0)
-                    for col, dtype in schema.dtypes.items():
-                        data[col] = data[col].astype(dtype)
-                if rm_lines > 0:
-                    store.remove(key=im.KEY, start=-rm_lines)
-                store.append(DatasetCache.HDF_KEY, data)
-                store.close()
-
-                # update index file
-                new_index_data = im.build_index_from_data(
-                    data.loc(axis=0)[whole_calendar[current_index] :, :],
-                    start_index=0 if index_data.empty else index_data["end"].iloc[-1],
-                )
-                im.append_index(new_index_data)
+                if is_npy:
+                    n_rows = 0 if index_data.empty else index_data["end"].iloc[-1].item()
+                    # the processes reading the cache keep mapping the replaced file
+                    self.write_npy_cache(cp_cache_uri, data, n_keep=n_rows - rm_lines)
+                else:
+                    store = pd.HDFStore(cp_cache_uri)
+                    # FIXME:
+                    # Because the feature cache are stored as .bin file.
+                    # So the series read from features are all float32.
+                    # However, the first dataset cache is calculated based on the
+                    # raw data. So the data type may be float64.
+                    # Different data type will result in failure of appending data
+                    if "/{}".format(DatasetCache.HDF_KEY) in store.keys():
+                        schema = store.select(DatasetCache.HDF_KEY, start=0, stop=0)
+                        for col, dtype in schema.dtypes.items():
+                            data[col] = data[col].astype(dtype)
+                    if rm_lines > 0:
+                        store.remove(key=im.KEY, start=-rm_lines)
+                    store.append(DatasetCache.HDF_KEY, data)
+                    store.close()
+
+                    # update index file
+                    new_index_data = im.build_index_from_data(
+                        data.loc(axis=0)[whole_calendar[current_index] :, :],
+                        start_index=0 if index_data.empty else index_data["end"].iloc[-1],
+                    )
+                    im.append_index(new_index_data)
 
                 # update meta file
                 d["info"]["last_update"] = str(new_calendar[-1])
@@ -1060,6 +1580,124 @@ class DiskDatasetCache(DatasetCache):
                 return 0
 
 
+class DiskCacheEvictor:
+    """Keep the disk caches (`DiskExpressionCache` and `DiskDatasetCache`) of a data uri within a budget in bytes
+
+    `CacheUtils.visit` records the last visit of the entries in their `.meta` files. The entries beyond the budget
+    are removed in the descending order of their idle time divided by `1 + compute_time`, the seconds taken to
+    calculate them when they were generated. So an entry expensive to recompute is kept longer, and the entries
+    without a recorded cost are evicted in the LRU order. Each entry is removed under the writer lock of its cache,
+    and `DiskExpressionCache` reads its entries under the reader lock if `C.disk_cache_size_limit` is set.
+
+    .. code-block:: python
+
+        DiskCacheEvictor(size_limit=100 * 1024**3).evict()
+
+    The evictions run every `C.disk_cache_evict_interval` seconds in a background thread of the process calling
+    `qlib.init` (please refer to `start`), or by `scripts/evict_cache.py`.
+    """
+
+    _thread = None
+    _stopped = None
+
+    def __init__(self, size_limit: int = None, freq: str = None):
+        """
+        Parameters
+        ----------
+        size_limit : int
+            the budget in bytes, `C.disk_cache_size_limit` by default.
+        freq : str
+            the freq of the data uri.
+        """
+        self.size_limit = C.get("disk_cache_size_limit") if size_limit is None else size_limit
+        self.data_uri = C.dpm.get_data_uri(freq)
+        self.lock = get_cache_lock()
+        self.logger = get_module_logger(self.__class__.__name__)
+
+    def entries(self) -> pd.DataFrame:
+        """the entries of the caches in the order of eviction
+
+        Returns
+        -------
+        pd.DataFrame
+            one row per entry with the columns path, cache ("expression" or "dataset"), nbytes, last_visit and
+            compute_time.
+        """
+        metas = [("expression", p) for p in self.data_uri.joinpath(C.features_cache_dir_name).glob("*/*.meta")]
+        metas += [("dataset", p) for p in self.data_uri.joinpath(C.dataset_cache_dir_name).glob("*.meta")]
+        rows = []
+        for cache, meta_path in metas:
+            cache_path = meta_path.with_suffix("")
+            try:
+                with meta_path.open("rb") as f:
+                    meta = pickle.load(f)["meta"]
+                last_visit, compute_time = float(meta["last_visit"]), float(meta.get("compute_time", 0.0))
+            except Exception:
+                # the corrupted entries are evicted first
+                last_visit = compute_time = 0.0
+            nbytes = 0
+            for p in [cache_path, meta_path, cache_path.with_suffix(".index")]:
+                try:
+                    nbytes += p.stat().st_size
+                except FileNotFoundError:
+                    pass
+            rows.append([cache_path, cache, nbytes, last_visit, compute_time])
+        entries = pd.DataFrame(rows, columns=["path", "cache", "nbytes", "last_visit", "compute_time"])
+        idle = time.time() - entries["last_visit"]
+        order = (idle / (1 + entries["compute_time"])).sort_values(ascending=False, kind="stable").index
+        return entries.loc[order].reset_index(drop=True)
+
+    def evict(self) -> int:
+        """remove the entries beyond the budget, return the bytes removed"""
+        if self.size_limit is None:
+            return 0
+        entries = self.entries()
+        excess = entries["nbytes"].sum() - self.size_limit
+        if excess <= 0:
+            return 0
+
+        removed = 0
+        for path, cache, nbytes in entries[["path", "cache", "nbytes"]].itertuples(index=False):
+            if removed >= excess:
+                break
+            with self.lock.writer_lock(f"{str(self.data_uri)}:{cache}-{path.name}"):
+                # without the meta, the entry is regarded as missing by the readers
+                for p in [path.with_suffix(".meta"), path.with_suffix(".index"), path]:
+                    if p.exists():
+                        p.unlink()
+            removed += nbytes
+        self.logger.info(f"{removed} bytes of the disk caches in {self.data_uri} are evicted")
+        return removed
+
+    @classmethod
+    def start(cls, interval: float, size_limit: int = None):
+        """evict the caches of the data uris of `C.provider_uri` every `interval` seconds in a daemon thread"""
+        cls.stop()
+        freqs = {str(C.dpm.get_data_uri(freq)): freq for freq in C.dpm.provider_uri}.values()
+        evictors = [cls(size_limit, freq) for freq in freqs]
+        stopped = threading.Event()
+
+        def _run():
+            while not stopped.wait(interval):
+                for evictor in evictors:
+                    try:
+                        evictor.evict()
+                    except Exception:
+                        evictor.logger.warning(f"evicting {evictor.data_uri} failed: {traceback.format_exc()}")
+
+        cls._stopped = stopped
+        cls._thread = threading.Thread(target=_run, name="DiskCacheEvictor", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        """stop the thread started by `start`"""
+        if cls._thread is not None:
+            cls._stopped.set()
+            cls._thread.join()
+            cls._thread = cls._stopped = None
+
+
 class SimpleDatasetCache(DatasetCache):
     """Simple dataset cache that can be used locally or on client."""
 
@@ -0,0 +1,536 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Expression compiler
+
+The fields of a dataset query are compiled into one DAG, the structurally identical sub-expressions (e.g. the
+`Ref($close, 1)` and `Mean($close, 20)` shared by the fields of Alpha158) become one node and each node is evaluated
+exactly once per instrument.
+
+- A node is identified by `str(expression)` and the index range it is loaded with, because the result of a rolling
+  operator depends on where the data starts. The range-invariant nodes (the leaf features and the element-wise
+  operators over them) are loaded only once with the union of the requested ranges and sliced for each consumer.
+- The nodes are evaluated in topological order and the intermediate results are released as soon as their last
+  consumer is evaluated.
+- The nodes are kept in the form they are calculated in, mostly `(start_index, np.ndarray)` pairs instead of
+  pd.Series (please refer to `Expression.load_array`), and only the results of the roots are converted to pd.Series.
+- The expressions are still loaded by `Expression.load`, which looks the children up in the evaluation scope
+  before calculating them. So an operator that is unknown to the compiler (or loads its children with other
+  instruments or ranges) simply falls back to the normal calculation.
+
+The DAG can also be evaluated for all the instruments at once with `Expression.load_panel`, please refer to
+`CompiledExpressions.load_panel`.
+
+When the DAG is evaluated instrument by instrument, the connected element-wise operators (e.g. the `Sub`, `Add` and
+`Div` of `($close-$open)/($high-$low+1e-12)`) are fused into one node calculated by a generated function, please refer
+to `FusedKernel`. The intermediate results are not cached or kept in the evaluation scope, and the long arrays are
+calculated block by block, so the temporary arrays stay small.
+"""
+
+import threading
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .base import Expression, Feature, PFeature, array_to_series
+from .ops import If, Mask, NpElemOperator, NpPairOperator, PairRolling, Rolling, Sign, TResample
+from .profiler import Profiler
+
+# the operators which load their sub-expressions with the same instrument and range as themselves
+_TRANSPARENT_OPERATORS = (NpElemOperator, NpPairOperator, If, Rolling, PairRolling, TResample)
+
+# the implementations which calculate element-wise and align the data by index,
+# so the result in a range is the same as the result in a wider range sliced to it
+_ELEMENT_WISE_METHODS = {
+    "_load_internal": (NpElemOperator._load_internal, NpPairOperator._load_internal),
+    "_load_array_internal": (NpElemOperator._load_array_internal, NpPairOperator._load_array_internal),
+    "_compute": (NpElemOperator._compute, Sign._compute),
+}
+
+# the number of elements calculated at once by a `FusedKernel`
+_FUSION_BLOCK_SIZE = 1 << 14
+
+_scope = threading.local()
+
+
+def get_children(expression: Expression) -> List[Expression]:
+    """get the sub-expressions which are loaded with the same instrument and range as `expression`"""
+    if not isinstance(expression, _TRANSPARENT_OPERATORS) or isinstance(expression, Mask):
+        return []
+    return [v for v in vars(expression).values() if isinstance(v, Expression)]
+
+
+def _slice(data, start_index: int, end_index: int):
+    """slice the pd.Series (or pd.DataFrame) or `(start_index, np.ndarray)` pair to [start_index, end_index]"""
+    if isinstance(data, tuple):
+        data_start, values = data
+        start = max(start_index, data_start)
+        return start, values[start - data_start : max(end_index - data_start + 1, 0)]
+    return data.loc[start_index:end_index]
+
+
+def lookup(expression: Expression, instrument: str, start_index: int, end_index: int, *args):
+    """look the result of `expression` up in the evaluation scope of the current thread, return None if missing
+
+    The result is a pd.Series (a pd.DataFrame when evaluated as panels) or a `(start_index, np.ndarray)` pair.
+    """
+    scope = getattr(_scope, "value", None)
+    if scope is None:
+        return None
+    compiled, _instrument, _args, memo = scope
+    if instrument != _instrument or args != _args:
+        return None
+    return compiled.get(memo, expression, start_index, end_index)
+
+
+def _load_node(expression: Expression, instrument: str, start_index: int, end_index: int, *args):
+    """load a node of the DAG in the form it is calculated in, the same as `Expression.load_array`
+
+    The expressions overriding `load` (e.g. `ChangeInstrument`, which loads its feature with another instrument) and
+    the ones which do not `support_array` are loaded by `load`.
+    """
+    if type(expression).load is not Expression.load or not expression.support_array():
+        return expression.load(instrument, start_index, end_index, *args)
+    return expression._load_data(instrument, start_index, end_index, *args)
+
+
+def _is_fusible(expression: Expression) -> bool:
+    """whether `expression` is calculated element-wise from the arrays of its sub-expressions with the same index"""
+    if type(expression).load is not Expression.load or not expression.support_array():
+        return False
+    for klass in (NpElemOperator, NpPairOperator, If):
+        if isinstance(expression, klass):
+            return type(expression)._load_array_internal is klass._load_array_internal
+    return False
+
+
+class FusedKernel:
+    """The element-wise operators of a sub-tree calculated by one generated function
+
+    The function calls the same numpy functions as the operators (or their `_compute`), so the result is exactly the
+    same as calculating them one by one. E.g. `Div(Sub($close,$open),Add(Sub($high,$low),1e-12))` becomes
+
+    .. code-block:: python
+
+        def kernel(x0, x1, x2, x3):
+            t0 = f0(x0, x1)
+            t1 = f1(x2, x3)
+            t2 = f2(t1, c0)
+            t3 = f3(t0, t2)
+            return t3
+
+    where `f0`, `f1`, `f2`, `f3` are `np.subtract`, `np.subtract`, `np.add`, `np.divide` and `c0` is `1e-12`.
+
+    Parameters
+    ----------
+    expression : Expression
+        the root of the sub-tree.
+    is_leaf : Callable[[Expression], bool]
+        whether a sub-expression is an input of the kernel instead of a fused operator.
+    """
+
+    def __init__(self, expression: Expression, is_leaf):
+        self.leaves: List[Expression] = []
+        self.n_operators = 0
+        self._namespace = {}
+        self._lines = []
+        # id of the sub-expression -> the variable of its result
+        self._variables: Dict[int, str] = {}
+        result = self._emit(expression, lambda operand: operand is not expression and is_leaf(operand))
+        args = ", ".join(f"x{i}" for i in range(len(self.leaves)))
+        self.source = "\n".join([f"def kernel({args}):"] + self._lines + [f"    return {result}"])
+        exec(self.source, self._namespace)  # pylint: disable=W0122
+        self.func = self._namespace["kernel"]
+
+    def _bind(self, value, prefix: str) -> str:
+        name = f"{prefix}{sum(k.startswith(prefix) for k in self._namespace)}"
+        self._namespace[name] = value
+        return name
+
+    def _emit(self, operand, is_leaf) -> str:
+        if not isinstance(operand, Expression):
+            return self._bind(operand, "c")
+        if id(operand) in self._variables:
+            return self._variables[id(operand)]
+        if is_leaf(operand):
+            variable = f"x{len(self.leaves)}"
+            self.leaves.append(operand)
+        else:
+            if isinstance(operand, If):
+                func = np.where
+                operands = [operand.condition, operand.feature_left, operand.feature_right]
+            elif isinstance(operand, NpPairOperator):
+                func = getattr(np, operand.func)
+                operands = [operand.feature_left, operand.feature_right]
+            elif type(operand)._compute is NpElemOperator._compute:
+                func = getattr(np, operand.func)
+                operands = [operand.feature]
+            else:
+                func = operand._compute
+                operands = [operand.feature]
+            args = ", ".join(self._emit(v, is_leaf) for v in operands)
+            variable = f"t{self.n_operators}"
+            self._lines.append(f"    {variable} = {self._bind(func, 'f')}({args})")
+            self.n_operators += 1
+        self._variables[id(operand)] = variable
+        return variable
+
+    def __call__(self, *arrays: np.ndarray) -> np.ndarray:
+        """calculate with the arrays of the leaves, which have the same length"""
+        n = len(arrays[0])
+        if n <= _FUSION_BLOCK_SIZE:
+            return self.func(*arrays)
+        block = self.func(*(values[:_FUSION_BLOCK_SIZE] for values in arrays))
+        result = np.empty((n,) + block.shape[1:], dtype=block.dtype)
+        result[:_FUSION_BLOCK_SIZE] = block
+        for i in range(_FUSION_BLOCK_SIZE, n, _FUSION_BLOCK_SIZE):
+            result[i : i + _FUSION_BLOCK_SIZE] = self.func(*(values[i : i + _FUSION_BLOCK_SIZE] for values in arrays))
+        return result
+
+
+class CompiledExpressions:
+    """The DAG of a list of expressions
+
+    Parameters
+    ----------
+    expressions : List[Expression]
+        the root expressions.
+    ranges : List[Tuple[int, int]]
+        the [start_index, end_index] each root expression is loaded with.
+    fuse : bool
+        whether to fuse the element-wise operators when the DAG is evaluated by `load`.
+    names : List[str]
+        the names of the root expressions (e.g. the fields) in the stats of `qlib.data.profiler`, str of the
+        expressions by default.
+    """
+
+    def __init__(
+        self,
+        expressions: List[Expression],
+        ranges: List[Tuple[int, int]],
+        fuse: bool = True,
+        names: List[str] = None,
+    ):
+        self.expressions = expressions
+        self.ranges = ranges
+        self.names = list(map(str, expressions)) if names is None else list(names)
+        # str of each expression object in the trees
+        self._names: Dict[int, str] = {}
+        self._invariant: Dict[str, bool] = {}
+        # node key -> [start_index, end_index], the range-invariant nodes are keyed by the name only
+        self._node_ranges: Dict[Union[str, tuple], List[int]] = {}
+        self._node_exprs: Dict[Union[str, tuple], Expression] = {}
+        self._children: Dict[Union[str, tuple], List[Union[str, tuple]]] = {}
+        # the children whose index is inherited by the result, refer to `load_panel`
+        self._index_children: Dict[Union[str, tuple], List[Union[str, tuple]]] = {}
+        self._roots: List[Union[str, tuple]] = []
+        # node key -> position of the first root expression depending on it
+        self._owners: Dict[Union[str, tuple], int] = {}
+        self.n_expressions = 0
+
+        for expression, (start_index, end_index) in zip(expressions, ranges):
+            self._roots.append(self._visit(expression, start_index, end_index))
+        self._order = self._sort()
+        self._extend_invariant_ranges()
+
+        self.n_consumers = {key: 0 for key in self._order}
+        for key in self._order:
+            for child in self._children[key]:
+                self.n_consumers[child] += 1
+        self._root_positions: Dict[Union[str, tuple], List[int]] = {}
+        for i, key in enumerate(self._roots):
+            self._root_positions.setdefault(key, []).append(i)
+        self._dag = self._order, self._children, self.n_consumers
+
+        # the DAG evaluated by `load`, a fused node is calculated from the leaves of its kernel
+        self.kernels: Dict[Union[str, tuple], FusedKernel] = {}
+        self._fused_dag = self._dag
+        if fuse:
+            self._fuse()
+
+    def _fuse(self):
+        """fuse every element-wise node into its consumer if it is the only one"""
+        consumers: Dict[Union[str, tuple], List[Union[str, tuple]]] = {key: [] for key in self._order}
+        for key in self._order:
+            for child in self._children[key]:
+                consumers[child].append(key)
+        fusible = {key: _is_fusible(self._node_exprs[key]) for key in self._order}
+        fused = {
+            key
+            for key in self._order
+            if fusible[key]
+            and key not in self._root_positions
+            and len(consumers[key]) == 1
+            and fusible[consumers[key][0]]
+            and self._node_ranges[key] == self._node_ranges[consumers[key][0]]
+        }
+        if len(fused) == 0:
+            return
+
+        children = dict(self._children)
+        for key in self._order:
+            if fusible[key] and key not in fused and any(child in fused for child in self._children[key]):
+                # the keys of the nodes in the tree of `key`, they are visited with the same range
+                def _key(expression, _range=key[1:] if isinstance(key, tuple) else ()):
+                    name = self._names[id(expression)]
+                    return name if self._invariant[name] else (name, *_range)
+
+                kernel = FusedKernel(self._node_exprs[key], lambda expression: _key(expression) not in fused)
+                self.kernels[key] = kernel
+                children[key] = list(dict.fromkeys(_key(leaf) for leaf in kernel.leaves))
+        order = [key for key in self._order if key not in fused]
+        n_consumers = {key: 0 for key in order}
+        for key in order:
+            for child in children[key]:
+                n_consumers[child] += 1
+        self._fused_dag = order, children, n_consumers
+
+    @property
+    def n_nodes(self) -> int:
+        """number of nodes after the common sub-expressions are merged"""
+        return len(self._order)
+
+    @property
+    def n_saved(self) -> int:
+        """number of the expression evaluations saved by merging the common sub-expressions"""
+        return self.n_expressions - self.n_nodes
+
+    @property
+    def n_fused(self) -> int:
+        """number of the nodes fused into the kernels of their consumers"""
+        return self.n_nodes - len(self._fused_dag[0])
+
+    def _is_invariant(self, expression: Expression, name: str) -> bool:
+        if name not in self._invariant:
+            if isinstance(expression, Feature):
+                invariant = not isinstance(expression, PFeature)
+            else:
+                invariant = all(
+                    getattr(type(expression), method, methods[0]) in methods
+                    for method, methods in _ELEMENT_WISE_METHODS.items()
+                ) and all(self._is_invariant(child, self._names[id(child)]) for child in get_children(expression))
+            self._invariant[name] = invariant
+        return self._invariant[name]
+
+    def _key(self, name: str, start_index: int, end_index: int) -> Union[str, tuple]:
+        return name if self._invariant[name] else (name, start_index, end_index)
+
+    def _visit(self, expression: Expression, start_index: int, end_index: int) -> Union[str, tuple]:
+        self.n_expressions += 1
+        name = self._names.get(id(expression))
+        if name is None:
+            name = self._names[id(expression)] = str(expression)
+        children = get_children(expression)
+        child_keys = [self._visit(child, start_index, end_index) for child in children]
+        self._is_invariant(expression, name)
+        key = self._key(name, start_index, end_index)
+        if key not in self._node_ranges:
+            self._node_ranges[key] = [start_index, end_index]
+            self._node_exprs[key] = expression
+            self._children[key] = list(dict.fromkeys(child_keys))
+            if isinstance(expression, If):
+                # the result of `If` has the index of the condition
+                child_keys = [k for child, k in zip(children, child_keys) if child is expression.condition]
+            self._index_children[key] = list(dict.fromkeys(child_keys))
+        return key
+
+    def _sort(self) -> List[Union[str, tuple]]:
+        """topological order of the nodes, the children are before their consumers"""
+        order, visited = [], set()
+
+        def _dfs(key, owner):
+            if key in visited:
+                return
+            visited.add(key)
+            for child in self._children[key]:
+                _dfs(child, owner)
+            order.append(key)
+            self._owners[key] = owner
+
+        for i, key in enumerate(self._roots):
+            _dfs(key, i)
+        return order
+
+    def _extend_invariant_ranges(self):
+        """a range-invariant node is loaded with the union range of its consumers"""
+        for key in reversed(self._order):
+            start_index, end_index = self._node_ranges[key]
+            for child in self._children[key]:
+                if isinstance(child, str):
+                    child_range = self._node_ranges[child]
+                    child_range[0] = min(child_range[0], start_index)
+                    child_range[1] = max(child_range[1], end_index)
+
+    def get(self, memo: dict, expression: Expression, start_index: int, end_index: int):
+        """get the evaluated result of `expression` from `memo`, return None if it is not evaluated"""
+        name = self._names.get(id(expression))
+        if name is None:
+            return None
+        key = self._key(name, start_index, end_index)
+        series = memo.get(key)
+        if series is None or not isinstance(key, str):
+            return series
+        node_start, node_end = self._node_ranges[key]
+        if (node_start, node_end) == (start_index, end_index):
+            return series
+        if start_index < node_start or end_index > node_end:
+            return None
+        return _slice(series, start_index, end_index)
+
+    def _evaluate(self, instrument, args, load, release=None, dag=None) -> list:
+        """evaluate the nodes of `dag` (the DAG without fusion by default) in topological order with
+        `load(key, start_index, end_index)`
+
+        `release(key)` is called when the result of the node is not used any more.
+        """
+        order, children, n_consumers = self._dag if dag is None else dag
+        results = [None] * len(self._roots)
+        n_consumers = dict(n_consumers)
+        memo = {}
+        _outer_scope = getattr(_scope, "value", None)
+        _scope.value = self, instrument, args, memo
+        try:
+            for key in order:
+                node_start, node_end = self._node_ranges[key]
+                if Profiler.enabled:
+                    Profiler.set_field(self.names[self._owners[key]])
+                series = load(key, node_start, node_end)
+                for i in self._root_positions.get(key, []):
+                    start_index, end_index = self.ranges[i]
+                    if isinstance(key, str) and (node_start, node_end) != (start_index, end_index):
+                        results[i] = _slice(series, start_index, end_index)
+                    else:
+                        results[i] = series
+                if n_consumers[key] > 0:
+                    memo[key] = series
+                for child in children[key]:
+                    n_consumers[child] -= 1
+                    if n_consumers[child] == 0:
+                        del memo[child]
+                        if release is not None:
+                            release(child)
+        finally:
+            _scope.value = _outer_scope
+            if Profiler.enabled:
+                Profiler.set_field(None)
+        return results
+
+    def load(self, instrument: str, *args) -> List[pd.Series]:
+        """evaluate the expressions of `instrument`
+
+        Parameters
+        ----------
+        instrument : str
+            instrument code.
+        *args:
+            the extra arguments of `Expression.load`, e.g. freq.
+
+        Returns
+        -------
+        List[pd.Series]
+            the results of the root expressions in their ranges.
+        """
+
+        def _load(key, start_index, end_index):
+            # keep the data in the form it is calculated in
+            if key in self.kernels:
+                return self._load_fused(key, instrument, start_index, end_index, *args)
+            return _load_node(self._node_exprs[key], instrument, start_index, end_index, *args)
+
+        results = self._evaluate(instrument, args, _load, dag=self._fused_dag)
+        return [
+            array_to_series(data, name=str(self.expressions[i])) if isinstance(data, tuple) else data
+            for i, data in enumerate(results)
+        ]
+
+    def _load_fused(self, key, instrument: str, start_index: int, end_index: int, *args):
+        """calculate the fused node `key` by its kernel, the same as `Expression._load_data`"""
+        from .cache import H  # pylint: disable=C0415
+
+        expression, kernel = self._node_exprs[key], self.kernels[key]
+        cache_key = str(expression), instrument, start_index, end_index, *args
+        if cache_key in H["f"]:
+            if Profiler.enabled:
+                Profiler.hit(expression)
+            return H["f"][cache_key]
+        inputs = [_load_node(leaf, instrument, start_index, end_index, *args) for leaf in kernel.leaves]
+        if not all(
+            isinstance(data, tuple) and (data[0], len(data[1])) == (inputs[0][0], len(inputs[0][1])) for data in inputs
+        ):
+            # the operators align the series by the index, or the data have different ranges
+            return expression._load_data(instrument, start_index, end_index, *args)
+        data = None
+        profiling = Profiler.enabled
+        if profiling:
+            start = Profiler.start()
+        try:
+            data = inputs[0][0], kernel(*(values for _, values in inputs))
+        finally:
+            if profiling:
+                Profiler.stop(expression, start, data)
+        H["f"][cache_key] = data
+        return data
+
+    def load_panel(self, instruments: List[str], *args) -> Tuple[List[pd.DataFrame], List[np.ndarray]]:
+        """evaluate the expressions of all the `instruments` column-wise
+
+        A panel has a cell for every (day, instrument) in the range, while the result of `load` only contains the
+        days in the data range of the features of the instrument. So the bool arrays of the index are returned as
+        well to tell whether a cell is in the index of the result of `load`:
+
+        - the index of a feature is its data range;
+        - the index of an operator is the union of the index of its sub-expressions (the condition for `If`);
+        - the operators which do not `support_panel` are loaded instrument by instrument, so their index is known.
+
+        Parameters
+        ----------
+        instruments : List[str]
+            instrument codes.
+        *args:
+            the extra arguments of `Expression.load`, e.g. freq.
+
+        Returns
+        -------
+        Tuple[List[pd.DataFrame], List[np.ndarray]]
+            the panels of the root expressions in their ranges and the bool arrays of their index.
+        """
+        indexes, root_indexes = {}, {}
+
+        def _load(key, start_index, end_index):
+            expression = self._node_exprs[key]
+            if not expression.support_panel():
+                panel, indexes[key] = expression._load_panel_by_instrument(instruments, start_index, end_index, *args)
+            else:
+                panel = expression.load_panel(instruments, start_index, end_index, *args)
+                indexes[key] = _get_index(key)
+                # the cells out of the index do not exist in the result of `load`. They must be NaN, otherwise they
+                # would be seen by the consumers, e.g. the False of `$close>$open` before the data range of an
+                # instrument would be counted by `Mean($close>$open, 5)`
+                if not isinstance(expression, Feature) and not indexes[key].all():
+                    # NOTE: the bool panels become float, the bitwise operators (e.g. `And`) take them as bool again
+                    if (panel.dtypes == bool).any():
+                        panel = panel.astype(np.float64)
+                    panel = panel.where(indexes[key])
+            if key in self._root_positions:
+                root_indexes[key] = indexes[key]
+            return panel
+
+        def _get_index(key):
+            node_start, node_end = self._node_ranges[key]
+            expression = self._node_exprs[key]
+            if isinstance(expression, Feature):
+                return expression.load_panel_index(instruments, node_start, node_end, *args)
+            index = np.zeros((node_end - node_start + 1, len(instruments)), dtype=bool)
+            for child in self._index_children[key]:
+                child_start = self._node_ranges[child][0]
+                index |= indexes[child][node_start - child_start : node_end - child_start + 1]
+            return index
+
+        panels = self._evaluate(instruments, args, _load, release=lambda key: indexes.pop(key))
+        root_ranges = [self._node_ranges[key] for key in self._roots]
+        return panels, [
+            root_indexes[key][start_index - node_start : end_index - node_start + 1]
+            for key, (start_index, end_index), (node_start, _) in zip(self._roots, self.ranges, root_ranges)
+        ]
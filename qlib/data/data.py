@@ -5,11 +5,13 @@
 from __future__ import division
 from __future__ import print_function
 
+import os
 import re
 import abc
 import copy
+import heapq
 import queue
-import bisect
+import tempfile
 import numpy as np
 import pandas as pd
 from typing import List, Union, Optional
@@ -17,12 +19,16 @@ from typing import List, Union, Optional
 # For supporting multiprocessing in outer code, joblib is used
 from joblib import delayed
 
-from .cache import H
+from .cache import H, MemCacheLengthUnit
 from ..config import C
 from .inst_processor import InstProcessor
 
 from ..log import get_module_logger
-from .cache import DiskDatasetCache
+from .cache import DiskDatasetCache, SharedMemCache
+from .base import series_to_array
+from .compiler import CompiledExpressions
+from .profiler import Profiler
+from .parser import ExpressionParser, UnsupportedSyntax, dump_parsed_fields, load_parsed_fields
 from ..utils import (
     Wrapper,
     init_instance_by_config,
@@ -31,12 +37,12 @@ from ..utils import (
     parse_field,
     hash_args,
     normalize_cache_fields,
+    remove_fields_space,
     code_to_fname,
     time_to_slc_point,
-    read_period_data,
     get_period_list,
 )
-from ..utils.paral import ParallelExt
+from ..utils.paral import ParallelExt, WorkerPool
 from .ops import Operators  # pylint: disable=W0611  # noqa: F401
 
 
@@ -87,7 +93,7 @@ class CalendarProvider(abc.ABC):
         list
             calendar list
         """
-        _calendar, _calendar_index = self._get_calendar(freq, future)
+        _calendar = self._get_calendar(freq, future)
         if start_time == "None":
             start_time = None
         if end_time == "None":
@@ -106,7 +112,7 @@ class CalendarProvider(abc.ABC):
         else:
             end_time = _calendar[-1]
         _, _, si, ei = self.locate_index(start_time, end_time, freq, future)
-        return _calendar[si : ei + 1]
+        return self._get_calendar_timestamp(freq, future)[si : ei + 1]
 
     def locate_index(
         self, start_time: Union[pd.Timestamp, str], end_time: Union[pd.Timestamp, str], freq: str, future: bool = False
@@ -137,19 +143,35 @@ class CalendarProvider(abc.ABC):
         """
         start_time = pd.Timestamp(start_time)
         end_time = pd.Timestamp(end_time)
-        calendar, calendar_index = self._get_calendar(freq=freq, future=future)
-        if start_time not in calendar_index:
-            try:
-                start_time = calendar[bisect.bisect_left(calendar, start_time)]
-            except IndexError as index_e:
-                raise IndexError(
-                    "`start_time` uses a future date, if you want to get future trading days, you can use: `future=True`"
-                ) from index_e
-        start_index = calendar_index[start_time]
-        if end_time not in calendar_index:
-            end_time = calendar[bisect.bisect_right(calendar, end_time) - 1]
-        end_index = calendar_index[end_time]
-        return start_time, end_time, start_index, end_index
+        calendar = self._get_calendar(freq=freq, future=future)
+        start_index = int(calendar.searchsorted(start_time.to_datetime64(), side="left"))
+        if start_index >= len(calendar):
+            raise IndexError(
+                "`start_time` uses a future date, if you want to get future trading days, you can use: `future=True`"
+            )
+        # NOTE: an `end_time` before the calendar falls back to the last trading day, the same as `calendar[-1]`
+        end_index = int(calendar.searchsorted(end_time.to_datetime64(), side="right")) - 1
+        if end_index < 0:
+            end_index += len(calendar)
+        return pd.Timestamp(calendar[start_index]), pd.Timestamp(calendar[end_index]), start_index, end_index
+
+    def index_to_datetime(self, index: np.ndarray, freq: str = "day", future: bool = False) -> pd.DatetimeIndex:
+        """Convert calendar indices to datetime without building `pd.Timestamp` objects.
+
+        Parameters
+        ----------
+        index : np.ndarray
+            integer positions in the calendar.
+        freq : str
+            time frequency, available: year/quarter/month/week/day.
+        future : bool
+            whether including future trading day.
+
+        Returns
+        -------
+        pd.DatetimeIndex
+        """
+        return pd.DatetimeIndex(self._get_calendar(freq, future)[index])
 
     def _get_calendar(self, freq, future):
         """Load calendar using memcache.
@@ -163,16 +185,19 @@ class CalendarProvider(abc.ABC):
 
         Returns
         -------
-        list
-            list of timestamps.
-        dict
-            dict composed by timestamp as key and index as value for fast search.
+        np.ndarray
+            sorted `datetime64[ns]` array, it may be memory-mapped and shared by processes.
         """
         flag = f"{freq}_future_{future}"
         if flag not in H["c"]:
-            _calendar = np.array(self.load_calendar(freq, future))
-            _calendar_index = {x: i for i, x in enumerate(_calendar)}  # for fast search
-            H["c"][flag] = _calendar, _calendar_index
+            H["c"][flag] = self.load_calendar_array(freq, future)
+        return H["c"][flag]
+
+    def _get_calendar_timestamp(self, freq, future):
+        """Load calendar as an array of `pd.Timestamp` using memcache, it is only built when `calendar` is called."""
+        flag = f"{freq}_future_{future}_timestamp"
+        if flag not in H["c"]:
+            H["c"][flag] = pd.DatetimeIndex(self._get_calendar(freq, future)).to_numpy(dtype=object)
         return H["c"][flag]
 
     def _uri(self, start_time, end_time, freq, future=False):
@@ -195,6 +220,24 @@ class CalendarProvider(abc.ABC):
         """
         raise NotImplementedError("Subclass of CalendarProvider must implement `load_calendar` method")
 
+    def load_calendar_array(self, freq, future):
+        """Load original calendar from file as a `datetime64[ns]` array.
+
+        Subclasses could override it to avoid building the list of `pd.Timestamp`.
+
+        Parameters
+        ----------
+        freq : str
+            frequency of read calendar file.
+        future: bool
+
+        Returns
+        ----------
+        np.ndarray
+            sorted `datetime64[ns]` array
+        """
+        return pd.DatetimeIndex(self.load_calendar(freq, future)).values
+
 
 class InstrumentProvider(abc.ABC):
     """Instrument provider base class
@@ -334,6 +377,42 @@ class FeatureProvider(abc.ABC):
         """
         raise NotImplementedError("Subclass of FeatureProvider must implement `feature` method")
 
+    def feature_panel(self, instruments, field, start_index, end_index, freq):
+        """Get feature data of several instruments.
+
+        Parameters
+        ----------
+        instruments : list
+            list of instruments.
+        field : str
+            a certain field of feature.
+
+        Returns
+        -------
+        pd.DataFrame
+            index: calendar index in [start_index, end_index], columns: instruments
+        """
+        index = pd.RangeIndex(start_index, end_index + 1)
+        return pd.DataFrame(
+            {inst: self.feature(inst, field, start_index, end_index, freq) for inst in instruments},
+            index=index,
+            columns=instruments,
+        )
+
+    def feature_panel_index(self, instruments, field, start_index, end_index, freq):
+        """Get whether each cell of `feature_panel` is in the data range of the instrument.
+
+        Returns
+        -------
+        np.ndarray
+            bool array of shape (end_index - start_index + 1, len(instruments))
+        """
+        index = pd.RangeIndex(start_index, end_index + 1)
+        in_index = np.zeros((len(index), len(instruments)), dtype=bool)
+        for i, inst in enumerate(instruments):
+            in_index[:, i] = index.isin(self.feature(inst, field, start_index, end_index, freq).index)
+        return in_index
+
 
 class PITProvider(abc.ABC):
     @abc.abstractmethod
@@ -379,6 +458,34 @@ class PITProvider(abc.ABC):
         """
         raise NotImplementedError(f"Please implement the `period_feature` method")
 
+    def period_feature_asof(
+        self,
+        instrument,
+        field,
+        start_index: int,
+        end_index: int,
+        freq: str,
+        period: Optional[int] = None,
+    ) -> pd.Series:
+        """
+        get the value of the latest period (or `period`) known at each trading day in [start_index, end_index]
+
+        It is the same as `P(field)` (or `PRef(field, period)`) but all the trading days are computed in one pass.
+
+        Returns
+        -------
+        pd.Series
+            The index will be the calendar index and the dtype is float32
+
+        Raises
+        ------
+        FileNotFoundError
+            This exception will be raised if the queried data do not exist.
+        NotImplementedError
+            The provider only supports querying one trading day with `period_feature`.
+        """
+        raise NotImplementedError(f"Please implement the `period_feature_asof` method")
+
 
 class ExpressionProvider(abc.ABC):
     """Expression provider class
@@ -388,13 +495,17 @@ class ExpressionProvider(abc.ABC):
 
     def __init__(self):
         self.expression_instance_cache = {}
+        self.parser = ExpressionParser()
 
     def get_expression_instance(self, field):
         try:
             if field in self.expression_instance_cache:
                 expression = self.expression_instance_cache[field]
             else:
-                expression = eval(parse_field(field))
+                try:
+                    expression = self.parser.parse(field)
+                except UnsupportedSyntax:
+                    expression = eval(parse_field(field))
                 self.expression_instance_cache[field] = expression
         except NameError as e:
             get_module_logger("data").exception(
@@ -406,6 +517,20 @@ class ExpressionProvider(abc.ABC):
             raise
         return expression
 
+    def get_expression_instances(self, fields):
+        """Get the expressions of several fields at once.
+
+        The fields missing in the memory are loaded from the on-disk cache of the field set if it is enabled by
+        `C.parsed_fields_cache_dir`, otherwise they are parsed and saved to it.
+        """
+        if any(field not in self.expression_instance_cache for field in fields):
+            expressions = load_parsed_fields(fields)
+            if expressions is None:
+                expressions = {field: self.get_expression_instance(field) for field in fields}
+                dump_parsed_fields(fields, expressions)
+            self.expression_instance_cache.update(expressions)
+        return [self.expression_instance_cache[field] for field in fields]
+
     @abc.abstractmethod
     def expression(self, instrument, field, start_time=None, end_time=None, freq="day") -> pd.Series:
         """Get Expression data.
@@ -442,6 +567,45 @@ class ExpressionProvider(abc.ABC):
         """
         raise NotImplementedError("Subclass of ExpressionProvider must implement `Expression` method")
 
+    def expressions(self, instrument, fields, start_time=None, end_time=None, freq="day") -> dict:
+        """Get the data of several expressions of one instrument.
+
+        Parameters
+        ----------
+        instrument : str
+            a certain instrument.
+        fields : list
+            list of the fields of feature.
+
+        Returns
+        -------
+        dict
+            field -> data of the expression, the same as `expression`
+        """
+        self.get_expression_instances(fields)
+        return {field: self.expression(instrument, field, start_time, end_time, freq) for field in fields}
+
+    def expression_panels(self, instruments, fields, start_time=None, end_time=None, freq="day"):
+        """Get the data of several expressions of all the instruments at once.
+
+        Parameters
+        ----------
+        instruments : list
+            list of instruments.
+        fields : list
+            list of the fields of feature.
+
+        Returns
+        -------
+        dict
+            field -> pd.DataFrame, index: calendar index, columns: instruments.
+            The cells not in the result of `expression` are NaN.
+        np.ndarray
+            bool array of shape (len(calendar index), len(instruments)), whether a cell is in the result of
+            `expression` of any field.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support evaluating the expressions as panels")
+
 
 class DatasetProvider(abc.ABC):
     """Dataset provider class
@@ -449,6 +613,9 @@ class DatasetProvider(abc.ABC):
     Provide Dataset data.
     """
 
+    # the chunks of instruments per worker of `shared_mem_calculator`, more chunks balance the workers better
+    CHUNKS_PER_WORKER = 4
+
     @abc.abstractmethod
     def dataset(self, instruments, fields, start_time=None, end_time=None, freq="day", inst_processors=[]):
         """Get dataset data.
@@ -552,8 +719,40 @@ class DatasetProvider(abc.ABC):
 
         """
         normalize_column_names = normalize_cache_fields(column_names)
+        if C.panel_evaluation:
+            try:
+                data = DatasetProvider.panel_calculator(
+                    instruments_d, start_time, end_time, freq, normalize_column_names, inst_processors
+                )
+            except NotImplementedError as e:
+                get_module_logger("data").warning(f"The panel evaluation is skipped: {e}")
+            else:
+                if len(data) > 0:
+                    return DiskDatasetCache.cache_to_origin_data(data, column_names)
+                return pd.DataFrame(
+                    index=pd.MultiIndex.from_arrays([[], []], names=("instrument", "datetime")),
+                    columns=column_names,
+                    dtype=np.float32,
+                )
         # One process for one task, so that the memory will be freed quicker.
         workers = max(min(C.get_kernels(freq), len(instruments_d)), 1)
+        # the config with the session is passed to the workers
+        SharedMemCache.start_session()
+        # the forked workers inherit the parsed fields, the others load them from the on-disk cache if it is enabled
+        ExpressionD.get_expression_instances(normalize_column_names)
+        if C.shared_mem_dataset and not any(inst_processors):
+            if SharedMemCache.SHM_DIR.is_dir():
+                data = DatasetProvider.shared_mem_calculator(
+                    instruments_d, start_time, end_time, freq, normalize_column_names, column_names, workers
+                )
+                if len(data) > 0:
+                    return data
+                return pd.DataFrame(
+                    index=pd.MultiIndex.from_arrays([[], []], names=("instrument", "datetime")),
+                    columns=column_names,
+                    dtype=np.float32,
+                )
+            get_module_logger("data").warning("The shared memory results are skipped: POSIX shared memory is required")
 
         # create iterator
         if isinstance(instruments_d, dict):
@@ -563,20 +762,23 @@ class DatasetProvider(abc.ABC):
 
         inst_l = []
         task_l = []
+        # the workers return the stats of the profiler with the data
+        calculator = DatasetProvider.profiled_inst_calculator if Profiler.enabled else DatasetProvider.inst_calculator
+        # the workers of the pool are configured by the pool
+        g_config = C if WorkerPool.get() is None else None
         for inst, spans in it:
             inst_l.append(inst)
             task_l.append(
-                delayed(DatasetProvider.inst_calculator)(
-                    inst, start_time, end_time, freq, normalize_column_names, spans, C, inst_processors
+                delayed(calculator)(
+                    inst, start_time, end_time, freq, normalize_column_names, spans, g_config, inst_processors
                 )
             )
 
-        data = dict(
-            zip(
-                inst_l,
-                ParallelExt(n_jobs=workers, backend=C.joblib_backend, maxtasksperchild=C.maxtasksperchild)(task_l),
-            )
-        )
+        data = dict(zip(inst_l, DatasetProvider.parallel(task_l, workers)))
+        if Profiler.enabled:
+            for inst, (_data, stats) in data.items():
+                Profiler.merge(stats)
+                data[inst] = _data
 
         new_data = dict()
         for inst in sorted(data.keys()):
@@ -596,6 +798,204 @@ class DatasetProvider(abc.ABC):
 
         return data
 
+    @staticmethod
+    def panel_calculator(instruments_d, start_time, end_time, freq, column_names, inst_processors=[]):
+        """
+        Calculate the expressions for all the instruments at once in the current process, every operator runs
+        column-wise on a (time x instrument) panel. The result is the same as concatenating the results of
+        `inst_calculator`.
+
+        return value: A data frame with index ['instrument', 'datetime'] and other data columns.
+
+        """
+        if isinstance(instruments_d, dict):
+            inst_l = sorted(instruments_d.keys())
+        else:
+            inst_l = sorted(instruments_d)
+        if len(inst_l) == 0:
+            return pd.DataFrame()
+        panels, in_index = ExpressionD.expression_panels(inst_l, column_names, start_time, end_time, freq)
+        calendar_index = panels[column_names[0]].index
+        datetime = Cal.index_to_datetime(calendar_index.values, freq=freq)
+
+        if isinstance(instruments_d, dict):
+            for i, inst in enumerate(inst_l):
+                mask = np.zeros(len(datetime), dtype=bool)
+                for begin, end in instruments_d[inst]:
+                    mask |= (datetime >= begin) & (datetime <= end)
+                in_index[:, i] &= mask
+
+        # (time, instrument, field) -> (instrument, time, field), the rows are sorted by instrument and datetime
+        values = np.stack([panels[field].values for field in column_names], axis=-1).transpose(1, 0, 2)
+        in_index = in_index.T
+        index = pd.MultiIndex.from_arrays(
+            [
+                np.repeat(np.array(inst_l, dtype=object), in_index.sum(axis=1)),
+                np.broadcast_to(datetime.values, in_index.shape)[in_index],
+            ],
+            names=["instrument", "datetime"],
+        )
+        data = pd.DataFrame(values[in_index], index=index, columns=column_names)
+
+        if any(inst_processors):
+            new_data = dict()
+            for inst, _data in data.groupby(level="instrument", sort=False):
+                _data = _data.droplevel("instrument")
+                for _processor in inst_processors:
+                    if _processor:
+                        _processor_obj = init_instance_by_config(_processor, accept_types=InstProcessor)
+                        _data = _processor_obj(_data, instrument=inst)
+                if len(_data) > 0:
+                    new_data[inst] = _data
+            data = pd.concat(new_data, names=["instrument"], sort=False) if len(new_data) > 0 else pd.DataFrame()
+        return data
+
+    @staticmethod
+    def parallel(task_l, workers):
+        """run the `delayed` tasks by the worker pool if it is started, otherwise by `workers` new joblib workers"""
+        pool = WorkerPool.get()
+        if pool is not None:
+            return pool(task_l)
+        return ParallelExt(n_jobs=workers, backend=C.joblib_backend, maxtasksperchild=C.maxtasksperchild)(task_l)
+
+    @staticmethod
+    def shared_mem_calculator(instruments_d, start_time, end_time, freq, column_names, fields, workers):
+        """
+        Calculate the expressions for the instruments in balanced chunks, one task per chunk, so the config and the
+        fields are sent once per chunk instead of once per instrument. The workers write the results into a float32
+        array in POSIX shared memory instead of returning a data frame per instrument, and the result is a data frame
+        over the array without concatenating the frames. The result is the same as concatenating the results of
+        `inst_calculator`.
+
+        Every instrument is given the rows of the calendar within its spans, the workers write the rows of an
+        instrument from its first row on. The rows are moved next to the previous instrument in place afterwards.
+
+        `column_names` are the normalized fields to calculate and `fields` the columns of the result.
+
+        return value: A data frame with index ['instrument', 'datetime'] and the columns `fields`.
+
+        """
+        calendar = pd.DatetimeIndex(Cal.calendar(start_time, end_time, freq))
+        if isinstance(instruments_d, dict):
+            items = sorted(instruments_d.items())
+        else:
+            items = [(inst, None) for inst in sorted(set(instruments_d))]
+        capacity = []
+        for _, spans in items:
+            if spans is None:
+                capacity.append(len(calendar))
+            else:
+                mask = np.zeros(len(calendar), dtype=bool)
+                for begin, end in spans:
+                    mask |= (calendar >= begin) & (calendar <= end)
+                capacity.append(int(mask.sum()))
+        offsets = np.concatenate([[0], np.cumsum(capacity, dtype=np.int64)])
+        shape = (int(offsets[-1]), len(fields))
+        if shape[0] == 0 or shape[1] == 0:
+            return pd.DataFrame()
+
+        # the longest instruments first, each to the chunk with the fewest rows
+        n_chunks = min(sum(c > 0 for c in capacity), workers * DatasetProvider.CHUNKS_PER_WORKER)
+        chunks = [[] for _ in range(n_chunks)]
+        loads = [(0, i) for i in range(n_chunks)]
+        for i in sorted(range(len(items)), key=lambda i: -capacity[i]):
+            if capacity[i] == 0:
+                break
+            load, chunk = heapq.heappop(loads)
+            chunks[chunk].append(i)
+            heapq.heappush(loads, (load + capacity[i], chunk))
+
+        fd, path = tempfile.mkstemp(prefix="qlib", suffix=".dataset", dir=SharedMemCache.SHM_DIR)
+        os.close(fd)
+        try:
+            # the pages are allocated when they are written
+            values = np.memmap(path, dtype=np.float32, mode="w+", shape=shape)
+            task_l = [
+                delayed(DatasetProvider.chunk_calculator)(
+                    [items[i] for i in chunk],
+                    offsets[chunk].tolist(),
+                    path,
+                    shape,
+                    start_time,
+                    end_time,
+                    freq,
+                    column_names,
+                    remove_fields_space(fields),
+                    C if WorkerPool.get() is None else None,
+                    Profiler.enabled,
+                )
+                for chunk in chunks
+            ]
+            results = DatasetProvider.parallel(task_l, workers)
+        finally:
+            # the mapping of the main process is kept until the array is released
+            os.unlink(path)
+
+        positions = [np.array([], dtype=np.int32)] * len(items)
+        for chunk, (chunk_positions, stats) in zip(chunks, results):
+            if stats is not None:
+                Profiler.merge(stats)
+            for i, _positions in zip(chunk, chunk_positions):
+                positions[i] = _positions
+        counts = np.array([len(_positions) for _positions in positions], dtype=np.int64)
+        n_rows = 0
+        for i, count in enumerate(counts):
+            if count > 0 and offsets[i] != n_rows:
+                values[n_rows : n_rows + count] = values[offsets[i] : offsets[i] + count]
+            n_rows += count
+
+        index = pd.MultiIndex(
+            levels=[pd.Index([inst for inst, _ in items], dtype=object), calendar],
+            codes=[np.repeat(np.arange(len(items)), counts), np.concatenate(positions)],
+            names=["instrument", "datetime"],
+            verify_integrity=False,
+        ).remove_unused_levels()
+        return pd.DataFrame(np.asarray(values[:n_rows]), index=index, columns=[str(i) for i in fields])
+
+    @staticmethod
+    def chunk_calculator(
+        chunk, offsets, path, shape, start_time, end_time, freq, column_names, fields, g_config=None, profile=False
+    ):
+        """
+        Calculate the expressions for a chunk of `(instrument, spans)` by `inst_calculator` and write the columns
+        `fields` of every instrument from its row in `offsets` of the float32 array in the file `path`.
+
+        return value: The calendar positions of the rows of every instrument and the stats of `Profiler` if `profile`.
+
+        """
+        C.register_from_C(g_config)
+        calendar = pd.DatetimeIndex(Cal.calendar(start_time, end_time, freq))
+        values = np.memmap(path, dtype=np.float32, mode="r+", shape=shape)
+        positions = []
+        enabled = Profiler.enabled
+        Profiler.enabled = profile
+        try:
+            with Profiler.collect() as stats:
+                for (inst, spans), offset in zip(chunk, offsets):
+                    data = DatasetProvider.inst_calculator(inst, start_time, end_time, freq, column_names, spans)
+                    if data.empty:
+                        # e.g. no data in the range, the index is not converted to datetime
+                        positions.append(np.empty(0, dtype=np.int32))
+                        continue
+                    values[offset : offset + len(data)] = data[fields].values
+                    positions.append(calendar.searchsorted(data.index).astype(np.int32))
+        finally:
+            Profiler.enabled = enabled
+            del values
+        return positions, stats if profile else None
+
+    @staticmethod
+    def profiled_inst_calculator(*args, **kwargs):
+        """the same as `inst_calculator` with the expressions profiled, return the data and the stats of `Profiler`"""
+        enabled = Profiler.enabled
+        Profiler.enabled = True
+        try:
+            with Profiler.collect() as stats:
+                data = DatasetProvider.inst_calculator(*args, **kwargs)
+        finally:
+            Profiler.enabled = enabled
+        return data, stats
+
     @staticmethod
     def inst_calculator(inst, start_time, end_time, freq, column_names, spans=None, g_config=None, inst_processors=[]):
         """
@@ -609,16 +1009,13 @@ class DatasetProvider(abc.ABC):
         # NOTE: This place is compatible with windows, windows multi-process is spawn
         C.register_from_C(g_config)
 
-        obj = dict()
-        for field in column_names:
-            #  The client does not have expression provider, the data will be loaded from cache using static method.
-            obj[field] = ExpressionD.expression(inst, field, start_time, end_time, freq)
-        
+        #  The client does not have expression provider, the data will be loaded from cache using static method.
+        obj = ExpressionD.expressions(inst, column_names, start_time, end_time, freq)
+
         data = pd.DataFrame(obj)
         if not data.empty and not np.issubdtype(data.index.dtype, np.dtype("M")):
             # If the underlaying provides the data not in datetime format, we'll convert it into datetime format
-            _calendar = Cal.calendar(freq=freq)
-            data.index = _calendar[data.index.values.astype(int)]
+            data.index = Cal.index_to_datetime(data.index.values.astype(int), freq=freq)
         data.index.names = ["datetime"]
 
         if not data.empty and spans is not None:
@@ -658,8 +1055,18 @@ class LocalCalendarProvider(CalendarProvider, ProviderBackendMixin):
         list
             list of timestamps
         """
+        return [pd.Timestamp(x) for x in self._load_backend_calendar(freq, future, "data")]
+
+    def load_calendar_array(self, freq, future):
+        """Load original calendar from file as a `datetime64[ns]` array.
+
+        The binary calendar(e.g. `calendars/day.npy`) is memory-mapped if the backend supports it.
+        """
+        return self._load_backend_calendar(freq, future, "data_array")
+
+    def _load_backend_calendar(self, freq, future, attr):
         try:
-            backend_obj = self.backend_obj(freq=freq, future=future).data
+            backend_obj = getattr(self.backend_obj(freq=freq, future=future), attr)
         except ValueError:
             if future:
                 get_module_logger("data").warning(
@@ -668,11 +1075,10 @@ class LocalCalendarProvider(CalendarProvider, ProviderBackendMixin):
                 get_module_logger("data").warning(
                     "You can get future calendar by referring to the following document: https://github.com/microsoft/qlib/blob/main/scripts/data_collector/contrib/README.md"
                 )
-                backend_obj = self.backend_obj(freq=freq, future=False).data
+                backend_obj = getattr(self.backend_obj(freq=freq, future=False), attr)
             else:
                 raise
-
-        return [pd.Timestamp(x) for x in backend_obj]
+        return backend_obj
 
 
 class LocalInstrumentProvider(InstrumentProvider, ProviderBackendMixin):
@@ -738,7 +1144,54 @@ class LocalFeatureProvider(FeatureProvider, ProviderBackendMixin):
         # validate
         field = str(field)[1:]
         instrument = code_to_fname(instrument)
-        return self.backend_obj(instrument=instrument, field=field, freq=freq)[start_index : end_index + 1]
+        storage = self.backend_obj(instrument=instrument, field=field, freq=freq)
+        if SharedMemCache.enabled():
+            return self._shared_feature(storage, (instrument, field, freq), start_index, end_index)
+        return storage[start_index : end_index + 1]
+
+    @staticmethod
+    def _shared_feature(storage, key, start_index, end_index):
+        """load the feature from the whole series shared by the worker processes"""
+        key = str(C.dpm.get_data_uri(key[2])), *key
+        data = SharedMemCache.get(key)
+        if data is None:
+            series = storage[:]
+            if len(series) == 0:
+                return series
+            data = series_to_array(series)
+            SharedMemCache.set(key, *data)
+        _start, values = data
+        start = max(start_index, _start)
+        values = values[start - _start : max(end_index - _start + 1, 0)]
+        return pd.Series(values, index=pd.RangeIndex(start, start + len(values)))
+
+    def feature_panel(self, instruments, field, start_index, end_index, freq):
+        storage = self.backend_obj(instrument=code_to_fname(instruments[0]), field=str(field)[1:], freq=freq)
+        if not hasattr(storage, "panel"):
+            return super().feature_panel(instruments, field, start_index, end_index, freq)
+        # the storage provides the field of all the instruments at once, e.g. `PanelFeatureStorage`
+        panel = storage.panel(start_index, end_index).reindex(
+            index=pd.RangeIndex(start_index, end_index + 1),
+            columns=[code_to_fname(inst).lower() for inst in instruments],
+        )
+        panel.columns = instruments
+        return panel
+
+    def feature_panel_index(self, instruments, field, start_index, end_index, freq):
+        field = str(field)[1:]
+        storage = self.backend_obj(instrument=code_to_fname(instruments[0]), field=field, freq=freq)
+        if hasattr(storage, "ranges"):
+            ranges = storage.ranges.reindex([code_to_fname(inst).lower() for inst in instruments]).values
+        else:
+            ranges = []
+            for inst in instruments:
+                storage = self.backend_obj(instrument=code_to_fname(inst), field=field, freq=freq)
+                _start, _end = storage.start_index, storage.end_index
+                ranges.append((np.nan, np.nan) if _start is None else (_start, _end))
+            ranges = np.array(ranges, dtype=float).reshape(-1, 2)
+        index = np.arange(start_index, end_index + 1)[:, None]
+        # the absent instruments are NaN or -1
+        return (index >= ranges[:, 0]) & (index <= ranges[:, 1])
 
 
 class LocalPITProvider(PITProvider):
@@ -753,52 +1206,18 @@ class LocalPITProvider(PITProvider):
 
         assert end_index <= 0  # PIT don't support querying future data
 
-        DATA_RECORDS = [
-            ("date", C.pit_record_type["date"]),
-            ("period", C.pit_record_type["period"]),
-            ("value", C.pit_record_type["value"]),
-            ("_next", C.pit_record_type["index"]),
-        ]
         VALUE_DTYPE = C.pit_record_type["value"]
 
-        field = str(field).lower()[2:]
-        instrument = code_to_fname(instrument)
-
-        # {For acceleration
-        # start_index, end_index, cur_index = kwargs["info"]
-        # if cur_index == start_index:
-        #     if not hasattr(self, "all_fields"):
-        #         self.all_fields = []
-        #     self.all_fields.append(field)
-        #     if not hasattr(self, "period_index"):
-        #         self.period_index = {}
-        #     if field not in self.period_index:
-        #         self.period_index[field] = {}
-        # For acceleration}
-
-        if not field.endswith("_q") and not field.endswith("_a"):
-            raise ValueError("period field must ends with '_q' or '_a'")
-        quarterly = field.endswith("_q")
-        index_path = C.dpm.get_data_uri() / "financial" / instrument.lower() / f"{field}.index"
-        data_path = C.dpm.get_data_uri() / "financial" / instrument.lower() / f"{field}.data"
-        if not (index_path.exists() and data_path.exists()):
-            raise FileNotFoundError("No file is found.")
-        # NOTE: The most significant performance loss is here.
-        # Does the acceleration that makes the program complicated really matters?
-        # - It makes parameters of the interface complicate
-        # - It does not performance in the optimal way (places all the pieces together, we may achieve higher performance)
-        #    - If we design it carefully, we can go through for only once to get the historical evolution of the data.
-        # So I decide to deprecated previous implementation and keep the logic of the program simple
-        # Instead, I'll add a cache for the index file.
-        data = np.fromfile(data_path, dtype=DATA_RECORDS)
+        instrument, field, quarterly = self._parse_field(instrument, field)
+        data, period_max, period_min, chains = self._load_records(instrument, field)
 
         # find all revision periods before `cur_time`
         cur_time_int = int(cur_time.year) * 10000 + int(cur_time.month) * 100 + int(cur_time.day)
         loc = np.searchsorted(data["date"], cur_time_int, side="right")
         if loc <= 0:
             return pd.Series(dtype=C.pit_record_type["value"])
-        last_period = data["period"][:loc].max()  # return the latest quarter
-        first_period = data["period"][:loc].min()
+        last_period = period_max[loc - 1]  # return the latest quarter
+        first_period = period_min[loc - 1]
         period_list = get_period_list(first_period, last_period, quarterly)
         if period is not None:
             # NOTE: `period` has higher priority than `start_index` & `end_index`
@@ -810,25 +1229,99 @@ class LocalPITProvider(PITProvider):
             period_list = period_list[max(0, len(period_list) + start_index - 1) : len(period_list) + end_index]
         value = np.full((len(period_list),), np.nan, dtype=VALUE_DTYPE)
         for i, p in enumerate(period_list):
-            # last_period_index = self.period_index[field].get(period)  # For acceleration
-            value[i], now_period_index = read_period_data(
-                index_path, data_path, p, cur_time_int, quarterly  # , last_period_index  # For acceleration
-            )
-            # self.period_index[field].update({period: now_period_index})  # For acceleration
+            value[i] = self._asof_value(chains, p, np.array([cur_time_int]))[0]
         # NOTE: the index is period_list; So it may result in unexpected values(e.g. nan)
         # when calculation between different features and only part of its financial indicator is published
         series = pd.Series(value, index=period_list, dtype=VALUE_DTYPE)
 
-        # {For acceleration
-        # if cur_index == end_index:
-        #     self.all_fields.remove(field)
-        #     if not len(self.all_fields):
-        #         del self.all_fields
-        #         del self.period_index
-        # For acceleration}
-
         return series
 
+    def period_feature_asof(self, instrument, field, start_index, end_index, freq, period=None):
+        instrument, field, quarterly = self._parse_field(instrument, field)
+        data, period_max, period_min, chains = self._load_records(instrument, field)
+
+        _calendar = Cal.index_to_datetime(np.arange(start_index, end_index + 1), freq=freq)
+        date_int = np.asarray(_calendar.year * 10000 + _calendar.month * 100 + _calendar.day, dtype=np.int64)
+        # the records before each trading day
+        loc = np.searchsorted(data["date"], date_int, side="right")
+        known = loc > 0
+        last_period = np.where(known, period_max[np.maximum(loc - 1, 0)], 0)
+        value = np.full(len(date_int), np.nan, dtype=C.pit_record_type["value"])
+        if period is None:
+            # the latest period is non-decreasing, so there are only a few groups of trading days
+            for p in np.unique(last_period[known]):
+                mask = known & (last_period == p)
+                value[mask] = self._asof_value(chains, p, date_int[mask])
+        elif not quarterly or 1 <= period % 100 <= 4:
+            # NOTE: the same as `period in get_period_list(first_period, last_period, quarterly)`
+            first_period = np.where(known, period_min[np.maximum(loc - 1, 0)], 0)
+            mask = known & (first_period <= period) & (period <= last_period)
+            value[mask] = self._asof_value(chains, period, date_int[mask])
+        return pd.Series(value.astype(np.float32), index=pd.RangeIndex(start_index, end_index + 1))
+
+    @staticmethod
+    def _parse_field(instrument, field):
+        field = str(field).lower()[2:]
+        instrument = code_to_fname(instrument)
+        if not field.endswith("_q") and not field.endswith("_a"):
+            raise ValueError("period field must ends with '_q' or '_a'")
+        return instrument, field, field.endswith("_q")
+
+    @staticmethod
+    def _load_records(instrument, field):
+        """Load the records of a financial file and index the revisions of each period, only once per file.
+
+        Returns
+        -------
+        np.ndarray
+            the records of `<field>.data`, in the order of publication.
+        np.ndarray
+            the latest period published in the records[: i + 1].
+        np.ndarray
+            the earliest period published in the records[: i + 1].
+        dict
+            period -> (cumulative max of the revision dates, revision values); the revisions are ordered the
+            same as the linked list of `<field>.index` and `<field>.data`.
+        """
+        DATA_RECORDS = [
+            ("date", C.pit_record_type["date"]),
+            ("period", C.pit_record_type["period"]),
+            ("value", C.pit_record_type["value"]),
+            ("_next", C.pit_record_type["index"]),
+        ]
+
+        index_path = C.dpm.get_data_uri() / "financial" / instrument.lower() / f"{field}.index"
+        data_path = C.dpm.get_data_uri() / "financial" / instrument.lower() / f"{field}.data"
+        key = "pit" + str(data_path)
+        if key in H["m"]:
+            return H["m"][key]
+        if not (index_path.exists() and data_path.exists()):
+            raise FileNotFoundError("No file is found.")
+
+        if data_path.stat().st_size > 0:
+            data = np.memmap(data_path, dtype=DATA_RECORDS, mode="r")
+        else:
+            data = np.empty(0, dtype=DATA_RECORDS)
+        period_max = np.maximum.accumulate(data["period"]) if len(data) > 0 else data["period"]
+        period_min = np.minimum.accumulate(data["period"]) if len(data) > 0 else data["period"]
+        chains = {}
+        order = np.argsort(data["period"], kind="stable")
+        periods, starts = np.unique(data["period"][order], return_index=True)
+        for p, _idx in zip(periods, np.split(order, starts[1:])):
+            # reading the linked list stops at the first revision after the query date
+            chains[p] = np.maximum.accumulate(data["date"][_idx]), np.asarray(data["value"][_idx])
+        H["m"][key] = data, period_max, period_min, chains
+        return H["m"][key]
+
+    @staticmethod
+    def _asof_value(chains, period, date_int: np.ndarray) -> np.ndarray:
+        """the latest revision of `period` published before or at each date of `date_int`"""
+        if period not in chains or len(date_int) == 0:
+            return np.full(len(date_int), C.pit_record_nan["value"], dtype=C.pit_record_type["value"])
+        dates, values = chains[period]
+        loc = np.searchsorted(dates, date_int, side="right")
+        return np.where(loc > 0, values[np.maximum(loc - 1, 0)], C.pit_record_nan["value"])
+
 
 class LocalExpressionProvider(ExpressionProvider):
     """Local expression data provider class
@@ -839,6 +1332,8 @@ class LocalExpressionProvider(ExpressionProvider):
     def __init__(self, time2idx=True):
         super().__init__()
         self.time2idx = time2idx
+        # the least recently used DAGs are dropped, the index range of the queries may change every time
+        self.compiled_cache = MemCacheLengthUnit(C.compiled_expressions_limit)
 
     def expression(self, instrument, field, start_time=None, end_time=None, freq="day"):
         expression = self.get_expression_instance(field)
@@ -850,13 +1345,16 @@ class LocalExpressionProvider(ExpressionProvider):
         # - Data with datetime index expression: this will make it more convenient to integrating with some existing databases
         if self.time2idx:
             _, _, start_index, end_index = Cal.locate_index(start_time, end_time, freq=freq, future=False)
-            lft_etd, rght_etd = expression.get_extended_window_size()
-            query_start, query_end = max(0, start_index - lft_etd), end_index + rght_etd
+            query_start, query_end = self._get_query_range(expression, start_index, end_index)
         else:
             start_index, end_index = query_start, query_end = start_time, end_time
 
         try:
-            series = expression.load(instrument, query_start, query_end, freq)
+            if Profiler.enabled:
+                with Profiler.field(field):
+                    series = expression.load(instrument, query_start, query_end, freq)
+            else:
+                series = expression.load(instrument, query_start, query_end, freq)
         except Exception as e:
             get_module_logger("data").debug(
                 f"Loading expression error: "
@@ -864,6 +1362,67 @@ class LocalExpressionProvider(ExpressionProvider):
                 f"error info: {str(e)}"
             )
             raise
+        return self._format_series(series, start_index, end_index)
+
+    def expressions(self, instrument, fields, start_time=None, end_time=None, freq="day"):
+        if not (C.compile_expressions and self.time2idx):
+            return super().expressions(instrument, fields, start_time, end_time, freq)
+        start_time = time_to_slc_point(start_time)
+        end_time = time_to_slc_point(end_time)
+        _, _, start_index, end_index = Cal.locate_index(start_time, end_time, freq=freq, future=False)
+        compiled = self.get_compiled_expressions(fields, start_index, end_index)
+        try:
+            series_l = compiled.load(instrument, freq)
+        except Exception as e:
+            get_module_logger("data").debug(
+                f"Loading expression error: "
+                f"instrument={instrument}, fields={fields}, start_time={start_time}, end_time={end_time}, freq={freq}. "
+                f"error info: {str(e)}"
+            )
+            raise
+        return {field: self._format_series(series, start_index, end_index) for field, series in zip(fields, series_l)}
+
+    def get_compiled_expressions(self, fields, start_index, end_index):
+        """compile the fields into one DAG, the result only depends on the fields and the index range"""
+        key = tuple(fields), start_index, end_index
+        if key not in self.compiled_cache:
+            expressions = self.get_expression_instances(fields)
+            ranges = [self._get_query_range(expression, start_index, end_index) for expression in expressions]
+            compiled = CompiledExpressions(expressions, ranges, fuse=C.fuse_expressions, names=fields)
+            get_module_logger("data").debug(
+                f"{len(fields)} fields are compiled into {compiled.n_nodes} nodes, "
+                f"{compiled.n_saved} of {compiled.n_expressions} evaluations are saved, "
+                f"{compiled.n_fused} nodes are fused into {len(compiled.kernels)} kernels"
+            )
+            self.compiled_cache[key] = compiled
+        return self.compiled_cache[key]
+
+    def expression_panels(self, instruments, fields, start_time=None, end_time=None, freq="day"):
+        if not self.time2idx:
+            raise NotImplementedError("Only the index-based expressions can be evaluated as panels")
+        start_time = time_to_slc_point(start_time)
+        end_time = time_to_slc_point(end_time)
+        _, _, start_index, end_index = Cal.locate_index(start_time, end_time, freq=freq, future=False)
+        compiled = self.get_compiled_expressions(fields, start_index, end_index)
+        panels, indexes = compiled.load_panel(list(instruments), freq)
+
+        obj = dict()
+        in_index = np.zeros((end_index - start_index + 1, len(instruments)), dtype=bool)
+        for field, panel, index, (query_start, _) in zip(fields, panels, indexes, compiled.ranges):
+            index = index[start_index - query_start : end_index - query_start + 1]
+            values = np.array(panel.loc[start_index:end_index].values, dtype=np.float32)
+            values[~index] = np.nan
+            obj[field] = pd.DataFrame(values, index=pd.RangeIndex(start_index, end_index + 1), columns=instruments)
+            in_index |= index
+        return obj, in_index
+
+    @staticmethod
+    def _get_query_range(expression, start_index, end_index):
+        lft_etd, rght_etd = expression.get_extended_window_size()
+        return max(0, start_index - lft_etd), end_index + rght_etd
+
+    @staticmethod
+    def _format_series(series, start_index, end_index):
         # Ensure that each column type is consistent
         # FIXME:
         # 1) The stock data is currently float. If there is other types of data, this part needs to be re-implemented.
@@ -1189,6 +1748,72 @@ class BaseProvider:
         except TypeError:
             return DatasetD.dataset(instruments, fields, start_time, end_time, freq, inst_processors=inst_processors)
 
+    def features_iter(
+        self,
+        instruments,
+        fields,
+        start_time=None,
+        end_time=None,
+        freq="day",
+        chunk_by="time",
+        chunk_size=None,
+        disk_cache=None,
+        inst_processors=[],
+    ):
+        """
+        Yield the data of `features` chunk by chunk instead of loading it at once, so the memory is bounded by the
+        size of a chunk.
+
+        Parameters
+        ----------
+        chunk_by : str
+            "time": the chunks of `chunk_size` (250 by default) bars of the calendar, all the instruments in each;
+            "instrument": the chunks of `chunk_size` (100 by default) instruments, the whole time range in each.
+        chunk_size : int
+            the number of bars or instruments of a chunk.
+        disk_cache : int
+            whether to skip(0)/use(1)/replace(2) disk_cache of every chunk.
+
+        Every chunk is loaded by `features`, so the expressions are loaded with their extended window around the
+        chunk (please refer to `Expression.get_extended_window_size`), and the chunks are the same as the slices of
+        the data of `features`. But the results depending on where the data starts differ near the start of the
+        chunks by time: the expressions without an accurate window (e.g. `EMA` or the expanding rolling operators
+        with N = 0) and the rounding errors of the rolling kernels accumulating values (e.g. `Corr`).
+        `inst_processors` are applied to every chunk separately.
+
+        The chunks without data are skipped. The instruments are resolved once for the whole time range.
+        """
+        if chunk_by not in ("time", "instrument"):
+            raise ValueError(f"Unsupported chunk_by {chunk_by}, it should be 'time' or 'instrument'")
+        if chunk_size is None:
+            chunk_size = 250 if chunk_by == "time" else 100
+        if chunk_size <= 0:
+            raise ValueError("chunk_size should be positive")
+        instruments_d = DatasetProvider.get_instruments_d(instruments, freq)
+
+        if chunk_by == "time":
+            calendar = Cal.calendar(start_time, end_time, freq)
+            chunks = [
+                (instruments_d, calendar[i], calendar[min(i + chunk_size, len(calendar)) - 1])
+                for i in range(0, len(calendar), chunk_size)
+            ]
+        else:
+            if isinstance(instruments_d, dict):
+                inst_l = sorted(instruments_d.keys())
+                inst_chunks = [
+                    {inst: instruments_d[inst] for inst in inst_l[i : i + chunk_size]}
+                    for i in range(0, len(inst_l), chunk_size)
+                ]
+            else:
+                inst_l = sorted(set(instruments_d))
+                inst_chunks = [inst_l[i : i + chunk_size] for i in range(0, len(inst_l), chunk_size)]
+            chunks = [(inst_chunk, start_time, end_time) for inst_chunk in inst_chunks]
+
+        for inst_chunk, chunk_start, chunk_end in chunks:
+            data = self.features(inst_chunk, fields, chunk_start, chunk_end, freq, disk_cache, inst_processors)
+            if len(data) > 0:
+                yield data
+
 
 class LocalProvider(BaseProvider):
     def _uri(self, type, **kwargs):
@@ -8,7 +8,6 @@ from inspect import getfullargspec
 import pandas as pd
 import numpy as np
 import bisect
-from ...utils import lazy_sort_index
 from .utils import get_level_index
 
 
@@ -335,13 +334,29 @@ class TSDataSampler:
             (1) Get the i-th indexable sample(time-series):   (indexable sample index) -> [idx_map] -> (row col) -> [idx_df] -> (index in data_arr)
             (2) Get the specific sample by <datetime, instrument>:  (<datetime, instrument>, i.e. <row, col>) -> [idx_df] -> (index in data_arr)
             (3) Get the index of a time-series data:   (get the <row, col>, refer to (1), (2)) -> [idx_df] -> (all indices in data_arr for time-series)
+
+        Sparse index:
+            idx_df is dense in <datetime, instrument>. It costs a lot of memory when most of the cells are empty (e.g.
+            high frequency data or a long history of a churning universe). With `sparse_index=True`, idx_df is not
+            built and its role is taken by
+
+            idx_key: np.ndarray
+                The key `col * len(idx_rows) + row` of every row of data_arr, <row, col> is the position of the row in
+                the (not built) idx_df. The keys are sorted because data_arr is sorted by <instrument, datetime>, so
+                the indices of a time-series are searched in it. It is proportional to the number of the rows.
     """
 
     # Please refer to the docstring of TSDataSampler for the definition of following attributes
     data_arr: np.ndarray
     data_index: pd.MultiIndex
     idx_map: np.ndarray
-    idx_df: pd.DataFrame
+    idx_df: Optional[pd.DataFrame]
+    # the datetime of the rows and the instrument of the columns of idx_df
+    idx_rows: pd.Index
+    idx_cols: pd.Index
+    idx_key: Optional[np.ndarray] = None
+    # the indices in data_arr of the time-series of all the samples, please refer to `build_idx_matrix`
+    idx_matrix: Optional[np.ndarray] = None
 
     def __init__(
         self,
@@ -352,6 +367,7 @@ class TSDataSampler:
         fillna_type: str = "none",
         dtype=None,
         flt_data=None,
+        sparse_index: bool = False,
     ):
         """
         Build a dataset which looks like torch.data.utils.Dataset.
@@ -378,6 +394,8 @@ class TSDataSampler:
             a column of data(True or False) to filter data. Its index order is <"datetime", "instrument">
             None:
                 kepp all data
+        sparse_index : bool
+            use the sparse index (`idx_key`) instead of `idx_df`, please refer to the docstring of TSDataSampler
 
         """
         self.start = start
@@ -407,7 +425,16 @@ class TSDataSampler:
 
         # the data type will be changed
         # The index of usable data is between start_idx and end_idx
-        self.idx_df, self.idx_map = self.build_index(self.data)
+        if sparse_index:
+            self.idx_df = None
+            self.idx_rows, self.idx_cols, row, col = self.get_index_codes(self.data)
+            self.idx_key = col * len(self.idx_rows) + row
+            if (np.diff(self.idx_key) <= 0).any():
+                raise ValueError("Index contains duplicate entries, cannot reshape")
+            self.idx_map = np.stack([row, col], axis=1)
+        else:
+            self.idx_df, self.idx_map = self.build_index(self.data)
+            self.idx_rows, self.idx_cols = self.idx_df.index, self.idx_df.columns
         self.data_index = deepcopy(self.data.index)
 
         if flt_data is not None:
@@ -423,10 +450,11 @@ class TSDataSampler:
             self.data_index = self.data_index[np.where(self.flt_data)[0]]
         self.idx_map = self.idx_map2arr(self.idx_map)
         self.idx_map, self.data_index = self.slice_idx_map_and_data_index(
-            self.idx_map, self.idx_df, self.data_index, start, end
+            self.idx_map, self.idx_rows, self.data_index, start, end
         )
 
-        self.idx_arr = np.array(self.idx_df.values, dtype=np.float64)  # for better performance
+        if self.idx_df is not None:
+            self.idx_arr = np.array(self.idx_df.values, dtype=np.float64)  # for better performance
         del self.data  # save memory
 
     @staticmethod
@@ -441,7 +469,9 @@ class TSDataSampler:
             len(idx_map) == data_index.shape[0]
         )  # make sure idx_map and data_index is same so index of idx_map can be used on data_index
 
-        start_row_idx, end_row_idx = idx_df.index.slice_locs(start=time_to_slc_point(start), end=time_to_slc_point(end))
+        # the datetime index of idx_df is enough
+        idx_index = idx_df.index if isinstance(idx_df, pd.DataFrame) else idx_df
+        start_row_idx, end_row_idx = idx_index.slice_locs(start=time_to_slc_point(start), end=time_to_slc_point(end))
 
         time_flter_idx = (idx_map[:, 0] < end_row_idx) & (idx_map[:, 0] >= start_row_idx)
         return idx_map[time_flter_idx], data_index[time_flter_idx]
@@ -455,6 +485,10 @@ class TSDataSampler:
         # The arr_map is expected to behave the same as idx_map
 
         dtype = np.int32
+        if isinstance(idx_map, np.ndarray):
+            # `build_index` gives the array directly
+            return idx_map.astype(dtype, copy=False)
+
         # set a index out of bound to indicate the none existing
         no_existing_idx = (np.iinfo(dtype).max, np.iinfo(dtype).max)
 
@@ -467,6 +501,8 @@ class TSDataSampler:
 
     @staticmethod
     def flt_idx_map(flt_data, idx_map):
+        if isinstance(idx_map, np.ndarray):
+            return idx_map[np.asarray(flt_data, dtype=bool)]
         idx = 0
         new_idx_map = {}
         for i, exist in enumerate(flt_data):
@@ -484,11 +520,67 @@ class TSDataSampler:
 
     def config(self, **kwargs):
         # Config the attributes
+        if ("step_len" in kwargs or "fillna_type" in kwargs) and "idx_matrix" not in kwargs:
+            # the precomputed indices are outdated
+            self.idx_matrix = None
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def build_idx_matrix(self, path: Optional[str] = None, chunk_size: int = 100000) -> np.ndarray:
+        """
+        Precompute the indices in `data_arr` of the time-series of all the samples, so a batch of samples is
+        gathered by a single fancy indexing in `__getitem__`.
+
+        Parameters
+        ----------
+        path : Optional[str]
+            the indices are saved to the `.npy` file and memory mapped if it is given, they are kept in memory
+            otherwise.
+        chunk_size : int
+            the number of samples computed at a time
+
+        Returns
+        -------
+        np.ndarray:
+            the indices in shape (len(self), self.step_len), it is `self.idx_matrix` as well.
+        """
+        dtype = np.int32 if self.nan_idx <= np.iinfo(np.int32).max else np.int64
+        shape = (len(self), self.step_len)
+        if path is None:
+            idx_matrix = np.empty(shape, dtype=dtype)
+        else:
+            idx_matrix = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        for start in range(0, len(self), chunk_size):
+            idx_map = self.idx_map[start : start + chunk_size]
+            idx_matrix[start : start + chunk_size] = self._get_indices_batch(idx_map[:, 0], idx_map[:, 1])
+        if path is not None:
+            idx_matrix.flush()
+            idx_matrix = np.load(path, mmap_mode="r")
+        self.idx_matrix = idx_matrix
+        return idx_matrix
+
+    @staticmethod
+    def get_index_codes(data: pd.DataFrame) -> Tuple[pd.Index, pd.Index, np.ndarray, np.ndarray]:
+        """
+        The sorted datetimes and instruments of `data` (with index in order <instrument, datetime>) and the <row, col>
+        of every row of `data` in them, i.e. the index and columns of `idx_df` and the positions of the rows in it.
+        """
+        index = data.index.remove_unused_levels()
+        levels, codes = [], []
+        for level, level_codes in zip(index.levels, index.codes):
+            # NOTE: the correctness of `__getitem__` depends on columns sorted here
+            if not level.is_monotonic_increasing:
+                order = level.argsort()
+                rank = np.empty(len(level), dtype=np.int64)
+                rank[order] = np.arange(len(level))
+                level, level_codes = level[order], rank[level_codes]
+            levels.append(level)
+            codes.append(level_codes.astype(np.int64))
+        (instruments, datetimes), (col, row) = levels, codes
+        return datetimes, instruments, row, col
+
     @staticmethod
-    def build_index(data: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
+    def build_index(data: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
         """
         The relation of the data
 
@@ -507,7 +599,7 @@ class TSDataSampler:
 
         Returns
         -------
-        Tuple[pd.DataFrame, dict]:
+        Tuple[pd.DataFrame, np.ndarray]:
             1) the first element:  reshape the original index into a <datetime(row), instrument(column)> 2D dataframe
                 instrument SH600000 SH600008 SH600009 SH600010 SH600011 SH600015  ...
                 datetime
@@ -515,19 +607,19 @@ class TSDataSampler:
                 2017-01-04        1      243      474      718      NaN      975  ...
                 2017-01-05        2      244      475      719      NaN      976  ...
                 2017-01-06        3      245      476      720      NaN      977  ...
-            2) the second element:  {<original index>: <row, col>}
+            2) the second element:  the <row, col> in the first element of every row of `data`, in shape (len(data), 2)
         """
+        datetimes, instruments, row, col = TSDataSampler.get_index_codes(data)
+        pos = np.full((len(datetimes), len(instruments)), -1, dtype=np.int64)
+        pos[row, col] = np.arange(data.shape[0])
+        if (pos[row, col] != np.arange(data.shape[0])).any():
+            raise ValueError("Index contains duplicate entries, cannot reshape")
         # object incase of pandas converting int to float
-        idx_df = pd.Series(range(data.shape[0]), index=data.index, dtype=object)
-        idx_df = lazy_sort_index(idx_df.unstack())
-        # NOTE: the correctness of `__getitem__` depends on columns sorted here
-        idx_df = lazy_sort_index(idx_df, axis=1).T
-
-        idx_map = {}
-        for i, (_, row) in enumerate(idx_df.iterrows()):
-            for j, real_idx in enumerate(row):
-                if not np.isnan(real_idx):
-                    idx_map[real_idx] = (i, j)
+        idx_arr = pos.astype(object)
+        idx_arr[pos < 0] = np.nan
+        idx_df = pd.DataFrame(idx_arr, index=datetimes, columns=instruments)
+
+        idx_map = np.stack([row, col], axis=1)
         return idx_df, idx_map
 
     @property
@@ -550,6 +642,11 @@ class TSDataSampler:
         np.array:
             The indices of data of the data
         """
+        if self.idx_key is not None:
+            if col >= len(self.idx_cols):
+                # the same as indexing the columns of the dense idx_arr, e.g. an instrument after all the known ones
+                raise IndexError(f"index {col} is out of bounds for {len(self.idx_cols)} instruments")
+            return self._get_indices_batch(np.array([row]), np.array([col]))[0]
         indices = self.idx_arr[max(row - self.step_len + 1, 0) : row + 1, col]
 
         if len(indices) < self.step_len:
@@ -563,6 +660,73 @@ class TSDataSampler:
             assert self.fillna_type == "none"
         return indices
 
+    def _get_indices_batch(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        the vectorized `_get_indices` of many samples, the missing data are indexed by `self.nan_idx`
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            the rows in self.idx_df
+        cols : np.ndarray
+            the cols in self.idx_df
+
+        Returns
+        -------
+        np.ndarray:
+            The indices of data of the samples in shape (len(rows), self.step_len)
+        """
+        rows = rows[:, None] + np.arange(1 - self.step_len, 1)
+        if self.idx_key is not None:
+            return self._get_sparse_indices(rows, cols)
+        indices = self.idx_arr[np.maximum(rows, 0), cols[:, None]]
+        indices[rows < 0] = np.nan
+
+        if self.fillna_type == "ffill":
+            indices = np_ffill(indices)
+        elif self.fillna_type == "ffill+bfill":
+            indices = np_ffill(np_ffill(indices)[:, ::-1])[:, ::-1]
+        else:
+            assert self.fillna_type == "none"
+        dtype = np.int32 if self.nan_idx <= np.iinfo(np.int32).max else np.int64
+        return np.nan_to_num(indices, nan=self.nan_idx).astype(dtype)
+
+    def _get_sparse_indices(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        `_get_indices_batch` by searching `self.idx_key`
+
+        Parameters
+        ----------
+        rows : np.ndarray
+            the rows of the time-series in shape (len(cols), self.step_len)
+        cols : np.ndarray
+            the cols in self.idx_df
+        """
+        dtype = np.int32 if self.nan_idx <= np.iinfo(np.int32).max else np.int64
+        key = self.idx_key
+        if len(key) == 0:
+            return np.full(rows.shape, self.nan_idx, dtype=dtype)
+        base = cols.astype(np.int64)[:, None] * len(self.idx_rows)
+        keys = base + rows
+        # the first key of the time-series, the padding before the first row of idx_df is excluded
+        first_key = base + np.maximum(rows[:, :1], 0)
+        if self.fillna_type == "none":
+            pos = np.minimum(np.searchsorted(key, keys), len(key) - 1)
+            found = (key[pos] == keys) & (rows >= 0)
+        else:
+            # ffill: the last data at or before the step in the time-series
+            pos = np.maximum(np.searchsorted(key, keys, side="right") - 1, 0)
+            found = (key[pos] >= first_key) & (key[pos] <= keys)
+            if self.fillna_type == "ffill+bfill":
+                # bfill: the steps before the first data of the time-series are filled by it
+                first_pos = np.minimum(np.searchsorted(key, first_key), len(key) - 1)
+                first_found = (key[first_pos] >= first_key) & (key[first_pos] <= keys[:, -1:])
+                pos = np.where(found, pos, first_pos)
+                found |= first_found
+            else:
+                assert self.fillna_type == "ffill"
+        return np.where(found, pos, self.nan_idx).astype(dtype)
+
     def _get_row_col(self, idx) -> Tuple[int]:
         """
         get the col index and row index of a given sample index in self.idx_df
@@ -588,9 +752,9 @@ class TSDataSampler:
             # <TSDataSampler object>["datetime", "instruments"]
             date, inst = idx
             date = pd.Timestamp(date)
-            i = bisect.bisect_right(self.idx_df.index, date) - 1
+            i = bisect.bisect_right(self.idx_rows, date) - 1
             # NOTE: This relies on the idx_df columns sorted in `__init__`
-            j = bisect.bisect_left(self.idx_df.columns, inst)
+            j = bisect.bisect_left(self.idx_cols, inst)
         else:
             raise NotImplementedError(f"This type of input is not supported")
         return i, j
@@ -615,6 +779,18 @@ class TSDataSampler:
         """
         # Multi-index type
         mtit = (list, np.ndarray)
+        if isinstance(idx, mtit) and len(idx) > 0 and np.asarray(idx).dtype.kind in "iu":
+            # the batch of samples is gathered by a single fancy indexing
+            idx = np.asarray(idx)
+            out_of_bound = (idx < 0) | (idx >= len(self.idx_map))
+            if out_of_bound.any():
+                raise KeyError(f"{idx[out_of_bound][0]} is out of [0, {len(self.idx_map)})")
+            if self.idx_matrix is not None:
+                indices = self.idx_matrix[idx]
+            else:
+                indices = self._get_indices_batch(self.idx_map[idx, 0], self.idx_map[idx, 1])
+            # <sample_idx, step_idx, feature_idx>
+            return self.data_arr[indices]
         if isinstance(idx, mtit):
             indices = [self._get_indices(*self._get_row_col(i)) for i in idx]
             indices = np.concatenate(indices)
@@ -691,6 +867,7 @@ class TSDatasetH(DatasetH):
         NOTE: TSDatasetH only support slc segment on datetime !!!
         """
         dtype = kwargs.pop("dtype", None)
+        sparse_index = kwargs.pop("sparse_index", False)
         if not isinstance(slc, slice):
             slc = slice(*slc)
         start, end = slc.start, slc.stop
@@ -715,6 +892,7 @@ class TSDatasetH(DatasetH):
             step_len=self.step_len,
             dtype=dtype,
             flt_data=flt_data,
+            sparse_index=sparse_index,
         )
         return tsds
 
@@ -2,16 +2,20 @@
 # Licensed under the MIT License.
 
 # coding=utf-8
+import shutil
 import warnings
+from pathlib import Path
 from typing import Callable, Union, Tuple, List, Iterator, Optional
 
+import numpy as np
 import pandas as pd
+from packaging import version
 
 from qlib.typehint import Literal
 from ...log import get_module_logger, TimeInspector
 from ...utils import init_instance_by_config
 from ...utils.serial import Serializable
-from .utils import fetch_df_by_index, fetch_df_by_col
+from .utils import fetch_df_by_index, fetch_df_by_col, FrameSnapshot
 from ...utils import lazy_sort_index
 from .loader import DataLoader
 
@@ -19,6 +23,11 @@ from . import processor as processor_module
 from . import loader as data_loader_module
 
 
+# pandas >= 2.0 splits the blocks into views when some of their columns are replaced, the older versions copy the
+# other columns of the blocks
+is_replacing_columns_by_view = version.parse(pd.__version__) >= version.parse("2.0.0")
+
+
 # TODO: A more general handler interface which does not relies on internal pd.DataFrame is needed.
 class DataHandler(Serializable):
     """
@@ -488,17 +497,55 @@ class DataHandlerLP(DataHandler):
 
     @staticmethod
     def _run_proc_l(
-        df: pd.DataFrame, proc_l: List[processor_module.Processor], with_fit: bool, check_for_infer: bool
+        df: pd.DataFrame,
+        proc_l: List[processor_module.Processor],
+        with_fit: bool,
+        check_for_infer: bool,
+        shared: bool = False,
     ) -> pd.DataFrame:
+        """
+        Parameters
+        ----------
+        shared : bool
+            Is `df` shared with others. If it is, the columns will be copied before they are written inplace by a
+            processor (i.e. copy-on-write), so `df` is not changed.
+        """
+        src = df if shared else None
         for proc in proc_l:
             if check_for_infer and not proc.is_for_infer():
                 raise TypeError("Only processors usable for inference can be used in `infer_processors` ")
             with TimeInspector.logt(f"{proc.__class__.__name__}"):
                 if with_fit:
                     proc.fit(df)
+                if src is not None:
+                    cols = DataHandlerLP._get_shared_columns(df, src, proc.written_columns(df))
+                    if cols is None or (len(cols) > 0 and not is_replacing_columns_by_view):
+                        df, src = df.copy(), None
+                    elif len(cols) > 0:
+                        # the other columns are still shared
+                        df = df.copy(deep=False)
+                        df[cols] = df[cols].copy()
                 df = proc(df)
         return df
 
+    @staticmethod
+    def _get_shared_columns(df: pd.DataFrame, src: pd.DataFrame, cols: Optional[pd.Index]) -> Optional[pd.Index]:
+        """
+        get the columns `cols` of `df` which may share the memory with `src`, None if it is unknown
+        """
+        if cols is not None and len(cols) == 0:
+            return cols
+        if cols is None or not (df.columns.is_unique and src.columns.is_unique):
+            return None
+        cols = cols[cols.isin(src.columns)]
+        shared = []
+        for col in cols:
+            values, src_values = df[col].values, src[col].values
+            if not (isinstance(values, np.ndarray) and isinstance(src_values, np.ndarray)):
+                return None
+            shared.append(np.may_share_memory(values, src_values))
+        return cols[np.array(shared, dtype=bool)]
+
     @staticmethod
     def _is_proc_readonly(proc_l: List[processor_module.Processor]):
         """
@@ -534,26 +581,23 @@ class DataHandlerLP(DataHandler):
         with_fit : bool
             The input of the `fit` will be the output of the previous processor
         """
+        # NOTE: the data passed to the processors are shared with the next steps, the handler or the data loader, so
+        # the processors work on the copies of the columns they write (please refer to `_run_proc_l`)
+
         # shared data processors
-        # 1) assign
-        _shared_df = self._data
-        if not self._is_proc_readonly(self.shared_processors):  # avoid modifying the original data
-            _shared_df = _shared_df.copy()
-        # 2) process
-        _shared_df = self._run_proc_l(_shared_df, self.shared_processors, with_fit=with_fit, check_for_infer=True)
+        _shared_df = self._run_proc_l(
+            self._data, self.shared_processors, with_fit=with_fit, check_for_infer=True, shared=True
+        )
+        if self.drop_raw:
+            del self._data
 
         # data for inference
-        # 1) assign
-        _infer_df = _shared_df
-        if not self._is_proc_readonly(self.infer_processors):  # avoid modifying the original data
-            _infer_df = _infer_df.copy()
-        # 2) process
-        _infer_df = self._run_proc_l(_infer_df, self.infer_processors, with_fit=with_fit, check_for_infer=True)
-
+        _infer_df = self._run_proc_l(
+            _shared_df, self.infer_processors, with_fit=with_fit, check_for_infer=True, shared=True
+        )
         self._infer = _infer_df
 
         # data for learning
-        # 1) assign
         if self.process_type == DataHandlerLP.PTYPE_I:
             _learn_df = _shared_df
         elif self.process_type == DataHandlerLP.PTYPE_A:
@@ -561,15 +605,11 @@ class DataHandlerLP(DataHandler):
             _learn_df = _infer_df
         else:
             raise NotImplementedError(f"This type of input is not supported")
-        if not self._is_proc_readonly(self.learn_processors):  # avoid modifying the original  data
-            _learn_df = _learn_df.copy()
-        # 2) process
-        _learn_df = self._run_proc_l(_learn_df, self.learn_processors, with_fit=with_fit, check_for_infer=False)
-
-        self._learn = _learn_df
-
-        if self.drop_raw:
-            del self._data
+        # release the intermediate data before the processing
+        del _shared_df, _infer_df
+        self._learn = self._run_proc_l(
+            _learn_df, self.learn_processors, with_fit=with_fit, check_for_infer=False, shared=True
+        )
 
     def config(self, processor_kwargs: dict = None, **kwargs):
         """
@@ -585,6 +625,55 @@ class DataHandlerLP(DataHandler):
             for processor in self.get_all_processors():
                 processor.config(**processor_kwargs)
 
+    def to_snapshot(self, path: Union[Path, str], **kwargs):
+        """
+        Dump the handler like `to_pickle(path, dump_all=True)`, but the data (`_data`, `_infer` and `_learn`) are
+        saved as `.npy` files in the directory `path` with the suffix `.data` and only referred by the pickle.
+
+        The data are memory mapped when the pickle is loaded (e.g. by `DataHandlerLP.load` or by a `file://` handler
+        in the task config). So loading a snapshot is fast and the processes loading the same snapshot share one
+        physical copy of the data through the page cache.
+
+        NOTE:
+        - The pickle refers to the data by the absolute path of the directory.
+        - The data are mapped in copy-on-write mode, the writes to them are private to the process.
+
+        Parameters
+        ----------
+        path : Union[Path, str]
+            the path of the pickle
+        kwargs :
+            please refer to `Serializable.to_pickle`, `dump_all` is True by default
+        """
+        path = Path(path)
+        # dump a copy of the handler which refers to the snapshots of the data
+        handler = object.__new__(self.__class__)
+        handler.__dict__.update(self.__dict__)
+        handler.config(**{"dump_all": True, **kwargs})
+        data_dir = path.with_suffix(".data")
+        if data_dir.exists():
+            # NOTE: the removed files are still available to the processes mapping them
+            shutil.rmtree(data_dir)
+        snapshots = {}
+        for attr in DataHandlerLP.ATTR_MAP.values():
+            df = getattr(self, attr, None)
+            if isinstance(df, pd.DataFrame) and handler._is_kept(attr):
+                # the shared data (e.g. `_infer` is `_learn`) are dumped once
+                if id(df) not in snapshots:
+                    snapshots[id(df)] = FrameSnapshot.dump(df, data_dir.joinpath(attr))
+                setattr(handler, attr, snapshots[id(df)])
+        handler.to_pickle(path)
+
+    def __setstate__(self, state: dict):
+        # load the data of the snapshot, please refer to `to_snapshot`
+        loaded = {}
+        for k, v in state.items():
+            if isinstance(v, FrameSnapshot):
+                if id(v) not in loaded:
+                    loaded[id(v)] = v.load()
+                state[k] = loaded[id(v)]
+        super().__setstate__(state)
+
     # init type
     IT_FIT_SEQ = "fit_seq"  # the input of `fit` will be the output of the previous processor
     IT_FIT_IND = "fit_ind"  # the input of `fit` will be the original df
@@ -2,11 +2,12 @@
 # Licensed under the MIT License.
 
 import abc
-from typing import Union, Text, Optional
+import importlib.util
+from typing import Union, Text, Optional, Tuple
 import numpy as np
 import pandas as pd
 
-from qlib.utils.data import robust_zscore, zscore
+from qlib.utils.data import robust_zscore, zscore, segment_fillna_mean, segment_rank, segment_zscore
 from ...constant import EPS
 from .utils import fetch_df_by_index
 from ...utils.serial import Serializable
@@ -32,6 +33,74 @@ def get_group_columns(df: pd.DataFrame, group: Union[Text, None]):
         return df.columns[df.columns.get_loc(group)]
 
 
+def get_datetime_segments(df: pd.DataFrame, cols) -> Optional[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]]:
+    """
+    get the values of `df[cols]` sorted by datetime for the segment kernels in `qlib.utils.data`
+
+    The rows are sorted stably as `df.groupby("datetime")` does, so the kernels calculate the same results.
+
+    Returns
+    -------
+    Optional[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]]
+        the (columns, rows) values, the bounds of the datetimes in them and the positions of the sorted rows in `df`
+        (None if `df` is sorted by datetime). None if the columns are not of one float dtype or a datetime is missing.
+    """
+    dtypes = set(df.dtypes[cols]) if len(cols) > 0 else set()
+    if len(df) == 0 or len(dtypes) != 1 or dtypes.pop().kind != "f":
+        return None
+    index = df.index
+    if isinstance(index, pd.MultiIndex) and index.levels[index.names.index("datetime")].is_monotonic_increasing:
+        codes = index.codes[index.names.index("datetime")]
+    else:
+        codes = pd.factorize(index.get_level_values("datetime"), sort=True)[0]
+    if codes.min() < 0:
+        return None
+    order = None if (np.diff(codes) >= 0).all() else np.argsort(codes, kind="stable")
+    counts = np.bincount(codes)
+    bounds = np.concatenate([[0], np.cumsum(counts[counts > 0])])
+    values = df[cols].values
+    if order is not None:
+        values = values[order]
+    return np.ascontiguousarray(values.T), bounds, order
+
+
+def set_columns(df: pd.DataFrame, cols, new: pd.DataFrame):
+    """
+    `df[cols] = new`, `df` is modified in place
+
+    `df[cols] = ...` splits the block of `df` column by column in pandas, so the values are written into the block
+    by their positions if the dtypes are not changed.
+    """
+    if df.columns.is_unique:
+        pos = df.columns.get_indexer(cols)
+        if (df.dtypes.iloc[pos].values == new.dtypes.values).all():
+            df.iloc[:, pos] = new
+            return
+    df[cols] = new
+
+
+def _assign_segments(df: pd.DataFrame, cols, values: np.ndarray, order: Optional[np.ndarray]):
+    # `df[cols] = ...` of the (columns, rows) `values` of the rows sorted by `order`
+    if order is not None:
+        restored = np.empty_like(values)
+        restored[:, order] = values
+        values = restored
+    set_columns(df, cols, pd.DataFrame(values.T, index=df.index, columns=cols))
+
+
+def _bottleneck_enabled() -> bool:
+    # pandas calculates the std and the median by bottleneck if it is installed, the segment kernels follow numpy
+    return pd.get_option("compute.use_bottleneck") and importlib.util.find_spec("bottleneck") is not None
+
+
+# pandas evaluates the arithmetic of the frames with more elements by numexpr if it is installed
+_NUMEXPR_MIN_ELEMENTS = 1_000_000
+
+
+def _numexpr_enabled() -> bool:
+    return pd.get_option("compute.use_numexpr") and importlib.util.find_spec("numexpr") is not None
+
+
 class Processor(Serializable):
     def fit(self, df: pd.DataFrame = None):
         """
@@ -79,6 +148,20 @@ class Processor(Serializable):
         """
         return False
 
+    def written_columns(self, df: pd.DataFrame) -> Optional[pd.Index]:
+        """
+        The columns of `df` written inplace by the processor when processing `df`
+
+        Knowing the columns is helpful to the Handler to copy only these columns of the data shared with others
+        (i.e. copy-on-write) instead of the whole data.
+
+        Returns
+        -------
+        Optional[pd.Index]:
+            None if any column may be written, which is the default of the processors not `readonly`.
+        """
+        return df.columns[:0] if self.readonly() else None
+
     def config(self, **kwargs):
         attr_list = {"fit_start_time", "fit_end_time"}
         for k, v in kwargs.items():
@@ -192,11 +275,23 @@ class Fillna(Processor):
             # df.fillna({col: self.fill_value for col in cols}, inplace=True)
 
             # So we use numpy to accelerate filling values
-            nan_select = np.isnan(df.values)
-            nan_select[:, ~df.columns.isin(cols)] = False
-            df.values[nan_select] = self.fill_value
+            # NOTE: `df.values` is a copy if `df` has multiple blocks, so the values are written back
+            X = df[cols]
+            if X.dtypes.nunique() == 1:
+                values = X.values
+                nan_select = np.isnan(values)
+                if not nan_select.any():
+                    return df
+                values[nan_select] = self.fill_value
+                X = pd.DataFrame(values, index=X.index, columns=X.columns)
+            else:
+                X = X.fillna(self.fill_value)
+            set_columns(df, cols, X)
         return df
 
+    def written_columns(self, df):
+        return df.columns if self.fields_group is None else get_group_columns(df, self.fields_group)
+
 
 class MinMaxNorm(Processor):
     def __init__(self, fit_start_time, fit_end_time, fields_group=None):
@@ -229,6 +324,9 @@ class MinMaxNorm(Processor):
         df.loc(axis=1)[self.cols] = normalize(df[self.cols].values)
         return df
 
+    def written_columns(self, df):
+        return get_group_columns(df, self.fields_group)
+
 
 class ZScoreNorm(Processor):
     """ZScore Normalization"""
@@ -263,6 +361,9 @@ class ZScoreNorm(Processor):
         df.loc(axis=1)[self.cols] = normalize(df[self.cols].values)
         return df
 
+    def written_columns(self, df):
+        return get_group_columns(df, self.fields_group)
+
 
 class RobustZScoreNorm(Processor):
     """Robust ZScore Normalization
@@ -288,19 +389,34 @@ class RobustZScoreNorm(Processor):
         self.cols = get_group_columns(df, self.fields_group)
         X = df[self.cols].values
         self.mean_train = np.nanmedian(X, axis=0)
-        self.std_train = np.nanmedian(np.abs(X - self.mean_train), axis=0)
+        # the deviations are calculated inplace on the copy of the columns to save memory
+        X -= self.mean_train
+        np.abs(X, out=X)
+        self.std_train = np.nanmedian(X, axis=0, overwrite_input=True)
         self.std_train += EPS
         self.std_train *= 1.4826
 
     def __call__(self, df):
         X = df[self.cols]
-        X -= self.mean_train
-        X /= self.std_train
-        if self.clip_outlier:
-            X = np.clip(X, -3, 3)
-        df[self.cols] = X
+        if X.dtypes.nunique() == 1:
+            # calculate inplace on the copy of the columns to save memory
+            values = X.values
+            values -= self.mean_train
+            values /= self.std_train
+            if self.clip_outlier:
+                np.clip(values, -3, 3, out=values)
+            X = pd.DataFrame(values, index=X.index, columns=X.columns)
+        else:
+            X -= self.mean_train
+            X /= self.std_train
+            if self.clip_outlier:
+                X = np.clip(X, -3, 3)
+        set_columns(df, self.cols, X)
         return df
 
+    def written_columns(self, df):
+        return get_group_columns(df, self.fields_group)
+
 
 class CSZScoreNorm(Processor):
     """Cross Sectional ZScore Normalization"""
@@ -324,9 +440,27 @@ class CSZScoreNorm(Processor):
         with pd.option_context("mode.chained_assignment", None):
             for g in self.fields_group:
                 cols = get_group_columns(df, g)
-                df[cols] = df[cols].groupby("datetime", group_keys=False).apply(self.zscore_func)
+                robust = self.zscore_func is robust_zscore
+                segments = None if _bottleneck_enabled() else get_datetime_segments(df, cols)
+                if (
+                    segments is not None
+                    and robust
+                    and _numexpr_enabled()
+                    and np.diff(segments[1]).max() * len(cols) > _NUMEXPR_MIN_ELEMENTS
+                ):
+                    # numexpr divides the large datetimes by the float64 1.4826, which changes the dtype
+                    segments = None
+                if segments is None:
+                    df[cols] = df[cols].groupby("datetime", group_keys=False).apply(self.zscore_func)
+                else:
+                    values, bounds, order = segments
+                    _assign_segments(df, cols, segment_zscore(values, bounds, robust=robust), order)
         return df
 
+    def written_columns(self, df):
+        groups = self.fields_group if isinstance(self.fields_group, list) else [self.fields_group]
+        return df.columns[np.any([df.columns.isin(get_group_columns(df, g)) for g in groups], axis=0)]
+
 
 class CSRankNorm(Processor):
     """
@@ -357,12 +491,23 @@ class CSRankNorm(Processor):
     def __call__(self, df):
         # try not modify original dataframe
         cols = get_group_columns(df, self.fields_group)
+        segments = get_datetime_segments(df, cols)
+        if segments is not None:
+            values, bounds, order = segments
+            t = segment_rank(values, bounds)
+            t -= 0.5
+            t *= 3.46  # NOTE: towards unit std
+            _assign_segments(df, cols, t, order)
+            return df
         t = df[cols].groupby("datetime").rank(pct=True)
         t -= 0.5
         t *= 3.46  # NOTE: towards unit std
         df[cols] = t
         return df
 
+    def written_columns(self, df):
+        return get_group_columns(df, self.fields_group)
+
 
 class CSZFillna(Processor):
     """Cross Sectional Fill Nan"""
@@ -372,9 +517,17 @@ class CSZFillna(Processor):
 
     def __call__(self, df):
         cols = get_group_columns(df, self.fields_group)
-        df[cols] = df[cols].groupby("datetime", group_keys=False).apply(lambda x: x.fillna(x.mean()))
+        segments = get_datetime_segments(df, cols)
+        if segments is None:
+            df[cols] = df[cols].groupby("datetime", group_keys=False).apply(lambda x: x.fillna(x.mean()))
+        else:
+            values, bounds, order = segments
+            _assign_segments(df, cols, segment_fillna_mean(values, bounds), order)
         return df
 
+    def written_columns(self, df):
+        return get_group_columns(df, self.fields_group)
+
 
 class HashStockFormat(Processor):
     """Process the storage of from df into hasing stock format"""
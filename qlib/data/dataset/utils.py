@@ -1,6 +1,9 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 from __future__ import annotations
+import shutil
+from pathlib import Path
+import numpy as np
 import pandas as pd
 from typing import Union, List, TYPE_CHECKING
 from qlib.utils import init_instance_by_config
@@ -140,3 +143,101 @@ def init_task_handler(task: dict) -> DataHandler:
         return handler
     else:
         raise ValueError("The task does not contains a handler part.")
+
+
+class FrameSnapshot:
+    """
+    A DataFrame saved as `.npy` files in a directory, which are memory mapped when it is loaded. So the processes
+    loading the same snapshot share one physical copy of the data through the page cache.
+
+    The files in the directory
+    - values.<i>.npy: the values of the i-th run of the columns of the same dtype in shape (columns, rows), the
+      layout of the blocks of pandas. So the DataFrame is built on the memory maps without copying.
+    - codes.<i>.npy: the codes of the i-th level of the MultiIndex
+
+    The small parts (e.g. the columns, the levels of the MultiIndex) are kept in the object and pickled with it, so
+    are the index if it is not a MultiIndex and the columns of the dtypes which can't be memory mapped (e.g. object).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = str(Path(path).resolve())
+        self.columns = None
+        self.index = None  # the index if it is not a MultiIndex
+        self.levels = None
+        self.names = None
+        # (the start and end of the run of columns, the file name or the DataFrame of the columns)
+        self.blocks = []
+
+    @classmethod
+    def dump(cls, df: pd.DataFrame, path: Union[str, Path]) -> "FrameSnapshot":
+        """
+        save `df` to the directory `path`, the existing files in it are removed
+
+        NOTE: the removed files are still available to the processes mapping them
+        """
+        path = Path(path)
+        if path.exists():
+            shutil.rmtree(path)
+        path.mkdir(parents=True)
+        snapshot = cls(path)
+        snapshot.columns = df.columns
+
+        if isinstance(df.index, pd.MultiIndex):
+            snapshot.levels, snapshot.names = list(df.index.levels), list(df.index.names)
+            for i, codes in enumerate(df.index.codes):
+                np.save(path.joinpath(f"codes.{i}.npy"), np.asarray(codes))
+        else:
+            snapshot.index = df.index
+
+        # the runs of the columns of the same dtype, so the columns are in order when the runs are concatenated
+        dtypes = list(df.dtypes)
+        bounds = [0] + [i for i in range(1, len(dtypes)) if dtypes[i] != dtypes[i - 1]] + [len(dtypes)]
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            if start == end:
+                continue
+            dtype = dtypes[start]
+            if isinstance(dtype, np.dtype) and dtype.kind != "O":
+                name = f"values.{i}.npy"
+                values = np.lib.format.open_memmap(
+                    path.joinpath(name), mode="w+", dtype=dtype, shape=(end - start, len(df))
+                )
+                # column by column to avoid a copy of the whole data
+                for j in range(start, end):
+                    values[j - start] = df.iloc[:, j].values
+                values.flush()
+                del values
+                snapshot.blocks.append((start, end, name))
+            else:
+                snapshot.blocks.append((start, end, df.iloc[:, start:end].reset_index(drop=True)))
+        return snapshot
+
+    def load(self, mmap_mode: str = "c") -> pd.DataFrame:
+        """
+        load the DataFrame
+
+        Parameters
+        ----------
+        mmap_mode : str
+            the mode of `np.load` to map the files, the writes to the data are private to the process with the default
+            copy-on-write mode "c".
+        """
+        path = Path(self.path)
+        if self.levels is not None:
+            codes = [np.load(path.joinpath(f"codes.{i}.npy"), mmap_mode=mmap_mode) for i in range(len(self.levels))]
+            index = pd.MultiIndex(levels=self.levels, codes=codes, names=self.names, verify_integrity=False)
+        else:
+            index = self.index
+
+        frames = []
+        for start, end, block in self.blocks:
+            if isinstance(block, str):
+                values = np.load(path.joinpath(block), mmap_mode=mmap_mode)
+                frames.append(pd.DataFrame(values.T, index=index, columns=self.columns[start:end], copy=False))
+            else:
+                frames.append(block.set_axis(index, axis=0))
+        if len(frames) == 0:
+            return pd.DataFrame(index=index, columns=self.columns)
+        if len(frames) == 1:
+            return frames[0]
+        # NOTE: the runs of the same dtype (e.g. the interleaved dtypes) are copied when pandas consolidates them
+        return pd.concat(frames, axis=1, copy=False)
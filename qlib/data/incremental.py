@@ -0,0 +1,350 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Incremental expression evaluation
+
+The online flows (e.g. `qlib.workflow.online.update.DSBasedUpdater`) append a few trading days to the data at a time.
+Instead of recalculating the features over the history, `IncrementalExpressions` keeps the state of every operator
+of every instrument and advances it by the new bars only.
+
+- The fields are merged into a DAG of nodes identified by `str(expression)`, like `qlib.data.compiler`.
+- The element-wise operators are stateless.
+- The rolling operators with a cython kernel (e.g. `Std`, `Max`, `IdxMax`, `Cov`) keep the kernel and update its
+  window value by value. The kernel is rebuilt from the last N inputs when the state is restored.
+- The other rolling operators with a window of N bars (e.g. `Ref`, `Sum`, `Rsquare`) keep the last N inputs and
+  calculate the new bars with them.
+- `EMA` keeps the exponentially weighted mean and its weight.
+- The expanding operators (N = 0) keep the whole history of their inputs, so they are still O(history).
+- The other expressions (e.g. the features, `ChangeInstrument`, `PFeature`) are loaded in the new bars with their
+  extended window (please refer to `Expression.get_extended_window_size`). So the expressions referring to the
+  future (e.g. `Ref($close, -1)`) are NaN at the latest bars and are not updated afterwards.
+
+The evaluator is `Serializable`, the state can be checkpointed with `to_pickle` and restored with `load`.
+
+.. code-block:: python
+
+    evaluator = IncrementalExpressions(fields)
+    evaluator.update(instruments, "2021-05-28")  # calculate the history
+    evaluator.to_pickle(path)
+    ...
+    evaluator = IncrementalExpressions.load(path)
+    new_data = evaluator.update(instruments)  # calculate the days after 2021-05-28 only
+"""
+
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from ..log import get_module_logger
+from ..utils.serial import Serializable
+from ._libs import rolling as _rolling
+from .base import Expression, Feature
+from .compiler import get_children
+from .data import Cal, DatasetProvider, ExpressionD
+from .ops import (
+    EMA,
+    Count,
+    Cov,
+    IdxMax,
+    IdxMin,
+    If,
+    Kurt,
+    Mad,
+    Max,
+    Mean,
+    Med,
+    Min,
+    NpElemOperator,
+    NpPairOperator,
+    PairRolling,
+    Quantile,
+    Rank,
+    Resi,
+    Rolling,
+    Skew,
+    Slope,
+    Std,
+    Sum,
+    Var,
+    WMA,
+)
+
+# the operators calculated by the cython kernels value by value, without any other processing
+_KERNELS = {
+    Sum: _rolling.Sum,
+    Mean: _rolling.Mean,
+    Count: _rolling.Count,
+    Std: _rolling.Std,
+    Var: _rolling.Var,
+    Skew: _rolling.Skew,
+    Kurt: _rolling.Kurt,
+    Max: _rolling.Max,
+    Min: _rolling.Min,
+    IdxMax: _rolling.IdxMax,
+    IdxMin: _rolling.IdxMin,
+    Med: _rolling.Median,
+    Rank: _rolling.Rank,
+    Mad: _rolling.Mad,
+    WMA: _rolling.WMA,
+    Slope: _rolling.Slope,
+    Resi: _rolling.Resi,
+    Quantile: _rolling.Quantile,
+    Cov: _rolling.Cov,
+}
+
+
+def _new_kernel(expression: Union[Rolling, PairRolling]):
+    if isinstance(expression, Quantile):
+        return _rolling.Quantile(expression.N, expression.qscore)
+    return _KERNELS[type(expression)](expression.N)
+
+
+class _NodeState:
+    """the state of a node of one instrument"""
+
+    def step(
+        self,
+        expression: Expression,
+        inputs: List[np.ndarray],
+        instrument: str,
+        start_index: int,
+        end_index: int,
+        freq: str,
+    ) -> np.ndarray:
+        """calculate the values of `expression` in [start_index, end_index] with the `inputs` of the children"""
+        raise NotImplementedError
+
+
+class _LoadState(_NodeState):
+    """the expressions loaded in the new bars with their extended window"""
+
+    def step(self, expression, inputs, instrument, start_index, end_index, freq):
+        lft_etd, _ = expression.get_extended_window_size()
+        series = expression.load(instrument, max(start_index - lft_etd, 0), end_index, freq)
+        values = series.reindex(pd.RangeIndex(start_index, end_index + 1)).values
+        if values.dtype.kind != "f":
+            values = values.astype(np.float64)
+        return values
+
+
+class _ElementState(_NodeState):
+    """the element-wise operators, no state is kept"""
+
+    def step(self, expression, inputs, instrument, start_index, end_index, freq):
+        inputs = list(inputs)
+        if isinstance(expression, NpElemOperator):
+            return expression._compute(inputs[0])
+        operands = [
+            inputs.pop(0) if isinstance(operand, Expression) else operand
+            for operand in (
+                (expression.feature_left, expression.feature_right)
+                if isinstance(expression, NpPairOperator)
+                else (expression.condition, expression.feature_left, expression.feature_right)
+            )
+        ]
+        if isinstance(expression, NpPairOperator):
+            return getattr(np, expression.func)(*operands)
+        return np.where(*operands)
+
+
+class _WindowState(_NodeState):
+    """the operators depending on the last `size` inputs (all the inputs if `size` is None)"""
+
+    def __init__(self, size: Union[int, None]):
+        self.size = size
+        self.tails = None
+
+    def _keep(self, inputs):
+        self.tails = [
+            values if self.size is None else values[max(len(values) - self.size, 0) :].copy() for values in inputs
+        ]
+
+    def step(self, expression, inputs, instrument, start_index, end_index, freq):
+        if self.tails is not None:
+            inputs = [np.concatenate([tail, values]) for tail, values in zip(self.tails, inputs)]
+        n_tail = 0 if self.tails is None else len(self.tails[0])
+        self._keep(inputs)
+        return expression._compute(*inputs)[n_tail:]
+
+
+class _KernelState(_WindowState):
+    """the rolling operators calculated by a cython kernel
+
+    The kernel is not pickled, it is rebuilt by updating a new one with the last N inputs.
+    """
+
+    def __init__(self, size: int):
+        super().__init__(size)
+        self._kernel = None
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != "_kernel"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._kernel = None
+
+    def step(self, expression, inputs, instrument, start_index, end_index, freq):
+        if self._kernel is None:
+            self._kernel = _new_kernel(expression)
+            if self.tails is not None:
+                self._kernel.step(*self.tails)
+        self._keep(inputs if self.tails is None else [np.concatenate(v) for v in zip(self.tails, inputs)])
+        return self._kernel.step(*inputs)
+
+
+class _EMAState(_NodeState):
+    """the exponentially weighted mean"""
+
+    def __init__(self, alpha: float):
+        self.ewm = _rolling.EWMean(alpha)
+
+    def step(self, expression, inputs, instrument, start_index, end_index, freq):
+        return self.ewm.step(inputs[0])
+
+
+def _new_state(expression: Expression) -> _NodeState:
+    """the initial state of `expression`, the children are loaded separately unless it is a `_LoadState`"""
+    if not expression.support_array() or isinstance(expression, Feature):
+        return _LoadState()
+    if isinstance(expression, (NpElemOperator, NpPairOperator, If)):
+        return _ElementState()
+    if isinstance(expression, (Rolling, PairRolling)):
+        N = expression.N
+        if type(expression) in _KERNELS and isinstance(N, int) and N > 0:
+            return _KernelState(N)
+        if type(expression) is EMA and N != 0:
+            # the same as `EMA._compute`
+            return _EMAState(1.0 / (1.0 + (1.0 / N - 1.0)) if 0 < N < 1 else 1.0 / (1.0 + (N - 1) / 2.0))
+        if isinstance(N, int) and N > 0:
+            return _WindowState(N)
+        return _WindowState(None)
+    return _LoadState()
+
+
+class IncrementalExpressions(Serializable):
+    """The state of the expressions of several instruments, advanced by the new bars
+
+    Parameters
+    ----------
+    fields : List[str]
+        the expressions.
+    start_time : str
+        the first bar of the calculation, the history of the instruments by default. The results of the rolling
+        operators are the same as `D.features` only after the first N bars.
+    freq : str
+        the frequency of the data.
+    """
+
+    def __init__(self, fields: List[str], start_time=None, freq: str = "day"):
+        super().__init__()
+        self.fields = list(fields)
+        self.start_time = start_time
+        self.freq = freq
+        # instrument -> (the calendar index of the last calculated bar, the state of the nodes)
+        self.states: Dict[str, Tuple[int, Dict[str, _NodeState]]] = {}
+        self._compile()
+
+    def __setstate__(self, state: dict):
+        super().__setstate__(state)
+        self._compile()
+
+    def _compile(self):
+        self._expressions: Dict[str, Expression] = {}
+        self._children: Dict[str, List[str]] = {}
+        self._order: List[str] = []
+        self._roots = [self._visit(ExpressionD.get_expression_instance(field)) for field in self.fields]
+
+    def _visit(self, expression: Expression) -> str:
+        key = str(expression)
+        if key not in self._expressions:
+            self._expressions[key] = expression
+            if isinstance(_new_state(expression), _LoadState):
+                self._children[key] = []
+            else:
+                self._children[key] = [self._visit(child) for child in get_children(expression)]
+            self._order.append(key)
+        return key
+
+    def _data_range(self, instrument: str, start_index: int, end_index: int) -> Union[Tuple[int, int], None]:
+        """the bars of the data of `instrument` in [start_index, end_index], None if there is no data
+
+        The same as `D.features`, the bars before and after the data of the features are not calculated.
+        """
+        features = [expression for expression in self._expressions.values() if isinstance(expression, Feature)]
+        if len(features) == 0:
+            return start_index, end_index
+        starts, ends = [], []
+        for feature in features:
+            start, values = feature.load_array(instrument, start_index, end_index, self.freq)
+            if len(values) > 0:
+                starts.append(start)
+                ends.append(start + len(values) - 1)
+        return (min(starts), max(ends)) if starts else None
+
+    def _advance(self, instrument: str, end_index: int) -> Union[pd.DataFrame, None]:
+        if instrument in self.states:
+            last_index, states = self.states[instrument]
+            start_index = last_index + 1
+        else:
+            states = {key: _new_state(expression) for key, expression in self._expressions.items()}
+            start_index = 0
+            if self.start_time is not None:
+                start_index = Cal.locate_index(self.start_time, self.start_time, self.freq)[2]
+        if start_index > end_index:
+            return None
+        data_range = self._data_range(instrument, start_index, end_index)
+        if data_range is None:
+            return None
+        if instrument in self.states:
+            # the bars without data since the last update are still calculated, e.g. the suspended days
+            end_index = data_range[1]
+        else:
+            start_index, end_index = data_range
+        values = {}
+        for key in self._order:
+            inputs = [values[child] for child in self._children[key]]
+            values[key] = states[key].step(
+                self._expressions[key], inputs, instrument, start_index, end_index, self.freq
+            )
+        self.states[instrument] = end_index, states
+        data = pd.DataFrame(
+            np.column_stack([values[key] for key in self._roots]),
+            index=Cal.index_to_datetime(np.arange(start_index, end_index + 1), freq=self.freq),
+            columns=self.fields,
+        )
+        data.index.names = ["datetime"]
+        return data
+
+    def update(self, instruments, end_time=None) -> pd.DataFrame:
+        """advance the state of the instruments to `end_time` and return the values in the new bars
+
+        Parameters
+        ----------
+        instruments : list or dict
+            the instruments or the config of a stock pool, the same as `D.features`.
+        end_time : str
+            the last bar to calculate, the latest bar of the calendar by default.
+
+        Returns
+        -------
+        pd.DataFrame
+            the values in the new bars with the same format as `D.features`, the instruments already calculated to
+            `end_time` are skipped.
+        """
+        end_index = Cal.locate_index(end_time, end_time, self.freq)[3] if end_time is not None else None
+        if end_index is None:
+            end_index = len(Cal.calendar(freq=self.freq)) - 1
+        data = {}
+        for instrument in DatasetProvider.get_instruments_d(instruments, self.freq):
+            _data = self._advance(instrument, end_index)
+            if _data is not None and not _data.empty:
+                data[instrument] = _data
+        get_module_logger("IncrementalExpressions").debug(f"{len(data)} instruments are updated to {end_index}")
+        if len(data) == 0:
+            return pd.DataFrame(
+                index=pd.MultiIndex.from_arrays([[], []], names=("instrument", "datetime")), columns=self.fields
+            )
+        return pd.concat(data, names=["instrument"], sort=False)
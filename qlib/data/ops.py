@@ -9,14 +9,21 @@ import numpy as np
 import pandas as pd
 
 from typing import Union, List, Type
-from scipy.stats import percentileofscore
-from .base import Expression, ExpressionOps, Feature, PFeature
+from .base import Expression, ExpressionOps, Feature, PFeature, series_to_array
 from ..log import get_module_logger
 from ..utils import get_callable_kwargs
 
 try:
-    from ._libs.rolling import rolling_slope, rolling_rsquare, rolling_resi
-    from ._libs.expanding import expanding_slope, expanding_rsquare, expanding_resi
+    from ._libs import rolling as _rolling, expanding as _expanding
+    from ._libs.rolling import rolling_slope, rolling_rsquare, rolling_resi, ewm_mean
+    from ._libs.expanding import expanding_slope, expanding_rsquare, expanding_resi, expanding_ema
+
+    # the rolling methods of pandas which are replaced by the cython implementations
+    _CYTHON_FUNCS = ["std", "var", "skew", "kurt", "max", "min", "median"]
+    _ROLLING_FUNCS = {func: getattr(_rolling, "rolling_" + func) for func in _CYTHON_FUNCS}
+    _EXPANDING_FUNCS = {func: getattr(_expanding, "expanding_" + func) for func in _CYTHON_FUNCS}
+    _ROLLING_PAIR_FUNCS = {"cov": _rolling.rolling_cov, "corr": _rolling.rolling_corr}
+    _EXPANDING_PAIR_FUNCS = {"cov": _expanding.expanding_cov, "corr": _expanding.expanding_corr}
 except ImportError:
     print(
         "#### Do not import qlib package in the repository directory in case of importing qlib from . without compiling #####"
@@ -28,11 +35,66 @@ except ValueError:
     # We catch this error because some platform can't upgrade there package (e.g. Kaggle)
     # https://www.kaggle.com/general/293387
     # https://www.kaggle.com/product-feedback/98562
+    _ROLLING_FUNCS, _EXPANDING_FUNCS, _ROLLING_PAIR_FUNCS, _EXPANDING_PAIR_FUNCS = {}, {}, {}, {}
 
 
 np.seterr(invalid="ignore")
 
 
+def _apply_cython(func, series, *args):
+    """apply the cython implementation `func` on 1-D arrays to a np.ndarray, a pd.Series or each column of a
+    pd.DataFrame panel"""
+    if isinstance(series, np.ndarray):
+        return func(series, *args)
+    if isinstance(series, pd.DataFrame):
+        values = np.asfortranarray(series.values, dtype=np.float64)
+        res = np.empty(values.shape)
+        for i in range(values.shape[1]):
+            res[:, i] = func(values[:, i], *args)
+        return pd.DataFrame(res, index=series.index, columns=series.columns)
+    return pd.Series(func(series.values, *args), index=series.index)
+
+
+def _apply_cython_pair(func, series_left, series_right, *args):
+    """the same as `_apply_cython` for the cython implementation `func` on two 1-D arrays
+
+    The data are aligned by the index (and the columns of the panels) like pandas, the arrays must be aligned already.
+    """
+    if isinstance(series_left, np.ndarray):
+        return func(series_left, series_right, *args)
+    if not series_left.index.equals(series_right.index) or (
+        isinstance(series_left, pd.DataFrame) and not series_left.columns.equals(series_right.columns)
+    ):
+        series_left, series_right = series_left.align(series_right)
+    if isinstance(series_left, pd.DataFrame):
+        left = np.asfortranarray(series_left.values, dtype=np.float64)
+        right = np.asfortranarray(series_right.values, dtype=np.float64)
+        res = np.empty(left.shape)
+        for i in range(left.shape[1]):
+            res[:, i] = func(left[:, i], right[:, i], *args)
+        return pd.DataFrame(res, index=series_left.index, columns=series_left.columns)
+    return pd.Series(func(series_left.values, series_right.values, *args), index=series_left.index)
+
+
+def _shift(values: np.ndarray, n: int) -> np.ndarray:
+    """the same as `pd.Series.shift` for 1-D arrays, the arrays of other types than float are shifted as float64"""
+    if values.dtype.kind != "f":
+        values = values.astype(np.float64)
+    res = np.full(values.shape, np.nan, dtype=values.dtype)
+    if 0 <= n < len(values):
+        res[n:] = values[: len(values) - n]
+    elif -len(values) < n < 0:
+        res[:n] = values[-n:]
+    return res
+
+
+def _mask(series, cond):
+    """the same as `pd.Series.mask` for np.ndarray"""
+    if isinstance(series, np.ndarray):
+        return np.where(cond, np.nan, series)
+    return series.mask(cond)
+
+
 #################### Element-Wise Operator ####################
 class ElemOperator(ExpressionOps):
     """Element-wise Operator
@@ -94,6 +156,22 @@ class ChangeInstrument(ElemOperator):
         return self.feature.load(instrument, start_index, end_index, *args)
 
 
+# the numpy functions which only take bool (or int) arguments
+_BITWISE_FUNCS = ("bitwise_and", "bitwise_or", "bitwise_xor", "bitwise_not", "invert")
+
+
+def _as_bool_panel(panel):
+    """the bool panels with cells out of their index are float with NaN in the cells (please refer to
+    `CompiledExpressions.load_panel`), they are bool again for the bitwise operators"""
+    if not isinstance(panel, pd.DataFrame) or (panel.dtypes == bool).all():
+        return panel
+    values = panel.values
+    if values.dtype.kind != "f" or not ((values == 0) | (values == 1) | np.isnan(values)).all():
+        # not a bool panel, it fails the same as `load`
+        return panel
+    return pd.DataFrame(np.nan_to_num(values).astype(bool), index=panel.index, columns=panel.columns)
+
+
 class NpElemOperator(ElemOperator):
     """Numpy Element-wise Operator
 
@@ -116,6 +194,21 @@ class NpElemOperator(ElemOperator):
 
     def _load_internal(self, instrument, start_index, end_index, *args):
         series = self.feature.load(instrument, start_index, end_index, *args)
+        return self._compute(series)
+
+    def _load_array_internal(self, instrument, start_index, end_index, *args):
+        start, values = self.feature.load_array(instrument, start_index, end_index, *args)
+        return start, self._compute(values)
+
+    def _load_panel_internal(self, instruments, start_index, end_index, *args):
+        panel = self.feature.load_panel(instruments, start_index, end_index, *args)
+        if self.func in _BITWISE_FUNCS:
+            panel = _as_bool_panel(panel)
+        return self._compute(panel)
+
+    def _compute(self, series):
+        """calculate with the loaded data, `series` is a np.ndarray or a pd.Series of one instrument or a
+        pd.DataFrame panel"""
         return getattr(np, self.func)(series)
 
 
@@ -154,11 +247,10 @@ class Sign(NpElemOperator):
     def __init__(self, feature):
         super(Sign, self).__init__(feature, "sign")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
+    def _compute(self, series):
         """
         To avoid error raised by bool type input, we transform the data into float32.
         """
-        series = self.feature.load(instrument, start_index, end_index, *args)
         # TODO:  More precision types should be configurable
         series = series.astype(np.float32)
         return getattr(np, self.func)(series)
@@ -334,6 +426,36 @@ class NpPairOperator(PairOperator):
                 get_module_logger("ops").debug(warning_info)
         return res
 
+    def _load_array_internal(self, instrument, start_index, end_index, *args):
+        start = None
+        if isinstance(self.feature_left, (Expression,)):
+            start, array_left = self.feature_left.load_array(instrument, start_index, end_index, *args)
+        else:
+            array_left = self.feature_left  # numeric value
+        if isinstance(self.feature_right, (Expression,)):
+            start_right, array_right = self.feature_right.load_array(instrument, start_index, end_index, *args)
+            if start is None:
+                start = start_right
+            elif (start, len(array_left)) != (start_right, len(array_right)):
+                # the series are aligned by the index
+                return series_to_array(self._load_internal(instrument, start_index, end_index, *args))
+        else:
+            array_right = self.feature_right
+        return start, getattr(np, self.func)(array_left, array_right)
+
+    def _load_panel_internal(self, instruments, start_index, end_index, *args):
+        if isinstance(self.feature_left, (Expression,)):
+            panel_left = self.feature_left.load_panel(instruments, start_index, end_index, *args)
+        else:
+            panel_left = self.feature_left  # numeric value
+        if isinstance(self.feature_right, (Expression,)):
+            panel_right = self.feature_right.load_panel(instruments, start_index, end_index, *args)
+        else:
+            panel_right = self.feature_right
+        if self.func in _BITWISE_FUNCS:
+            panel_left, panel_right = _as_bool_panel(panel_left), _as_bool_panel(panel_right)
+        return getattr(np, self.func)(panel_left, panel_right)
+
 
 class Power(NpPairOperator):
     """Power Operator
@@ -670,6 +792,32 @@ class If(ExpressionOps):
         series = pd.Series(np.where(series_cond, series_left, series_right), index=series_cond.index)
         return series
 
+    def _load_array_internal(self, instrument, start_index, end_index, *args):
+        start, array_cond = self.condition.load_array(instrument, start_index, end_index, *args)
+        if isinstance(self.feature_left, (Expression,)):
+            array_left = self.feature_left.load_array(instrument, start_index, end_index, *args)[1]
+        else:
+            array_left = self.feature_left
+        if isinstance(self.feature_right, (Expression,)):
+            array_right = self.feature_right.load_array(instrument, start_index, end_index, *args)[1]
+        else:
+            array_right = self.feature_right
+        return start, np.where(array_cond, array_left, array_right)
+
+    def _load_panel_internal(self, instruments, start_index, end_index, *args):
+        panel_cond = self.condition.load_panel(instruments, start_index, end_index, *args)
+        if isinstance(self.feature_left, (Expression,)):
+            panel_left = self.feature_left.load_panel(instruments, start_index, end_index, *args)
+        else:
+            panel_left = self.feature_left
+        if isinstance(self.feature_right, (Expression,)):
+            panel_right = self.feature_right.load_panel(instruments, start_index, end_index, *args)
+        else:
+            panel_right = self.feature_right
+        return pd.DataFrame(
+            np.where(panel_cond, panel_left, panel_right), index=panel_cond.index, columns=panel_cond.columns
+        )
+
     def get_longest_back_rolling(self):
         if isinstance(self.feature_left, (Expression,)):
             left_br = self.feature_left.get_longest_back_rolling()
@@ -741,9 +889,33 @@ class Rolling(ExpressionOps):
 
     def _load_internal(self, instrument, start_index, end_index, *args):
         series = self.feature.load(instrument, start_index, end_index, *args)
+        return self._compute(series)
+
+    def _load_array_internal(self, instrument, start_index, end_index, *args):
+        start, values = self.feature.load_array(instrument, start_index, end_index, *args)
+        return start, self._compute(values)
+
+    def _load_panel_internal(self, instruments, start_index, end_index, *args):
+        panel = self.feature.load_panel(instruments, start_index, end_index, *args)
+        return self._compute(panel)
+
+    def _compute(self, series):
+        """calculate with the loaded data, `series` is a np.ndarray or a pd.Series of one instrument or a
+        pd.DataFrame panel
+
+        The cells before the data of an instrument are NaN in a panel, so the operators depending on the position
+        in the window (e.g. `IdxMax`) are loaded instrument by instrument.
+        """
         # NOTE: remove all null check,
         # now it's user's responsibility to decide whether use features in null days
         # isnull = series.isnull() # NOTE: isnull = NaN, inf is not null
+        if isinstance(self.N, int) and self.N == 0 and self.func in _EXPANDING_FUNCS:
+            return _apply_cython(_EXPANDING_FUNCS[self.func], series)
+        if isinstance(self.N, int) and self.N > 0 and self.func in _ROLLING_FUNCS:
+            return _apply_cython(_ROLLING_FUNCS[self.func], series, self.N)
+        if isinstance(series, np.ndarray):
+            # calculated by pandas
+            return self._compute(pd.Series(series)).values
         if isinstance(self.N, int) and self.N == 0:
             series = getattr(series.expanding(min_periods=1), self.func)()
         elif isinstance(self.N, float) and 0 < self.N < 1:
@@ -797,8 +969,15 @@ class Ref(Rolling):
     def __init__(self, feature, N):
         super(Ref, self).__init__(feature, N, "ref")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+    def support_panel(self):
+        # the first day of each instrument is unknown in a panel
+        return super(Ref, self).support_panel() and self.N != 0
+
+    def _compute(self, series):
+        if isinstance(series, np.ndarray):
+            if len(series) == 0:
+                return series
+            return np.full(len(series), series[0]) if self.N == 0 else _shift(series, self.N)
         # N = 0, return first day
         if series.empty:
             return series  # Pandas bug, see: https://github.com/pandas-dev/pandas/issues/21049
@@ -987,12 +1166,15 @@ class IdxMax(Rolling):
     def __init__(self, feature, N):
         super(IdxMax, self).__init__(feature, N, "idxmax")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+    def support_panel(self):
+        # the position in the window is counted from the first day of each instrument
+        return False
+
+    def _compute(self, series):
         if self.N == 0:
-            series = series.expanding(min_periods=1).apply(lambda x: x.argmax() + 1, raw=True)
+            series = _apply_cython(_expanding.expanding_idxmax, series)
         else:
-            series = series.rolling(self.N, min_periods=1).apply(lambda x: x.argmax() + 1, raw=True)
+            series = _apply_cython(_rolling.rolling_idxmax, series, self.N)
         return series
 
 
@@ -1035,12 +1217,15 @@ class IdxMin(Rolling):
     def __init__(self, feature, N):
         super(IdxMin, self).__init__(feature, N, "idxmin")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+    def support_panel(self):
+        # the position in the window is counted from the first day of each instrument
+        return False
+
+    def _compute(self, series):
         if self.N == 0:
-            series = series.expanding(min_periods=1).apply(lambda x: x.argmin() + 1, raw=True)
+            series = _apply_cython(_expanding.expanding_idxmin, series)
         else:
-            series = series.rolling(self.N, min_periods=1).apply(lambda x: x.argmin() + 1, raw=True)
+            series = _apply_cython(_rolling.rolling_idxmin, series, self.N)
         return series
 
 
@@ -1067,12 +1252,11 @@ class Quantile(Rolling):
     def __str__(self):
         return "{}({},{},{})".format(type(self).__name__, self.feature, self.N, self.qscore)
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+    def _compute(self, series):
         if self.N == 0:
-            series = series.expanding(min_periods=1).quantile(self.qscore)
+            series = _apply_cython(_expanding.expanding_quantile, series, self.qscore)
         else:
-            series = series.rolling(self.N, min_periods=1).quantile(self.qscore)
+            series = _apply_cython(_rolling.rolling_quantile, series, self.N, self.qscore)
         return series
 
 
@@ -1115,18 +1299,11 @@ class Mad(Rolling):
     def __init__(self, feature, N):
         super(Mad, self).__init__(feature, N, "mad")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-        # TODO: implement in Cython
-
-        def mad(x):
-            x1 = x[~np.isnan(x)]
-            return np.mean(np.abs(x1 - x1.mean()))
-
+    def _compute(self, series):
         if self.N == 0:
-            series = series.expanding(min_periods=1).apply(mad, raw=True)
+            series = _apply_cython(_expanding.expanding_mad, series)
         else:
-            series = series.rolling(self.N, min_periods=1).apply(mad, raw=True)
+            series = _apply_cython(_rolling.rolling_mad, series, self.N)
         return series
 
 
@@ -1149,23 +1326,13 @@ class Rank(Rolling):
     def __init__(self, feature, N):
         super(Rank, self).__init__(feature, N, "rank")
 
-    # for compatiblity of python 3.7, which doesn't support pandas 1.4.0+ which implements Rolling.rank
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-
-        rolling_or_expending = series.expanding(min_periods=1) if self.N == 0 else series.rolling(self.N, min_periods=1)
-        if hasattr(rolling_or_expending, "rank"):
-            return rolling_or_expending.rank(pct=True)
-
-        def rank(x):
-            if np.isnan(x[-1]):
-                return np.nan
-            x1 = x[~np.isnan(x)]
-            if x1.shape[0] == 0:
-                return np.nan
-            return percentileofscore(x1, x1[-1]) / 100
-
-        return rolling_or_expending.apply(rank, raw=True)
+    def _compute(self, series):
+        # the same as `rank(pct=True)` of pandas 1.4.0+, which is not available for python 3.7
+        if self.N == 0:
+            series = _apply_cython(_expanding.expanding_rank, series)
+        else:
+            series = _apply_cython(_rolling.rolling_rank, series, self.N)
+        return series
 
 
 class Count(Rolling):
@@ -1207,8 +1374,15 @@ class Delta(Rolling):
     def __init__(self, feature, N):
         super(Delta, self).__init__(feature, N, "delta")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+    def support_panel(self):
+        # the first day of each instrument is unknown in a panel
+        return super(Delta, self).support_panel() and self.N != 0
+
+    def _compute(self, series):
+        if isinstance(series, np.ndarray):
+            if len(series) == 0:
+                return series
+            return series - (series[0] if self.N == 0 else _shift(series, self.N))
         if self.N == 0:
             series = series - series.iloc[0]
         else:
@@ -1245,12 +1419,15 @@ class Slope(Rolling):
     def __init__(self, feature, N):
         super(Slope, self).__init__(feature, N, "slope")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+    def support_panel(self):
+        # the positions in the expanding window are counted from the first day of each instrument
+        return super(Slope, self).support_panel() and self.N != 0
+
+    def _compute(self, series):
         if self.N == 0:
-            series = pd.Series(expanding_slope(series.values), index=series.index)
+            series = _apply_cython(expanding_slope, series)
         else:
-            series = pd.Series(rolling_slope(series.values, self.N), index=series.index)
+            series = _apply_cython(rolling_slope, series, self.N)
         return series
 
 
@@ -1273,13 +1450,16 @@ class Rsquare(Rolling):
     def __init__(self, feature, N):
         super(Rsquare, self).__init__(feature, N, "rsquare")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        _series = self.feature.load(instrument, start_index, end_index, *args)
+    def support_panel(self):
+        # the positions in the expanding window are counted from the first day of each instrument
+        return super(Rsquare, self).support_panel() and self.N != 0
+
+    def _compute(self, _series):
         if self.N == 0:
-            series = pd.Series(expanding_rsquare(_series.values), index=_series.index)
+            series = _apply_cython(expanding_rsquare, _series)
         else:
-            series = pd.Series(rolling_rsquare(_series.values, self.N), index=_series.index)
-            series.loc[np.isclose(_series.rolling(self.N, min_periods=1).std(), 0, atol=2e-05)] = np.nan
+            series = _apply_cython(rolling_rsquare, _series, self.N)
+            series = _mask(series, np.isclose(_apply_cython(_rolling.rolling_std, _series, self.N), 0, atol=2e-05))
         return series
 
 
@@ -1302,12 +1482,15 @@ class Resi(Rolling):
     def __init__(self, feature, N):
         super(Resi, self).__init__(feature, N, "resi")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+    def support_panel(self):
+        # the positions in the expanding window are counted from the first day of each instrument
+        return super(Resi, self).support_panel() and self.N != 0
+
+    def _compute(self, series):
         if self.N == 0:
-            series = pd.Series(expanding_resi(series.values), index=series.index)
+            series = _apply_cython(expanding_resi, series)
         else:
-            series = pd.Series(rolling_resi(series.values, self.N), index=series.index)
+            series = _apply_cython(rolling_resi, series, self.N)
         return series
 
 
@@ -1330,19 +1513,16 @@ class WMA(Rolling):
     def __init__(self, feature, N):
         super(WMA, self).__init__(feature, N, "wma")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-        # TODO: implement in Cython
-
-        def weighted_mean(x):
-            w = np.arange(len(x)) + 1
-            w = w / w.sum()
-            return np.nanmean(w * x)
+    def support_panel(self):
+        # the position in the window is counted from the first day of each instrument
+        return False
 
+    def _compute(self, series):
+        # the weights are linear in the position of the window: `np.nanmean(w * x)` with `w = (1, 2, ..., N) / sum(w)`
         if self.N == 0:
-            series = series.expanding(min_periods=1).apply(weighted_mean, raw=True)
+            series = _apply_cython(_expanding.expanding_wma, series)
         else:
-            series = series.rolling(self.N, min_periods=1).apply(weighted_mean, raw=True)
+            series = _apply_cython(_rolling.rolling_wma, series, self.N)
         return series
 
 
@@ -1365,21 +1545,20 @@ class EMA(Rolling):
     def __init__(self, feature, N):
         super(EMA, self).__init__(feature, N, "ema")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-
-        def exp_weighted_mean(x):
-            a = 1 - 2 / (1 + len(x))
-            w = a ** np.arange(len(x))[::-1]
-            w /= w.sum()
-            return np.nansum(w * x)
+    def support_panel(self):
+        # the weights of the expanding window depend on the first day of each instrument
+        return super(EMA, self).support_panel() and self.N != 0
 
+    def _compute(self, series):
         if self.N == 0:
-            series = series.expanding(min_periods=1).apply(exp_weighted_mean, raw=True)
+            # the span of the weights is the size of the expanding window
+            series = _apply_cython(expanding_ema, series)
         elif 0 < self.N < 1:
-            series = series.ewm(alpha=self.N, min_periods=1).mean()
+            # the same as `ewm(alpha=N, min_periods=1).mean()` of pandas
+            series = _apply_cython(ewm_mean, series, 1.0 / (1.0 + (1.0 / self.N - 1.0)))
         else:
-            series = series.ewm(span=self.N, min_periods=1).mean()
+            # the same as `ewm(span=N, min_periods=1).mean()` of pandas
+            series = _apply_cython(ewm_mean, series, 1.0 / (1.0 + (self.N - 1) / 2.0))
         return series
 
 
@@ -1425,7 +1604,40 @@ class PairRolling(ExpressionOps):
             series_right = self.feature_right.load(instrument, start_index, end_index, *args)
         else:
             series_right = self.feature_right
-
+        return self._compute(series_left, series_right)
+
+    def _load_array_internal(self, instrument, start_index, end_index, *args):
+        if isinstance(self.feature_left, Expression) and isinstance(self.feature_right, Expression):
+            start, array_left = self.feature_left.load_array(instrument, start_index, end_index, *args)
+            start_right, array_right = self.feature_right.load_array(instrument, start_index, end_index, *args)
+            if (start, len(array_left)) == (start_right, len(array_right)):
+                return start, self._compute(array_left, array_right)
+        # the series are aligned by the index
+        return series_to_array(self._load_internal(instrument, start_index, end_index, *args))
+
+    def _load_panel_internal(self, instruments, start_index, end_index, *args):
+        if isinstance(self.feature_left, Expression):
+            panel_left = self.feature_left.load_panel(instruments, start_index, end_index, *args)
+        else:
+            panel_left = self.feature_left  # numeric value
+        if isinstance(self.feature_right, Expression):
+            panel_right = self.feature_right.load_panel(instruments, start_index, end_index, *args)
+        else:
+            panel_right = self.feature_right
+        return self._compute(panel_left, panel_right)
+
+    def _compute(self, series_left, series_right):
+        """calculate with the loaded data, the series are aligned np.ndarray or pd.Series of one instrument or
+        pd.DataFrame panels"""
+        _types = (np.ndarray, pd.Series, pd.DataFrame)
+        if isinstance(series_left, _types) and isinstance(series_right, _types):
+            if self.N == 0 and self.func in _EXPANDING_PAIR_FUNCS:
+                return _apply_cython_pair(_EXPANDING_PAIR_FUNCS[self.func], series_left, series_right)
+            if self.N > 0 and self.func in _ROLLING_PAIR_FUNCS:
+                return _apply_cython_pair(_ROLLING_PAIR_FUNCS[self.func], series_left, series_right, self.N)
+        if isinstance(series_left, np.ndarray):
+            # calculated by pandas
+            return self._compute(pd.Series(series_left), pd.Series(series_right)).values
         if self.N == 0:
             series = getattr(series_left.expanding(min_periods=1), self.func)(series_right)
         else:
@@ -1485,17 +1697,17 @@ class Corr(PairRolling):
     def __init__(self, feature_left, feature_right, N):
         super(Corr, self).__init__(feature_left, feature_right, N, "corr")
 
-    def _load_internal(self, instrument, start_index, end_index, *args):
-        res: pd.Series = super(Corr, self)._load_internal(instrument, start_index, end_index, *args)
-
-        # NOTE: Load uses MemCache, so calling load again will not cause performance degradation
-        series_left = self.feature_left.load(instrument, start_index, end_index, *args)
-        series_right = self.feature_right.load(instrument, start_index, end_index, *args)
-        res.loc[
-            np.isclose(series_left.rolling(self.N, min_periods=1).std(), 0, atol=2e-05)
-            | np.isclose(series_right.rolling(self.N, min_periods=1).std(), 0, atol=2e-05)
-        ] = np.nan
-        return res
+    def _compute(self, series_left, series_right):
+        res = super(Corr, self)._compute(series_left, series_right)
+        if self.N == 0:
+            if isinstance(series_left, np.ndarray):
+                series_left, series_right = pd.Series(series_left), pd.Series(series_right)
+            std_left = series_left.rolling(self.N, min_periods=1).std()
+            std_right = series_right.rolling(self.N, min_periods=1).std()
+        else:
+            std_left = _apply_cython(_rolling.rolling_std, series_left, self.N)
+            std_right = _apply_cython(_rolling.rolling_std, series_right, self.N)
+        return _mask(res, np.isclose(std_left, 0, atol=2e-05) | np.isclose(std_right, 0, atol=2e-05))
 
 
 class Cov(PairRolling):
@@ -0,0 +1,281 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Expression parser
+
+The fields (e.g. `Mean($close, 5)/$close`) are tokenized and parsed into `Expression` trees directly, instead of
+being rewritten into python code by `qlib.utils.parse_field` and evaluated by `eval`.
+
+- The grammar is the subset of the python expressions used by the fields: the features (`$close`), the PIT features
+  (`$$roewa_q`), the numbers, the strings, `True`/`False`/`None`, the calls of the registered operators (please refer
+  to `qlib.data.ops.Operators`) with positional and keyword arguments, the unary `+ - ~` and the binary
+  `** * / + - & |` and comparison operators with the precedence of python.
+- The operators are applied by the `operator` module, so the result is exactly the same as `eval`, e.g. `1 - $close`
+  is `Sub(1,$close)` by `Expression.__rsub__` and `2 * 5` is `10`.
+- The structurally identical sub-expressions are interned, so the fields parsed by the same parser share them.
+- The other syntax (e.g. the chained comparisons) raises `UnsupportedSyntax` and the caller falls back to `eval`.
+
+The parsed fields can be saved to an on-disk cache, one file per field set in `C.parsed_fields_cache_dir`, so the
+worker processes which do not inherit the memory of the main process (e.g. the `loky` backend of joblib) load them
+instead of parsing them again.
+"""
+
+import keyword
+import operator
+import os
+import pickle
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Union
+
+from ..config import C
+from ..log import get_module_logger
+from ..utils import hash_args
+from .base import Expression
+from .ops import Operators
+
+# the same as `qlib.utils.parse_field`
+_NAME_CHARS = r"\w\u3001\uff1a\uff08\uff09"
+
+_TOKEN = re.compile(
+    rf"""\s*(?:
+        (?P<pfeature>\$\$[{_NAME_CHARS}]+)
+        |(?P<feature>\$[{_NAME_CHARS}]+)
+        |(?P<float>(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+)
+        |(?P<int>\d+)
+        |(?P<string>'[^'\\\n]*'|"[^"\\\n]*")
+        |(?P<name>[^\W\d]\w*)
+        |(?P<op>\*\*|[<>=!]=|[-+*/&|~<>(),=])
+        |(?P<error>\S)
+    )""",
+    re.VERBOSE,
+)
+
+# the precedence and the function of the binary operators, the comparisons are the lowest and not associative
+_BINARY_OPERATORS = {
+    ">": (0, operator.gt),
+    ">=": (0, operator.ge),
+    "<": (0, operator.lt),
+    "<=": (0, operator.le),
+    "==": (0, operator.eq),
+    "!=": (0, operator.ne),
+    "|": (1, operator.or_),
+    "&": (2, operator.and_),
+    "+": (3, operator.add),
+    "-": (3, operator.sub),
+    "*": (4, operator.mul),
+    "/": (4, operator.truediv),
+}
+
+_UNARY_OPERATORS = {"-": operator.neg, "+": operator.pos, "~": operator.invert}
+
+_CONSTANTS = {"True": True, "False": False, "None": None}
+
+_END = ("end", None)
+
+# the types of the literals, the other values are the nodes of the trees
+_LITERAL_TYPES = frozenset([int, float, str, bool, type(None)])
+
+
+class UnsupportedSyntax(Exception):
+    """the field is not in the grammar of `ExpressionParser`"""
+
+
+def tokenize(field: str) -> List[tuple]:
+    """split `field` into `(kind, value)` tokens, the numbers and the strings are converted to python objects"""
+    tokens = []
+    for match in _TOKEN.finditer(field):
+        kind = match.lastgroup
+        if kind is None:
+            # the trailing spaces
+            continue
+        text = match.group(kind)
+        if kind == "op" or kind == "name":
+            tokens.append((kind, text))
+        elif kind == "feature":
+            tokens.append((kind, text[1:]))
+        elif kind == "pfeature":
+            tokens.append((kind, text[2:]))
+        elif kind == "int":
+            if len(text) > 1 and text[0] == "0":
+                # python does not accept the leading zeros of the integers
+                raise UnsupportedSyntax(f"invalid number {text}")
+            tokens.append(("literal", int(text)))
+        elif kind == "float":
+            tokens.append(("literal", float(text)))
+        elif kind == "string":
+            value = text[1:-1]
+            if "$" in value or re.search(r"\w\s*\(", value):
+                # `parse_field` rewrites the strings too
+                raise UnsupportedSyntax(f"unsupported string {text}")
+            tokens.append(("literal", value))
+        else:
+            raise UnsupportedSyntax(f"unexpected character {text!r} at {match.start(kind)}")
+    tokens.append(_END)
+    return tokens
+
+
+class ExpressionParser:
+    """Parse the fields into `Expression` trees and intern the identical sub-expressions
+
+    The nodes are identified by how they are built, i.e. the operator class (or the function of the python operator)
+    and the identities of the arguments, so two nodes are shared only if `eval` would build them the same way.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[tuple, Expression] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, field: str) -> Union[Expression, int, float, str]:
+        """parse `field`, raise `UnsupportedSyntax` if it is out of the grammar"""
+        tokens = tokenize(field)
+        with self._lock:
+            self._tokens, self._pos = tokens, 0
+            result = self._expression()
+            if self._tokens[self._pos] is not _END:
+                raise UnsupportedSyntax(f"unexpected token {self._tokens[self._pos][1]!r}")
+        return result
+
+    @staticmethod
+    def _key(value) -> tuple:
+        if type(value) in _LITERAL_TYPES:
+            return type(value), value
+        # the interned nodes are kept alive by `self._nodes`, so their ids are not reused
+        return (id(value),)
+
+    def _intern(self, key: tuple, build) -> Expression:
+        node = self._nodes.get(key)
+        if node is None:
+            node = build()
+            if type(node) not in _LITERAL_TYPES:
+                self._nodes[key] = node
+        return node
+
+    def _apply(self, func, *operands):
+        if all(type(operand) in _LITERAL_TYPES for operand in operands):
+            return func(*operands)
+        return self._intern((func, tuple(map(self._key, operands))), lambda: func(*operands))
+
+    def _expect(self, value: str):
+        token = self._tokens[self._pos]
+        if token != ("op", value):
+            raise UnsupportedSyntax(f"{value!r} is expected instead of {token[1]!r}")
+        self._pos += 1
+
+    def _expression(self, min_precedence: int = 0):
+        """parse the binary operators by precedence climbing"""
+        left = self._operand()
+        compared = False
+        while True:
+            kind, value = self._tokens[self._pos]
+            if kind != "op" or value not in _BINARY_OPERATORS:
+                return left
+            precedence, func = _BINARY_OPERATORS[value]
+            if precedence < min_precedence:
+                return left
+            if precedence == 0:
+                if compared:
+                    # `a < b < c` is `a < b and b < c` in python
+                    raise UnsupportedSyntax("chained comparisons")
+                compared = True
+            self._pos += 1
+            left = self._apply(func, left, self._expression(precedence + 1))
+
+    def _operand(self):
+        """parse the unary operators, `**` and the atoms"""
+        kind, value = self._tokens[self._pos]
+        self._pos += 1
+        if kind == "op" and value in _UNARY_OPERATORS:
+            return self._apply(_UNARY_OPERATORS[value], self._operand())
+        if kind == "literal":
+            result = value
+        elif kind == "feature":
+            result = self._call("Feature", [value], {})
+        elif kind == "pfeature":
+            result = self._call("PFeature", [value], {})
+        elif kind == "name":
+            if value in _CONSTANTS:
+                result = _CONSTANTS[value]
+            elif keyword.iskeyword(value) or self._tokens[self._pos] != ("op", "("):
+                raise UnsupportedSyntax(f"unsupported name {value!r}")
+            else:
+                self._pos += 1
+                result = self._call(value, *self._arguments())
+        elif kind == "op" and value == "(":
+            result = self._expression()
+            self._expect(")")
+        else:
+            raise UnsupportedSyntax(f"unexpected token {value!r}")
+        if self._tokens[self._pos] == ("op", "**"):
+            self._pos += 1
+            # `**` is right-associative and binds less tightly than the unary operators on its right
+            return self._apply(operator.pow, result, self._operand())
+        return result
+
+    def _arguments(self):
+        args, kwargs = [], {}
+        while self._tokens[self._pos] != ("op", ")"):
+            kind, value = self._tokens[self._pos]
+            if kind == "name" and self._tokens[self._pos + 1] == ("op", "="):
+                self._pos += 2
+                if keyword.iskeyword(value) or value in kwargs:
+                    raise UnsupportedSyntax(f"invalid keyword argument {value!r}")
+                kwargs[value] = self._expression()
+            elif kwargs:
+                raise UnsupportedSyntax("positional argument follows keyword argument")
+            else:
+                args.append(self._expression())
+            if self._tokens[self._pos] != ("op", ")"):
+                self._expect(",")
+        self._pos += 1
+        return args, kwargs
+
+    def _call(self, name: str, args: list, kwargs: dict):
+        # the operators are looked up when they are called, the same as `Operators.<name>(...)` of `parse_field`
+        cls = getattr(Operators, name)
+        key = (cls, tuple(map(self._key, args)), tuple((k, self._key(v)) for k, v in kwargs.items()))
+        return self._intern(key, lambda: cls(*args, **kwargs))
+
+
+def _cache_path(fields: List[str]) -> Union[Path, None]:
+    cache_dir = C.get("parsed_fields_cache_dir")
+    if cache_dir is None:
+        return None
+    # the operators are part of the key, the same field set is parsed again after registering other custom operators
+    ops = {
+        name: f"{cls.__module__}.{cls.__qualname__}" for name, cls in Operators._ops.items()
+    }  # pylint: disable=W0212
+    return Path(cache_dir).expanduser().joinpath(hash_args(list(fields), ops) + ".pkl")
+
+
+def load_parsed_fields(fields: List[str]) -> Union[Dict[str, Expression], None]:
+    """load the parsed `fields` from the on-disk cache, None if they are not cached or the cache is disabled"""
+    path = _cache_path(fields)
+    if path is None or not path.exists():
+        return None
+    try:
+        with path.open("rb") as f:
+            return pickle.load(f)
+    except Exception as e:  # pylint: disable=W0703
+        get_module_logger("parser").warning(f"The parsed fields cache {path} is ignored: {e}")
+        return None
+
+
+def dump_parsed_fields(fields: List[str], expressions: Dict[str, Expression]):
+    """save the parsed `fields` to the on-disk cache if it is enabled"""
+    path = _cache_path(fields)
+    if path is None:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # the file is replaced atomically, the processes parsing the same fields do not read a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(expressions, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
@@ -17,11 +17,22 @@ import numpy as np
 import pandas as pd
 from qlib.data.ops import ElemOperator
 from qlib.log import get_module_logger
-from .data import Cal
+from .base import PFeature
+from .data import Cal, PITD
 
 
 class P(ElemOperator):
     def _load_internal(self, instrument, start_index, end_index, freq):
+        if isinstance(self.feature, PFeature):
+            # the as-of values of a period feature can be computed for all the trading days at once
+            try:
+                return self._load_asof_feature(instrument, start_index, end_index, freq).rename(str(self))
+            except NotImplementedError:
+                pass
+            except FileNotFoundError:
+                get_module_logger("base").warning(f"WARN: period data not found for {str(self)}")
+                return pd.Series(dtype="float32", name=str(self))
+
         _calendar = Cal.calendar(freq=freq)
         resample_data = np.empty(end_index - start_index + 1, dtype="float32")
 
@@ -50,6 +61,9 @@ class P(ElemOperator):
     def _load_feature(self, instrument, start_index, end_index, cur_time):
         return self.feature.load(instrument, start_index, end_index, cur_time)
 
+    def _load_asof_feature(self, instrument, start_index, end_index, freq):
+        return PITD.period_feature_asof(instrument, str(self.feature), start_index, end_index, freq)
+
     def get_longest_back_rolling(self):
         # The period data will collapse as a normal feature. So no extending and looking back
         return 0
@@ -69,3 +83,6 @@ class PRef(P):
 
     def _load_feature(self, instrument, start_index, end_index, cur_time):
         return self.feature.load(instrument, start_index, end_index, cur_time, self.period)
+
+    def _load_asof_feature(self, instrument, start_index, end_index, freq):
+        return PITD.period_feature_asof(instrument, str(self.feature), start_index, end_index, freq, self.period)
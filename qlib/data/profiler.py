@@ -0,0 +1,174 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Expression profiler
+
+An opt-in profiler of the expression engine. It records the calls of `Expression.load` (and `load_array`,
+`load_panel`) by operator type and by field:
+
+- calls, hits and misses: a call is a hit if the result is taken from the memory cache `H["f"]` or the evaluated
+  nodes of the compiled fields (please refer to `qlib.data.compiler`), otherwise it is a miss and calculated;
+- time: the wall time of the misses, including the sub-expressions, and self_time excluding them;
+- nbytes: the bytes of the results of the misses.
+
+A field is charged with the self time of the nodes calculated for it, so the sub-expressions shared by several
+fields are charged to the first one loading them.
+
+.. code-block:: python
+
+    from qlib.data.profiler import profile_expressions
+
+    with profile_expressions() as profiler:
+        D.features(instruments, fields)
+    profiler.report("field", sort_by="time").head(20)
+
+The stats of the joblib workers of `D.features` are merged into the profiler of the main process.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import pandas as pd
+
+# the stats of an operator type (by="operator") or a field (by="field")
+_OPERATOR_STATS = ["calls", "hits", "misses", "time", "self_time", "nbytes"]
+_FIELD_STATS = ["calls", "hits", "misses", "time", "nbytes"]
+
+
+class ExpressionProfiler:
+    """The stats of the expressions loaded since the last `reset`, profiling is enabled by `enabled`"""
+
+    def __init__(self):
+        self.enabled = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._stats = {"operator": {}, "field": {}}
+
+    @property
+    def _target(self) -> Dict[str, Dict[str, List[float]]]:
+        # the stats collected by `collect` in the current thread
+        return getattr(self._local, "target", None) or self._stats
+
+    @property
+    def _timers(self) -> list:
+        if not hasattr(self._local, "timers"):
+            self._local.timers = []
+        return self._local.timers
+
+    def set_field(self, field: str):
+        """set the field the following calls of the current thread are charged to, None to charge no field"""
+        self._local.field = field
+
+    @contextmanager
+    def field(self, field: str):
+        """charge the calls in the context to `field`"""
+        outer = getattr(self._local, "field", None)
+        self._local.field = field
+        try:
+            yield
+        finally:
+            self._local.field = outer
+
+    def _add(self, expression, values: list, field_values: list):
+        target = self._target
+        with self._lock:
+            stats = target["operator"].setdefault(type(expression).__name__, [0] * len(_OPERATOR_STATS))
+            for i, v in enumerate(values):
+                stats[i] += v
+            field = getattr(self._local, "field", None)
+            if field is not None:
+                stats = target["field"].setdefault(field, [0] * len(_FIELD_STATS))
+                for i, v in enumerate(field_values):
+                    stats[i] += v
+
+    def hit(self, expression):
+        """record a call of `expression` whose result is cached"""
+        self._add(expression, [1, 1, 0, 0.0, 0.0, 0], [1, 1, 0, 0.0, 0])
+
+    def start(self) -> float:
+        """start the timer of a miss, the returned value is passed to `stop`"""
+        self._timers.append(0.0)
+        return time.perf_counter()
+
+    def stop(self, expression, start: float, data):
+        """record a call of `expression` calculated since `start`, `data` is the result or None if it fails"""
+        from .cache import get_nbytes  # pylint: disable=C0415
+
+        elapsed = time.perf_counter() - start
+        timers = self._timers
+        self_time = elapsed - timers.pop()
+        if timers:
+            timers[-1] += elapsed
+        nbytes = 0 if data is None else get_nbytes(data)
+        self._add(expression, [1, 0, 1, elapsed, self_time, nbytes], [1, 0, 1, self_time, nbytes])
+
+    @contextmanager
+    def collect(self):
+        """collect the stats of the current thread in the context into the yielded dict instead, e.g. to return them
+        from a worker process"""
+        stats = {"operator": {}, "field": {}}
+        outer = getattr(self._local, "target", None)
+        self._local.target = stats
+        try:
+            yield stats
+        finally:
+            self._local.target = outer
+
+    def merge(self, stats: Dict[str, Dict[str, List[float]]]):
+        """add the `stats` collected by `collect` (e.g. in the workers) to the current stats"""
+        target = self._target
+        with self._lock:
+            for by, items in stats.items():
+                for name, values in items.items():
+                    total = target[by].setdefault(name, [0] * len(values))
+                    for i, v in enumerate(values):
+                        total[i] += v
+
+    def report(self, by: str = "operator", sort_by: str = "time", ascending: bool = False) -> pd.DataFrame:
+        """the stats by operator type or field
+
+        Parameters
+        ----------
+        by : str
+            "operator" or "field".
+        sort_by : str
+            the column to sort by, e.g. "time", "self_time" (by operator only), "calls", "misses", "nbytes".
+        ascending : bool
+            the order of sorting.
+
+        Returns
+        -------
+        pd.DataFrame
+            one row per operator type (or field) with the columns above and `hit_ratio`.
+        """
+        columns = {"operator": _OPERATOR_STATS, "field": _FIELD_STATS}[by]
+        df = pd.DataFrame.from_dict(self._stats[by], orient="index", columns=columns)
+        df.index.name = by
+        for col in ["calls", "hits", "misses", "nbytes"]:
+            df[col] = df[col].astype(int)
+        df["hit_ratio"] = df["hits"] / df["calls"]
+        return df.sort_values(sort_by, ascending=ascending)
+
+
+Profiler = ExpressionProfiler()
+
+
+@contextmanager
+def profile_expressions():
+    """profile the expressions loaded in the context, the stats are reset at the beginning
+
+    The joblib workers of `D.features` started in the context profile the expressions as well.
+    """
+    enabled = Profiler.enabled
+    Profiler.reset()
+    Profiler.enabled = True
+    try:
+        yield Profiler
+    finally:
+        Profiler.enabled = enabled
@@ -122,11 +122,40 @@ class FileCalendarStorage(FileStorageMixin, CalendarStorage):
     def _write_calendar(self, values: Iterable[CalVT], mode: str = "wb"):
         with self.uri.open(mode=mode) as fp:
             np.savetxt(fp, values, fmt="%s", encoding="utf-8")
+        # the binary calendar is outdated now
+        if self.npy_uri.exists():
+            self.npy_uri.unlink()
 
     @property
     def uri(self) -> Path:
         return self.dpm.get_data_uri(self._freq_file).joinpath(f"{self.storage_name}s", self.file_name)
 
+    @property
+    def npy_uri(self) -> Path:
+        """the binary calendar: int64 nanoseconds since epoch, written by `scripts/dump_bin.py`"""
+        return self.uri.with_suffix(".npy")
+
+    def _read_npy_calendar(self) -> Union[np.ndarray, None]:
+        """memory-map the binary calendar, return None if it does not exist or is older than the txt calendar"""
+        npy_uri = self.npy_uri
+        if not npy_uri.exists() or (self.uri.exists() and npy_uri.stat().st_mtime < self.uri.stat().st_mtime):
+            return None
+        return np.load(npy_uri, mmap_mode="r").view("M8[ns]")
+
+    @property
+    def data_array(self) -> np.ndarray:
+        if Freq(self._freq_file) == Freq(self.freq):
+            key = "orig_npy" + str(self.npy_uri)
+            if not self.enable_read_cache:
+                _calendar = self._read_npy_calendar()
+            elif key in H["m"]:
+                _calendar = H["m"][key]
+            else:
+                _calendar = H["m"][key] = self._read_npy_calendar()
+            if _calendar is not None:
+                return _calendar
+        return super(FileCalendarStorage, self).data_array
+
     @property
     def data(self) -> List[CalVT]:
         self.check()
@@ -377,3 +406,104 @@ class FileFeatureStorage(FileStorageMixin, FeatureStorage):
     def __len__(self) -> int:
         self.check()
         return self.uri.stat().st_size // 4 - 1
+
+
+class MmapFileFeatureStorage(FileFeatureStorage):
+    """FileFeatureStorage which reads the `.bin` file through `np.memmap`
+
+    One read-only memmap is kept per (provider_uri, instrument, field, freq) in the bounded handle pool `H["m"]`
+    (size: `C.mmap_pool_size`), together with the parsed header. Repeated range loads of the same feature
+    therefore never touch the filesystem again and slicing returns zero-copy views of the mapped pages.
+
+    The pool is cleared by `qlib.init` and the entry is dropped by `write` / `clear`. Files modified by other
+    processes are not detected until the entry is evicted.
+
+    Usage:
+
+        .. code-block:: python
+
+            qlib.init(
+                provider_uri=...,
+                feature_provider={
+                    "class": "LocalFeatureProvider",
+                    "kwargs": {"backend": {"class": "MmapFileFeatureStorage", "module_path": "qlib.data.storage.file_storage"}},
+                },
+            )
+    """
+
+    @property
+    def _mmap_key(self) -> tuple:
+        return str(self.provider_uri), self.freq, self.file_name
+
+    def _get_mmap(self) -> Union[Tuple[int, np.ndarray], None]:
+        """get (start_index, data) of the feature, return None if the file does not exist"""
+        key = self._mmap_key
+        if key in H["m"]:
+            return H["m"][key]
+        uri = self.uri
+        if not uri.exists():
+            return None
+        size = uri.stat().st_size // 4 - 1
+        with uri.open("rb") as fp:
+            start_index = int(np.frombuffer(fp.read(4), dtype="<f")[0])
+        if size > 0:
+            data = np.memmap(uri, dtype="<f", mode="r", offset=4, shape=(size,))
+        else:
+            # mmap can't map an empty region
+            data = np.empty(0, dtype="<f")
+        H["m"][key] = start_index, data
+        return start_index, data
+
+    def _evict(self):
+        key = self._mmap_key
+        if key in H["m"]:
+            H["m"].pop(key)
+
+    def clear(self):
+        self._evict()
+        super(MmapFileFeatureStorage, self).clear()
+
+    def write(self, data_array: Union[List, np.ndarray], index: int = None) -> None:
+        self._evict()
+        super(MmapFileFeatureStorage, self).write(data_array, index)
+        self._evict()
+
+    @property
+    def start_index(self) -> Union[int, None]:
+        _mm = self._get_mmap()
+        return None if _mm is None else _mm[0]
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Tuple[int, float], pd.Series]:
+        _mm = self._get_mmap()
+        if _mm is None:
+            if isinstance(i, int):
+                return None, None
+            elif isinstance(i, slice):
+                return pd.Series(dtype=np.float32)
+            else:
+                raise TypeError(f"type(i) = {type(i)}")
+
+        storage_start_index, data = _mm
+        storage_end_index = storage_start_index + len(data) - 1
+        if isinstance(i, int):
+            if storage_start_index > i:
+                raise IndexError(f"{i}: start index is {storage_start_index}")
+            return i, float(data[i - storage_start_index])
+        elif isinstance(i, slice):
+            start_index = storage_start_index if i.start is None else i.start
+            end_index = storage_end_index if i.stop is None else i.stop - 1
+            si = max(start_index, storage_start_index)
+            if si > end_index:
+                return pd.Series(dtype=np.float32)
+            # `np.asarray` drops the memmap subclass but keeps sharing the mapped buffer
+            _data = np.asarray(data[si - storage_start_index : end_index - storage_start_index + 1])
+            return pd.Series(_data, index=pd.RangeIndex(si, si + len(_data)))
+        else:
+            raise TypeError(f"type(i) = {type(i)}")
+
+    def __len__(self) -> int:
+        _mm = self._get_mmap()
+        if _mm is None:
+            # keep the error of `FileFeatureStorage`
+            self.check()
+        return len(_mm[1])
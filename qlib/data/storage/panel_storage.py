@@ -0,0 +1,195 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Consolidated (panel) feature storage
+
+Every field is stored as one `time x instrument` matrix instead of one `.bin` file per (instrument, field):
+
+    <provider_uri>/panels/<freq>/
+        instruments.txt         # one instrument per line, line `j` is column `j` of every matrix
+        <field>.npy             # float32, shape (len(calendar), len(instruments)), C order
+        <field>.range.npy       # int64, shape (len(instruments), 2), [start_index, end_index] of each column, -1 if absent
+
+Row `i` of a matrix is the `i`-th trading day of the calendar, so loading a field of the whole market for a time range
+is one contiguous read. The matrices are memory-mapped and shared by all the instruments.
+
+The panel can be converted from the `.bin` layout with `python scripts/dump_bin.py dump_panel --qlib_dir <qlib_dir>`.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from qlib.config import C
+from qlib.data.cache import H
+from qlib.data.storage import FeatureStorage
+from qlib.data.storage.file_storage import FileStorageMixin
+from qlib.log import get_module_logger
+
+logger = get_module_logger("panel_storage")
+
+
+class PanelFeatureStorage(FileStorageMixin, FeatureStorage):
+    """FeatureStorage backed by the consolidated panel layout, read-only
+
+    Usage:
+
+        .. code-block:: python
+
+            qlib.init(
+                provider_uri=...,
+                feature_provider={
+                    "class": "LocalFeatureProvider",
+                    "kwargs": {"backend": {"class": "PanelFeatureStorage", "module_path": "qlib.data.storage.panel_storage"}},
+                },
+            )
+    """
+
+    PANELS_DIR_NAME = "panels"
+    INSTRUMENTS_FILE_NAME = "instruments.txt"
+    DATA_SUFFIX = ".npy"
+    RANGE_SUFFIX = ".range.npy"
+
+    def __init__(self, instrument: str, field: str, freq: str, provider_uri: dict = None, **kwargs):
+        super(PanelFeatureStorage, self).__init__(instrument, field, freq, **kwargs)
+        self._provider_uri = None if provider_uri is None else C.DataPathManager.format_provider_uri(provider_uri)
+        self.file_name = f"{field.lower()}{self.DATA_SUFFIX}"
+
+    @property
+    def panel_dir(self) -> Path:
+        if self.freq not in self.support_freq:
+            raise ValueError(f"{self.storage_name}: {self.provider_uri} does not contain data for {self.freq}")
+        return self.dpm.get_data_uri(self.freq).joinpath(self.PANELS_DIR_NAME, self.freq.lower())
+
+    @property
+    def uri(self) -> Path:
+        return self.panel_dir.joinpath(self.file_name)
+
+    def _get_columns(self) -> Dict[str, int]:
+        key = (str(self.provider_uri), self.freq, "panel_instruments")
+        if key not in H["m"]:
+            _path = self.panel_dir.joinpath(self.INSTRUMENTS_FILE_NAME)
+            if not _path.exists():
+                raise ValueError(f"panel instruments not exists: {_path}")
+            with _path.open("r") as fp:
+                _insts = [line.strip() for line in fp if len(line.strip()) > 0]
+            H["m"][key] = {inst: i for i, inst in enumerate(_insts)}
+        return H["m"][key]
+
+    def _get_panel(self) -> Union[Tuple[np.ndarray, np.ndarray], None]:
+        """get (data, ranges) of the field, return None if the field does not exist"""
+        key = (str(self.provider_uri), self.freq, "panel", self.field.lower())
+        if key in H["m"]:
+            return H["m"][key]
+        uri = self.uri
+        if not uri.exists():
+            return None
+        data = np.load(uri, mmap_mode="r")
+        ranges = np.load(uri.with_name(f"{self.field.lower()}{self.RANGE_SUFFIX}"))
+        H["m"][key] = data, ranges
+        return data, ranges
+
+    def _get_column(self) -> Union[Tuple[int, int, np.ndarray], None]:
+        """get (start_index, end_index, column) of the instrument, return None if it does not exist"""
+        _panel = self._get_panel()
+        if _panel is None:
+            return None
+        col = self._get_columns().get(self.instrument.lower())
+        if col is None:
+            return None
+        data, ranges = _panel
+        start_index, end_index = ranges[col]
+        if start_index < 0:
+            return None
+        return int(start_index), int(end_index), data[:, col]
+
+    @property
+    def instruments(self) -> List[str]:
+        """instruments of the panel columns"""
+        return list(self._get_columns().keys())
+
+    @property
+    def ranges(self) -> pd.DataFrame:
+        """[start_index, end_index] of each instrument of the field, -1 if the instrument has no data"""
+        _panel = self._get_panel()
+        if _panel is None:
+            return pd.DataFrame(columns=["start_index", "end_index"], dtype=np.int64)
+        return pd.DataFrame(_panel[1], index=self.instruments, columns=["start_index", "end_index"])
+
+    def panel(self, start_index: int = None, end_index: int = None) -> pd.DataFrame:
+        """load the field of all the instruments in [start_index, end_index] with one contiguous read
+
+        The returned values share memory with the memory-mapped file. Cells outside the data range of an
+        instrument are NaN, please refer to `ranges` if the original ranges are required.
+
+        Returns
+        -------
+        pd.DataFrame
+            index: calendar index, columns: instruments
+        """
+        _panel = self._get_panel()
+        if _panel is None:
+            return pd.DataFrame(dtype=np.float32)
+        data = _panel[0]
+        start_index = 0 if start_index is None else max(start_index, 0)
+        end_index = len(data) - 1 if end_index is None else min(end_index, len(data) - 1)
+        if start_index > end_index:
+            return pd.DataFrame(columns=self.instruments, dtype=np.float32)
+        return pd.DataFrame(
+            np.asarray(data[start_index : end_index + 1]),
+            index=pd.RangeIndex(start_index, end_index + 1),
+            columns=self.instruments,
+        )
+
+    @property
+    def data(self) -> pd.Series:
+        return self[:]
+
+    @property
+    def start_index(self) -> Union[int, None]:
+        _col = self._get_column()
+        return None if _col is None else _col[0]
+
+    @property
+    def end_index(self) -> Union[int, None]:
+        _col = self._get_column()
+        return None if _col is None else _col[1]
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Tuple[int, float], pd.Series]:
+        _col = self._get_column()
+        if _col is None:
+            if isinstance(i, int):
+                return None, None
+            elif isinstance(i, slice):
+                return pd.Series(dtype=np.float32)
+            else:
+                raise TypeError(f"type(i) = {type(i)}")
+
+        storage_start_index, storage_end_index, column = _col
+        if isinstance(i, int):
+            if storage_start_index > i:
+                raise IndexError(f"{i}: start index is {storage_start_index}")
+            if i > storage_end_index:
+                raise IndexError(f"{i}: end index is {storage_end_index}")
+            return i, float(column[i])
+        elif isinstance(i, slice):
+            start_index = storage_start_index if i.start is None else i.start
+            end_index = storage_end_index if i.stop is None else i.stop - 1
+            si = max(start_index, storage_start_index)
+            ei = min(end_index, storage_end_index)
+            if si > ei:
+                return pd.Series(dtype=np.float32)
+            # a column is strided in the matrix, copy it to keep the series contiguous
+            return pd.Series(np.array(column[si : ei + 1]), index=pd.RangeIndex(si, ei + 1))
+        else:
+            raise TypeError(f"type(i) = {type(i)}")
+
+    def __len__(self) -> int:
+        _col = self._get_column()
+        if _col is None:
+            self.check()
+            return 0
+        return _col[1] - _col[0] + 1
@@ -0,0 +1,322 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+"""
+Parquet / Arrow IPC storage
+
+The features are read directly from a (partitioned) Parquet or Arrow IPC dataset in long format:
+
+    <provider_uri>/parquet/<freq>/...      # any layout `pyarrow.dataset` can discover, e.g. `instrument=SH600000/*.parquet`
+
+    instrument      datetime        $open   $close  ...
+    SH600000        2020-01-02      10.1    10.2    ...
+
+Every read pushes the instrument, the datetime range and the field down into `pyarrow.dataset`, so only the
+required columns are decoded and the row groups outside the range are skipped by their statistics. Sorting
+the files by (instrument, datetime) makes the pruning most effective. A feature is read by one scan per
+instrument, or by one scan for all the instruments with `C.panel_evaluation` (please refer to
+`ParquetFeatureStorage.panel`). The ranges of the instruments are read by one scan of the instrument and
+datetime columns per dataset.
+
+`calendars/<freq>.txt` and `instruments/<market>.txt` are used if they exist, otherwise the calendar and the
+`all` market are derived from the dataset.
+
+Usage:
+
+    .. code-block:: python
+
+        backend = {"module_path": "qlib.data.storage.parquet_storage", "kwargs": {"format": "parquet"}}
+        qlib.init(
+            provider_uri=...,
+            calendar_provider={"class": "LocalCalendarProvider", "kwargs": {"backend": {"class": "ParquetCalendarStorage", **backend}}},
+            instrument_provider={"class": "LocalInstrumentProvider", "kwargs": {"backend": {"class": "ParquetInstrumentStorage", **backend}}},
+            feature_provider={"class": "LocalFeatureProvider", "kwargs": {"backend": {"class": "ParquetFeatureStorage", **backend}}},
+        )
+"""
+
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from qlib.utils import code_to_fname, fname_to_code
+from qlib.utils.time import Freq
+from qlib.config import C
+from qlib.data.cache import H
+from qlib.log import get_module_logger
+from qlib.data.storage import FeatureStorage, CalVT, InstKT, InstVT
+from qlib.data.storage.file_storage import FileStorageMixin, FileCalendarStorage, FileInstrumentStorage
+
+logger = get_module_logger("parquet_storage")
+
+
+class ParquetStorageMixin(FileStorageMixin):
+    """ParquetStorageMixin, applicable to ParquetXXXStorage
+    Subclasses need to have provider_uri, freq and format attributes
+
+    """
+
+    PARQUET_DIR_NAME = "parquet"
+    INSTRUMENT_COLUMN = "instrument"
+    DATETIME_COLUMN = "datetime"
+
+    @property
+    def support_freq(self) -> List[str]:
+        _v = "_support_freq"
+        if hasattr(self, _v):
+            return getattr(self, _v)
+        if len(self.provider_uri) == 1 and C.DEFAULT_FREQ in self.provider_uri:
+            freq_l = map(
+                lambda x: x.name,
+                filter(
+                    lambda x: x.is_dir(),
+                    self.dpm.get_data_uri(C.DEFAULT_FREQ).joinpath(self.PARQUET_DIR_NAME).glob("*"),
+                ),
+            )
+        else:
+            freq_l = self.provider_uri.keys()
+        freq_l = [Freq(freq) for freq in freq_l]
+        setattr(self, _v, freq_l)
+        return freq_l
+
+    @property
+    def dataset_uri(self) -> Path:
+        if self.freq not in self.support_freq:
+            raise ValueError(f"{self.storage_name}: {self.provider_uri} does not contain data for {self.freq}")
+        return self.dpm.get_data_uri(self.freq).joinpath(self.PARQUET_DIR_NAME, str(self.freq))
+
+    @property
+    def dataset(self) -> ds.Dataset:
+        """the `pyarrow.dataset.Dataset`, the file discovery is cached in the handle pool `H["m"]`"""
+        key = (str(self.provider_uri), str(self.freq), "parquet_dataset", self.format)
+        if key not in H["m"]:
+            H["m"][key] = ds.dataset(str(self.dataset_uri), format=self.format, partitioning="hive")
+            # the files may be changed since the ranges are read
+            ParquetFeatureStorage.RANGES.pop(key, None)
+        return H["m"][key]
+
+    def _read_table(self, columns: List[str], expression: ds.Expression = None) -> pd.DataFrame:
+        return self.dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+class ParquetCalendarStorage(ParquetStorageMixin, FileCalendarStorage):
+    def __init__(self, freq: str, future: bool, provider_uri: dict = None, format: str = "parquet", **kwargs):
+        super(ParquetCalendarStorage, self).__init__(freq, future, provider_uri=provider_uri, **kwargs)
+        self.format = format
+
+    def _read_calendar(self) -> List[CalVT]:
+        if self.uri.exists():
+            return super(ParquetCalendarStorage, self)._read_calendar()
+        if self.future:
+            raise ValueError(f"future calendar can't be derived from the dataset: {self.dataset_uri}")
+        _table = self.dataset.to_table(columns=[self.DATETIME_COLUMN])
+        _calendar = pc.unique(_table.column(self.DATETIME_COLUMN)).to_pandas().sort_values()
+        return list(map(str, pd.DatetimeIndex(_calendar)))
+
+    def check(self):
+        if not self.uri.exists() and (self.future or not self.dataset_uri.exists()):
+            raise ValueError(f"{self.storage_name} not exists: {self.uri}")
+
+
+class ParquetInstrumentStorage(ParquetStorageMixin, FileInstrumentStorage):
+    DERIVABLE_MARKET = "all"
+
+    def __init__(self, market: str, freq: str, provider_uri: dict = None, format: str = "parquet", **kwargs):
+        super(ParquetInstrumentStorage, self).__init__(market, freq, provider_uri=provider_uri, **kwargs)
+        self.market = market
+        self.format = format
+
+    @property
+    def uri(self) -> Path:
+        return self.dpm.get_data_uri(self.freq).joinpath(f"{self.storage_name}s", self.file_name)
+
+    def _read_instrument(self) -> Dict[InstKT, InstVT]:
+        if self.uri.exists() or self.market.lower() != self.DERIVABLE_MARKET:
+            return super(ParquetInstrumentStorage, self)._read_instrument()
+        df = self._read_table(columns=[self.INSTRUMENT_COLUMN, self.DATETIME_COLUMN])
+        df = df.groupby(self.INSTRUMENT_COLUMN, observed=True)[self.DATETIME_COLUMN].agg(["min", "max"])
+        return {str(inst): [(pd.Timestamp(_s), pd.Timestamp(_e))] for inst, _s, _e in df.itertuples()}
+
+    def check(self):
+        if not self.uri.exists() and (self.market.lower() != self.DERIVABLE_MARKET or not self.dataset_uri.exists()):
+            raise ValueError(f"{self.storage_name} not exists: {self.uri}")
+
+
+class ParquetFeatureStorage(ParquetStorageMixin, FeatureStorage):
+    """FeatureStorage backed by a Parquet / Arrow IPC dataset, read-only
+
+    The calendar index is mapped to datetime with the calendar of `ParquetCalendarStorage`, so the range of a
+    feature is [first datetime, last datetime] of the instrument and the missing days inside are NaN, the same as
+    the `.bin` files dumped by `scripts/dump_bin.py`.
+    """
+
+    # the ranges of the instruments of each dataset, they are kept out of the handle pool `H["m"]`, which is
+    # bounded by count
+    RANGES: Dict[tuple, pd.DataFrame] = {}
+
+    def __init__(
+        self, instrument: str, field: str, freq: str, provider_uri: dict = None, format: str = "parquet", **kwargs
+    ):
+        super(ParquetFeatureStorage, self).__init__(instrument, field, freq, **kwargs)
+        self._provider_uri = None if provider_uri is None else C.DataPathManager.format_provider_uri(provider_uri)
+        self.format = format
+        self.code = fname_to_code(instrument)
+
+    @property
+    def uri(self) -> Path:
+        return self.dataset_uri
+
+    @property
+    def calendar(self) -> np.ndarray:
+        key = (str(self.provider_uri), str(self.freq), "parquet_calendar", self.format)
+        if key not in H["c"]:
+            _calendar = ParquetCalendarStorage(
+                self.freq, future=False, provider_uri=self._provider_uri, format=self.format
+            ).data
+            H["c"][key] = pd.DatetimeIndex(list(map(pd.Timestamp, _calendar))).values
+        return H["c"][key]
+
+    @property
+    def _column(self) -> Union[str, None]:
+        """the column of the field, None if the dataset does not contain it"""
+        names = self.dataset.schema.names
+        for _name in (f"${self.field}", self.field):
+            if _name in names:
+                return _name
+        return None
+
+    @property
+    def ranges(self) -> pd.DataFrame:
+        """[start_index, end_index] of each instrument of the dataset, the index is the lowercase file names"""
+        dataset = self.dataset
+        key = (str(self.provider_uri), str(self.freq), "parquet_dataset", self.format)
+        if key not in self.RANGES:
+            _table = dataset.to_table(columns=[self.INSTRUMENT_COLUMN, self.DATETIME_COLUMN])
+            _table = _table.group_by(self.INSTRUMENT_COLUMN).aggregate(
+                [(self.DATETIME_COLUMN, "min"), (self.DATETIME_COLUMN, "max")]
+            )
+            calendar = self.calendar
+            _min = _table.column(f"{self.DATETIME_COLUMN}_min").to_numpy().astype(calendar.dtype)
+            _max = _table.column(f"{self.DATETIME_COLUMN}_max").to_numpy().astype(calendar.dtype)
+            self.RANGES[key] = pd.DataFrame(
+                {
+                    "start_index": calendar.searchsorted(_min, side="left"),
+                    "end_index": calendar.searchsorted(_max, side="right") - 1,
+                },
+                index=[
+                    code_to_fname(str(_code)).lower() for _code in _table.column(self.INSTRUMENT_COLUMN).to_pylist()
+                ],
+            )
+        return self.RANGES[key]
+
+    def _get_range(self) -> Union[Tuple[int, int], None]:
+        ranges = self.ranges
+        name = code_to_fname(self.code).lower()
+        if name not in ranges.index:
+            return None
+        start_index, end_index = ranges.loc[name]
+        return int(start_index), int(end_index)
+
+    def panel(self, start_index: int = None, end_index: int = None) -> pd.DataFrame:
+        """load the field of all the instruments in [start_index, end_index] with one scan of the dataset
+
+        Only the instrument, the datetime and the field columns are decoded and the datetime range is pushed down.
+        Cells outside the data range of an instrument are NaN, please refer to `ranges` if the original ranges are
+        required.
+
+        Returns
+        -------
+        pd.DataFrame
+            index: calendar index, columns: the lowercase file names of the instruments
+        """
+        calendar = self.calendar
+        column = self._column
+        start_index = 0 if start_index is None else max(start_index, 0)
+        end_index = len(calendar) - 1 if end_index is None else min(end_index, len(calendar) - 1)
+        if column is None or start_index > end_index:
+            return pd.DataFrame(dtype=np.float32)
+        _filter = (ds.field(self.DATETIME_COLUMN) >= pd.Timestamp(calendar[start_index])) & (
+            ds.field(self.DATETIME_COLUMN) <= pd.Timestamp(calendar[end_index])
+        )
+        df = self._read_table(columns=[self.INSTRUMENT_COLUMN, self.DATETIME_COLUMN, column], expression=_filter)
+        _datetime = df[self.DATETIME_COLUMN].values.astype(calendar.dtype)
+        index = calendar.searchsorted(_datetime)
+        # drop the datetime which is not in the calendar
+        mask = (index < len(calendar)) & (calendar[np.minimum(index, len(calendar) - 1)] == _datetime)
+        codes, uniques = pd.factorize(np.asarray(df[self.INSTRUMENT_COLUMN].values)[mask])
+        data = np.full((end_index - start_index + 1, len(uniques)), np.nan, dtype="<f")
+        data[index[mask] - start_index, codes] = df[column].values[mask]
+        return pd.DataFrame(
+            data,
+            index=pd.RangeIndex(start_index, end_index + 1),
+            columns=[code_to_fname(str(_code)).lower() for _code in uniques],
+        )
+
+    @property
+    def data(self) -> pd.Series:
+        return self[:]
+
+    @property
+    def start_index(self) -> Union[int, None]:
+        _range = self._get_range()
+        return None if _range is None else _range[0]
+
+    @property
+    def end_index(self) -> Union[int, None]:
+        _range = self._get_range()
+        return None if _range is None else _range[1]
+
+    def _load(self, start_index: int, end_index: int) -> pd.Series:
+        calendar = self.calendar
+        column = self._column
+        _filter = (
+            (ds.field(self.INSTRUMENT_COLUMN) == self.code)
+            & (ds.field(self.DATETIME_COLUMN) >= pd.Timestamp(calendar[start_index]))
+            & (ds.field(self.DATETIME_COLUMN) <= pd.Timestamp(calendar[end_index]))
+        )
+        df = self._read_table(columns=[self.DATETIME_COLUMN, column], expression=_filter)
+        _datetime = df[self.DATETIME_COLUMN].values.astype(calendar.dtype)
+        index = calendar.searchsorted(_datetime)
+        # drop the datetime which is not in the calendar
+        mask = (index < len(calendar)) & (calendar[np.minimum(index, len(calendar) - 1)] == _datetime)
+        data = np.full(end_index - start_index + 1, np.nan, dtype="<f")
+        data[index[mask] - start_index] = df[column].values[mask]
+        return pd.Series(data, index=pd.RangeIndex(start_index, end_index + 1))
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Tuple[int, float], pd.Series]:
+        _range = None if self._column is None else self._get_range()
+        if _range is None:
+            if isinstance(i, int):
+                return None, None
+            elif isinstance(i, slice):
+                return pd.Series(dtype=np.float32)
+            else:
+                raise TypeError(f"type(i) = {type(i)}")
+
+        storage_start_index, storage_end_index = _range
+        if isinstance(i, int):
+            if storage_start_index > i:
+                raise IndexError(f"{i}: start index is {storage_start_index}")
+            if i > storage_end_index:
+                raise IndexError(f"{i}: end index is {storage_end_index}")
+            return i, float(self._load(i, i).iloc[0])
+        elif isinstance(i, slice):
+            start_index = storage_start_index if i.start is None else i.start
+            end_index = storage_end_index if i.stop is None else i.stop - 1
+            si = max(start_index, storage_start_index)
+            ei = min(end_index, storage_end_index)
+            if si > ei:
+                return pd.Series(dtype=np.float32)
+            return self._load(si, ei)
+        else:
+            raise TypeError(f"type(i) = {type(i)}")
+
+    def __len__(self) -> int:
+        _range = self._get_range()
+        if _range is None:
+            self.check()
+            return 0
+        return _range[1] - _range[0] + 1
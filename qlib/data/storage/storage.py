@@ -102,6 +102,19 @@ class CalendarStorage(BaseStorage):
         """
         raise NotImplementedError("Subclass of CalendarStorage must implement `data` method")
 
+    @property
+    def data_array(self) -> np.ndarray:
+        """get all data as a sorted `datetime64[ns]` array
+
+        Subclasses could override it to provide the array without parsing `data`(e.g. memory-mapped file)
+
+        Raises
+        ------
+        ValueError
+            If the data(storage) does not exist, raise ValueError
+        """
+        return pd.DatetimeIndex(list(map(pd.Timestamp, self.data))).values
+
     def clear(self) -> None:
         raise NotImplementedError("Subclass of CalendarStorage must implement `clear` method")
 
@@ -175,18 +175,18 @@ def read_period_data(
 
 def np_ffill(arr: np.array):
     """
-    forward fill a 1D numpy array
+    forward fill a numpy array along its last axis
 
     Parameters
     ----------
     arr : np.array
-        Input numpy 1D array
+        Input numpy array, e.g. a 1D array or a 2D array of many 1D arrays
     """
     mask = np.isnan(arr.astype(float))  # np.isnan only works on np.float
     # get fill index
-    idx = np.where(~mask, np.arange(mask.shape[0]), 0)
-    np.maximum.accumulate(idx, out=idx)
-    return arr[idx]
+    idx = np.where(~mask, np.arange(mask.shape[-1]), 0)
+    np.maximum.accumulate(idx, axis=-1, out=idx)
+    return np.take_along_axis(arr, idx, axis=-1)
 
 
 #################### Search ####################
@@ -628,7 +628,7 @@ def exists_qlib_data(qlib_dir):
         .loc[:, 0]
         .apply(str.lower)
     ) - set(code_names)
-    
+
     if miss_code and any(map(lambda x: "sht" not in x, miss_code)):
         return False
 
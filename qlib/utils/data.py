@@ -3,6 +3,7 @@
 """
 This module covers some utility functions that operate on data or basic object
 """
+import warnings
 from copy import deepcopy
 from typing import List, Union
 import pandas as pd
@@ -32,6 +33,110 @@ def zscore(x: Union[pd.Series, pd.DataFrame]):
     return (x - x.mean()).div(x.std())
 
 
+# The segment kernels below calculate the functions above for every segment of rows (e.g. the instruments of a
+# datetime) of a (columns, rows) array, whose rows of a segment `bounds[i]:bounds[i + 1]` are contiguous. This is the
+# layout of a sorted `DataFrame` of one dtype in pandas, so the reductions of numpy are called on the same memory as
+# `DataFrame.groupby(...).apply(...)` does and the results are the same bit for bit.
+
+
+def _nanmean(values: np.ndarray) -> np.ndarray:
+    # the `DataFrame.mean` of the columns of `values.T`
+    mask = np.isnan(values)
+    count = (values.shape[1] - mask.sum(axis=1)).astype(values.dtype)
+    if mask.any():
+        values = np.where(mask, values.dtype.type(0), values)
+    with np.errstate(all="ignore"):
+        mean = values.sum(axis=1, dtype=values.dtype) / count
+    mean[count == 0] = np.nan
+    return mean
+
+
+def _nanstd(values: np.ndarray) -> np.ndarray:
+    # the `DataFrame.std` (ddof=1) of the columns of `values.T`, by the two-pass algorithm of pandas
+    mask = np.isnan(values)
+    count = (values.shape[1] - mask.sum(axis=1)).astype(values.dtype)
+    d = count - values.dtype.type(1)
+    d[count <= 1] = np.nan
+    count[count <= 1] = np.nan
+    values = np.where(mask, values.dtype.type(0), values)
+    with np.errstate(all="ignore"):
+        avg = values.sum(axis=1, dtype=np.float64) / count
+        sqr = (avg[:, None] - values) ** 2
+        sqr[mask] = 0
+        return np.sqrt((sqr.sum(axis=1, dtype=np.float64) / d).astype(values.dtype, copy=False))
+
+
+def _nanmedian(values: np.ndarray) -> np.ndarray:
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "All-NaN slice encountered", RuntimeWarning)
+        return np.nanmedian(values, axis=1)
+
+
+def segment_zscore(values: np.ndarray, bounds: np.ndarray, robust: bool = False) -> np.ndarray:
+    """`zscore` (or `robust_zscore` if `robust`) of every segment of `values`
+
+    Parameters
+    ----------
+    values : np.ndarray
+        (columns, rows) of a float dtype, it is not modified.
+    bounds : np.ndarray
+        the rows of segment i are `bounds[i]:bounds[i + 1]`.
+
+    Returns
+    -------
+    np.ndarray
+        (columns, rows) of the dtype of `values`.
+    """
+    out = np.empty_like(values)
+    with np.errstate(all="ignore"):
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            x = values[:, start:end]
+            if robust:
+                x = x - _nanmedian(x)[:, None]
+                x = x / _nanmedian(np.abs(x))[:, None] / 1.4826
+                out[:, start:end] = np.clip(x, -3, 3)
+            else:
+                out[:, start:end] = (x - _nanmean(x)[:, None]) / _nanstd(x)[:, None]
+    return out
+
+
+def segment_fillna_mean(values: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    """`x.fillna(x.mean())` of every segment `x` of `values`, please refer to `segment_zscore` for the arguments"""
+    out = values.copy()
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        x = out[:, start:end]
+        mask = np.isnan(x)
+        if mask.any():
+            np.copyto(x, _nanmean(x)[:, None], where=mask)
+    return out
+
+
+def segment_rank(values: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    """the percentage rank (`rank(pct=True)`) in float64 of every segment of `values`, NaN is kept
+
+    The ties get their average rank. Please refer to `segment_zscore` for the arguments.
+    """
+    out = np.empty(values.shape, dtype=np.float64)
+    with np.errstate(all="ignore"):
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            # NaN are sorted to the end
+            order = np.argsort(values[:, start:end], axis=1)
+            x = np.take_along_axis(values[:, start:end], order, axis=1)
+            pos = np.arange(end - start)
+            # the runs of the ties
+            new_run = np.ones(x.shape, dtype=bool)
+            new_run[:, 1:] = x[:, 1:] != x[:, :-1]
+            run_start = np.maximum.accumulate(np.where(new_run, pos, 0), axis=1)
+            end_run = np.ones(x.shape, dtype=bool)
+            end_run[:, :-1] = new_run[:, 1:]
+            run_end = np.minimum.accumulate(np.where(end_run, pos, end - start)[:, ::-1], axis=1)[:, ::-1]
+            valid = ~np.isnan(x)
+            rank = (run_start + run_end + 2) / 2.0 / valid.sum(axis=1, keepdims=True)
+            rank[~valid] = np.nan
+            np.put_along_axis(out[:, start:end], order, rank, axis=1)
+    return out
+
+
 def deepcopy_basic_type(obj: object) -> object:
     """
     deepcopy an object without copy the complicated objects.
@@ -1,9 +1,15 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import atexit
+import multiprocessing
+import os
+import pickle
+import sys
 from functools import partial
-from threading import Thread
-from typing import Callable, Text, Union
+from multiprocessing.connection import wait
+from threading import Lock, Thread
+from typing import Callable, List, Optional, Text, Union
 
 from joblib import Parallel, delayed
 from joblib._parallel_backends import MultiprocessingBackend
@@ -13,6 +19,7 @@ from queue import Queue
 import concurrent
 
 from qlib.config import C, QlibConfig
+from qlib.log import get_module_logger
 
 
 class ParallelExt(Parallel):
@@ -23,6 +30,209 @@ class ParallelExt(Parallel):
             self._backend_args["maxtasksperchild"] = maxtasksperchild
 
 
+def get_rss() -> int:
+    """the resident memory of the current process in bytes, the peak of it if the current one is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource  # pylint: disable=C0415
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _pool_worker(tasks, results, cancelled, config: bytes, memory_limit: Optional[int]):
+    """the loop of a worker of `WorkerPool`"""
+    from qlib.data.cache import H  # pylint: disable=C0415
+
+    C.register_from_C(pickle.loads(config))
+    epoch = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        call_id, index, task_config, task_epoch, (func, args, kwargs) = task
+        if call_id <= cancelled.value:
+            continue
+        try:
+            if task_config != config:
+                # the config is changed in the main process after the worker started
+                C.set_conf_from_C(pickle.loads(task_config))
+                config = task_config
+            if task_epoch != epoch:
+                if epoch is not None:
+                    H.clear()
+                epoch = task_epoch
+            result = (call_id, index, True, func(*args, **kwargs))
+        except Exception as e:  # pylint: disable=W0703
+            result = (call_id, index, False, e)
+        try:
+            results.put(result)
+        except Exception as e:  # pylint: disable=W0703
+            results.put((call_id, index, False, RuntimeError(f"The result of the task is not picklable: {e}")))
+        if memory_limit is not None and get_rss() > memory_limit:
+            # the worker is replaced by the main process
+            results.put((None, None, False, os.getpid()))
+            break
+
+
+class WorkerPool:
+    """A long-lived pool of worker processes for the tasks of `D.features`
+
+    `ParallelExt` starts new workers for every call, so the workers load the calendars and the instruments, parse the
+    fields and fill the memory caches `H` again every time. The workers of the pool keep them between the calls, which
+    helps when `D.features` is called many times, e.g. rolling retraining or online serving.
+
+    - The pool is started by `qlib.init` if `C.worker_pool` is enabled, or by `WorkerPool.start`, and stopped by
+      `WorkerPool.stop`, another `qlib.init` or at exit.
+    - The config of the main process is sent with the tasks, the workers apply it if it is changed.
+    - `clear_mem_cache` clears the memory caches of the workers before their next tasks, e.g. after the data is
+      updated.
+    - A worker whose resident memory exceeds `memory_limit` after a task is replaced by a new one, instead of
+      `maxtasksperchild`.
+
+    The tasks are the `delayed` tuples of joblib and the pool is called like `joblib.Parallel`.
+    """
+
+    _pool = None
+    _pid = None
+
+    def __init__(self, n_workers: int, memory_limit: Optional[int] = None):
+        self.n_workers = n_workers
+        self.memory_limit = memory_limit
+        self.n_recycled = 0
+        self._ctx = multiprocessing.get_context()
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.SimpleQueue()
+        # the tasks of the calls before `cancelled` are skipped by the workers
+        self._cancelled = self._ctx.Value("q", 0, lock=False)
+        self._workers = {}
+        self._recycling = set()
+        self._lock = Lock()
+        self._call_id = 0
+        self._epoch = 0
+        for _ in range(n_workers):
+            self._start_worker()
+
+    @classmethod
+    def start(cls, n_workers: Optional[int] = None, memory_limit: Optional[int] = None) -> "WorkerPool":
+        """start the pool of the current process, the previous one is stopped
+
+        Parameters
+        ----------
+        n_workers : int
+            the number of workers, `C.get_kernels("day")` by default.
+        memory_limit : int
+            the resident memory in bytes after which a worker is replaced, `C.worker_pool_memory_limit` by default.
+        """
+        cls.stop()
+        if n_workers is None:
+            n_workers = C.get_kernels("day")
+        if memory_limit is None:
+            memory_limit = C.get("worker_pool_memory_limit")
+        cls._pool, cls._pid = cls(n_workers, memory_limit), os.getpid()
+        atexit.register(cls.stop)
+        return cls._pool
+
+    @classmethod
+    def stop(cls):
+        """stop the pool of the current process"""
+        if cls._pool is not None and cls._pid == os.getpid():
+            cls._pool.close()
+        cls._pool = None
+
+    @classmethod
+    def get(cls) -> Optional["WorkerPool"]:
+        """the pool of the current process, None if it is not started"""
+        # the forked workers inherit the pool of the main process
+        return cls._pool if cls._pid == os.getpid() else None
+
+    def _start_worker(self):
+        process = self._ctx.Process(
+            target=_pool_worker,
+            args=(self._tasks, self._results, self._cancelled, pickle.dumps(C), self.memory_limit),
+            daemon=True,
+        )
+        process.start()
+        self._workers[process.sentinel] = process
+
+    def clear_mem_cache(self):
+        """clear the memory caches `H` of the workers before their next tasks"""
+        from qlib.data.cache import SharedMemCache  # pylint: disable=C0415
+
+        # the workers map the features shared by the session of the main process
+        SharedMemCache.clear()
+        self._epoch += 1
+
+    def __call__(self, tasks) -> List:
+        """run the `delayed` tuples `tasks` and return their results in order, the first exception is raised"""
+        tasks = list(tasks)
+        with self._lock:
+            if not self._workers:
+                raise RuntimeError("The worker pool is closed")
+            self._call_id += 1
+            config = pickle.dumps(C)
+            for index, task in enumerate(tasks):
+                self._tasks.put((self._call_id, index, config, self._epoch, task))
+            try:
+                return self._collect(len(tasks))
+            except BaseException:
+                self._cancelled.value = self._call_id
+                raise
+
+    def _receive(self, results: list) -> int:
+        """receive a message of the workers, return the number of the results of the current call"""
+        call_id, index, ok, value = self._results.get()
+        if call_id is None:
+            self._recycling.add(value)
+            return 0
+        if call_id != self._call_id:
+            # the results of a cancelled call
+            return 0
+        if not ok:
+            raise value
+        results[index] = value
+        return 1
+
+    def _collect(self, n_tasks: int) -> List:
+        results = [None] * n_tasks
+        pending = n_tasks
+        reader = self._results._reader  # pylint: disable=W0212
+        while pending > 0:
+            ready = wait([reader, *self._workers])
+            if reader in ready:
+                pending -= self._receive(results)
+            for sentinel in ready:
+                if sentinel is reader:
+                    continue
+                # the messages sent before the worker exited
+                while reader.poll():
+                    pending -= self._receive(results)
+                process = self._workers.pop(sentinel)
+                process.join()
+                self._start_worker()
+                if process.pid in self._recycling:
+                    self._recycling.remove(process.pid)
+                    self.n_recycled += 1
+                else:
+                    raise RuntimeError(f"A worker of the pool exited unexpectedly with code {process.exitcode}")
+        return results
+
+    def close(self):
+        """stop the workers"""
+        with self._lock:
+            for _ in self._workers:
+                self._tasks.put(None)
+            for process in self._workers.values():
+                process.join(timeout=10)
+                if process.is_alive():
+                    get_module_logger("WorkerPool").warning(f"The worker {process.pid} is terminated")
+                    process.terminate()
+            self._workers.clear()
+            self._tasks.close()
+
+
 def datetime_groupby_apply(
     df, apply_func: Union[Callable, Text], axis=0, level="datetime", resample_rule="M", n_jobs=-1
 ):
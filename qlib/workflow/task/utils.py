@@ -8,6 +8,7 @@ import bisect
 from copy import deepcopy
 import pandas as pd
 from qlib.data import D
+from qlib.data.dataset.handler import DataHandlerLP
 from qlib.utils import hash_args
 from qlib.utils.mod import init_instance_by_config
 from qlib.workflow import R
@@ -303,6 +304,10 @@ def replace_task_handler_with_cache(task: dict, cache_dir: Union[str, Path] = ".
         h_path = cache_dir / f"{handler['class']}.{hash[:10]}.pkl"
         if not h_path.exists():
             h = init_instance_by_config(handler)
-            h.to_pickle(h_path, dump_all=True)
+            if isinstance(h, DataHandlerLP):
+                # the data are memory mapped and shared by the tasks loading the handler
+                h.to_snapshot(h_path)
+            else:
+                h.to_pickle(h_path, dump_all=True)
         task["dataset"]["kwargs"]["handler"] = f"file://{h_path}"
     return task
@@ -5,7 +5,7 @@ import abc
 import shutil
 import traceback
 from pathlib import Path
-from typing import Iterable, List, Union
+from typing import Iterable, List, Tuple, Union
 from functools import partial
 from concurrent.futures import ThreadPoolExecutor, as_completed, ProcessPoolExecutor
 
@@ -146,7 +146,9 @@ class DumpDataBase:
         return (
             self._include_fields
             if self._include_fields
-            else set(df_columns) - set(self._exclude_fields) if self._exclude_fields else df_columns
+            else set(df_columns) - set(self._exclude_fields)
+            if self._exclude_fields
+            else df_columns
         )
 
     @staticmethod
@@ -176,6 +178,11 @@ class DumpDataBase:
         calendars_path = str(self._calendars_dir.joinpath(f"{self.freq}.txt").expanduser().resolve())
         result_calendars_list = [self._format_datetime(x) for x in calendars_data]
         np.savetxt(calendars_path, result_calendars_list, fmt="%s", encoding="utf-8")
+        # binary calendar(int64 nanoseconds since epoch), it is memory-mapped by `FileCalendarStorage`
+        np.save(
+            str(self._calendars_dir.joinpath(f"{self.freq}.npy").expanduser().resolve()),
+            pd.DatetimeIndex(result_calendars_list).values.astype("M8[ns]").view("<i8"),
+        )
 
     def save_instruments(self, instruments_data: Union[list, pd.DataFrame]):
         self._instruments_dir.mkdir(parents=True, exist_ok=True)
@@ -501,5 +508,130 @@ class DumpDataUpdate(DumpDataBase):
         self.save_instruments(df.reset_index())
 
 
+class DumpPanel:
+    """convert the `.bin` features of `qlib_dir` to the consolidated panel layout
+
+    Each field is saved as one `time x instrument` float32 matrix `panels/<freq>/<field>.npy`, together with the
+    `[start_index, end_index]` table `<field>.range.npy` of every instrument and the column table `instruments.txt`.
+    Please refer to `qlib.data.storage.panel_storage` for the details of the layout.
+    """
+
+    CALENDARS_DIR_NAME = "calendars"
+    FEATURES_DIR_NAME = "features"
+    PANELS_DIR_NAME = "panels"
+    INSTRUMENTS_FILE_NAME = "instruments.txt"
+    DUMP_FILE_SUFFIX = ".bin"
+
+    def __init__(
+        self,
+        qlib_dir: str,
+        freq: str = "day",
+        max_workers: int = 16,
+        exclude_fields: str = "",
+        include_fields: str = "",
+    ):
+        """
+
+        Parameters
+        ----------
+        qlib_dir: str
+            qlib(dump) data director
+        freq: str, default "day"
+            transaction frequency
+        max_workers: int, default 16
+            number of threads
+        include_fields: tuple
+            converted fields
+        exclude_fields: tuple
+            fields not converted
+        """
+        if isinstance(exclude_fields, str):
+            exclude_fields = exclude_fields.split(",")
+        if isinstance(include_fields, str):
+            include_fields = include_fields.split(",")
+        self._exclude_fields = tuple(filter(lambda x: len(x) > 0, map(str.strip, exclude_fields)))
+        self._include_fields = tuple(filter(lambda x: len(x) > 0, map(str.strip, include_fields)))
+        self.qlib_dir = Path(qlib_dir).expanduser()
+        self.freq = freq
+        self.works = max_workers
+
+        self._calendars_dir = self.qlib_dir.joinpath(self.CALENDARS_DIR_NAME)
+        self._features_dir = self.qlib_dir.joinpath(self.FEATURES_DIR_NAME)
+        self._panels_dir = self.qlib_dir.joinpath(self.PANELS_DIR_NAME, self.freq.lower())
+
+    def _get_fields(self, instruments: List[str]) -> List[str]:
+        bin_suffix = f".{self.freq.lower()}{self.DUMP_FILE_SUFFIX}"
+        fields = set()
+        for inst in instruments:
+            for bin_path in self._features_dir.joinpath(inst).glob(f"*{bin_suffix}"):
+                fields.add(bin_path.name[: -len(bin_suffix)])
+        if self._include_fields:
+            fields &= set(map(str.lower, self._include_fields))
+        if self._exclude_fields:
+            fields -= set(map(str.lower, self._exclude_fields))
+        return sorted(fields)
+
+    def _bin_path(self, inst: str, field: str) -> Path:
+        return self._features_dir.joinpath(inst, f"{field}.{self.freq.lower()}{self.DUMP_FILE_SUFFIX}")
+
+    def _read_range(self, inst: str, field: str) -> Tuple[int, int]:
+        """read [start_index, end_index] from the header and the size of the bin, (-1, -1) if it has no data"""
+        bin_path = self._bin_path(inst, field)
+        if not bin_path.exists():
+            return -1, -1
+        size = bin_path.stat().st_size // 4
+        if size <= 1:
+            return -1, -1
+        start_index = int(np.fromfile(str(bin_path.resolve()), dtype="<f", count=1)[0])
+        return start_index, start_index + size - 2
+
+    def _dump_field(self, field: str, instruments: List[str], calendar_size: int):
+        with ThreadPoolExecutor(max_workers=self.works) as executor:
+            ranges = list(executor.map(partial(self._read_range, field=field), instruments))
+        ranges = np.array(ranges, dtype=np.int64).reshape(-1, 2)
+        n_rows = max(calendar_size, int(ranges[:, 1].max()) + 1 if len(ranges) > 0 else 0)
+        panel = np.lib.format.open_memmap(
+            str(self._panels_dir.joinpath(f"{field}.npy").resolve()),
+            mode="w+",
+            dtype="<f",
+            shape=(n_rows, len(instruments)),
+        )
+        panel[:] = np.nan
+
+        def _write_column(i: int):
+            # one bin per thread is in memory at a time
+            if ranges[i, 0] >= 0:
+                data = np.fromfile(str(self._bin_path(instruments[i], field).resolve()), dtype="<f")
+                panel[ranges[i, 0] : ranges[i, 1] + 1, i] = data[1:]
+
+        with ThreadPoolExecutor(max_workers=self.works) as executor:
+            list(executor.map(_write_column, range(len(instruments))))
+        panel.flush()
+        del panel
+        np.save(str(self._panels_dir.joinpath(f"{field}.range.npy").resolve()), ranges)
+
+    def dump(self):
+        calendar_path = self._calendars_dir.joinpath(f"{self.freq}.txt")
+        calendar_size = len(DumpDataBase._read_calendars(calendar_path)) if calendar_path.exists() else 0
+        instruments = sorted(p.name for p in self._features_dir.iterdir() if p.is_dir())
+        fields = self._get_fields(instruments)
+        self._panels_dir.mkdir(parents=True, exist_ok=True)
+        np.savetxt(
+            str(self._panels_dir.joinpath(self.INSTRUMENTS_FILE_NAME).resolve()),
+            instruments,
+            fmt="%s",
+            encoding="utf-8",
+        )
+        logger.info(f"start dump panels: {len(instruments)} instruments, {len(fields)} fields......")
+        for field in tqdm(fields):
+            self._dump_field(field, instruments, calendar_size)
+        logger.info("end of panels dump.\n")
+
+    def __call__(self, *args, **kwargs):
+        self.dump()
+
+
 if __name__ == "__main__":
-    fire.Fire({"dump_all": DumpDataAll, "dump_fix": DumpDataFix, "dump_update": DumpDataUpdate})
+    fire.Fire(
+        {"dump_all": DumpDataAll, "dump_fix": DumpDataFix, "dump_update": DumpDataUpdate, "dump_panel": DumpPanel}
+    )
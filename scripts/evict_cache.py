@@ -0,0 +1,54 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import time
+
+import fire
+import qlib
+from loguru import logger
+from qlib.data.cache import DiskCacheEvictor
+
+
+class EvictCache:
+    """Keep the disk caches of a data uri within a budget, please refer to `qlib.data.cache.DiskCacheEvictor`
+
+    Examples
+    --------
+        # list the entries in the order of eviction
+        $ python evict_cache.py list --qlib_dir ~/.qlib/qlib_data/cn_data
+        # evict the entries beyond 100GB every hour
+        $ python evict_cache.py evict --qlib_dir ~/.qlib/qlib_data/cn_data --size_limit 107374182400 --interval 3600
+    """
+
+    def __init__(self, qlib_dir: str, size_limit: int = None, cache_lock: str = None):
+        """
+        Parameters
+        ----------
+        qlib_dir: str
+            the provider uri of the caches
+        size_limit: int
+            the budget in bytes, `C.disk_cache_size_limit` by default
+        cache_lock: str
+            the lock of the caches, e.g. "FileCacheLock", the same as the processes using the caches
+        """
+        kwargs = {} if cache_lock is None else {"cache_lock": cache_lock}
+        qlib.init(provider_uri=qlib_dir, expression_cache=None, dataset_cache=None, **kwargs)
+        self.evictor = DiskCacheEvictor(size_limit)
+
+    def list(self, n: int = 20):
+        """show the first `n` entries in the order of eviction"""
+        entries = self.evictor.entries()
+        logger.info(f"{len(entries)} entries, {entries['nbytes'].sum()} bytes, size limit: {self.evictor.size_limit}")
+        print(entries.head(n).to_string(index=False))
+
+    def evict(self, interval: float = None):
+        """evict the entries beyond the budget once, or every `interval` seconds"""
+        while True:
+            logger.info(f"{self.evictor.evict()} bytes evicted")
+            if interval is None:
+                break
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    fire.Fire(EvictCache)
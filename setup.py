@@ -174,6 +174,8 @@ setup(
             # this version, causes qlib installation to fail, so we've limited the scs version a bit for now.
             "scs<=3.2.4",
             "beautifulsoup4",
+            # used by the parquet storage backend
+            "pyarrow",
             # In version 0.4.11 of tianshou, the code:
             # logits, hidden = self.actor(batch.obs, state=state, info=batch.info)
             # was changed in PR787,
@@ -146,6 +146,58 @@ class TestTSDataSampler(unittest.TestCase):
         self.assertEqual(dataset[0][1], dataset[1][0])
         self.assertEqual(dataset[0][2], dataset[1][1])
 
+    def test_TSDataSampler_batch(self):
+        """
+        The batch of samples is the same as the samples fetched one by one
+        """
+        datetime_list = pd.date_range("2000-01-01", periods=20)
+        instruments = ["000001", "000002", "000003", "000004", "000005"]
+        index = pd.MultiIndex.from_product([datetime_list, instruments], names=["datetime", "instrument"])
+        data = np.random.randn(len(index), 2)
+        test_df = pd.DataFrame(data=data, index=index, columns=["factor", "label"])
+        # some samples are missing
+        test_df = test_df[np.random.rand(len(test_df)) > 0.3]
+        for fillna_type in ["none", "ffill", "ffill+bfill"]:
+            dataset = TSDataSampler(test_df.copy(), datetime_list[5], datetime_list[-1], 4, fillna_type=fillna_type)
+            batch = np.random.randint(0, len(dataset), size=50)
+            expected = np.stack([dataset[i] for i in batch])
+            np.testing.assert_array_equal(dataset[batch], expected)
+            np.testing.assert_array_equal(dataset[list(batch)], expected)
+            idx_matrix = dataset.build_idx_matrix()
+            self.assertEqual(idx_matrix.shape, (len(dataset), 4))
+            np.testing.assert_array_equal(dataset[batch], expected)
+            with self.assertRaises(KeyError):
+                dataset[np.array([0, len(dataset)])]
+
+    def test_TSDataSampler_sparse_index(self):
+        """
+        The sparse index gives the same samples as the dense one
+        """
+        datetime_list = pd.date_range("2000-01-01", periods=30)
+        instruments = [f"{i:06d}" for i in range(10)]
+        index = pd.MultiIndex.from_product([datetime_list, instruments], names=["datetime", "instrument"])
+        test_df = pd.DataFrame(data=np.random.randn(len(index), 2), index=index, columns=["factor", "label"])
+        # the instruments are listed and delisted, and some samples are missing
+        date_idx, inst_idx = index.codes
+        test_df = test_df[
+            (date_idx >= inst_idx * 2) & (date_idx < inst_idx * 2 + 12) & (np.random.rand(len(index)) > 0.2)
+        ]
+        for fillna_type in ["none", "ffill", "ffill+bfill"]:
+            kwargs = dict(start=datetime_list[5], end=datetime_list[-1], step_len=6, fillna_type=fillna_type)
+            dense = TSDataSampler(test_df.copy(), **kwargs)
+            sparse = TSDataSampler(test_df.copy(), sparse_index=True, **kwargs)
+            self.assertIsNone(sparse.idx_df)
+            self.assertEqual(len(dense), len(sparse))
+            for i in range(len(dense)):
+                np.testing.assert_array_equal(dense[i], sparse[i])
+            batch = np.random.randint(0, len(dense), size=50)
+            np.testing.assert_array_equal(dense[batch], sparse[batch])
+            np.testing.assert_array_equal(dense["2000-01-20", "000003"], sparse["2000-01-20", "000003"])
+            # the instrument sorted after all the known ones
+            for sampler in [dense, sparse]:
+                with self.assertRaises(IndexError):
+                    sampler["2000-01-20", "999999"]
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=10)
@@ -1,10 +1,17 @@
 import os
 import pickle
 import shutil
+import tempfile
 import unittest
+from pathlib import Path
+import numpy as np
+import pandas as pd
 from qlib.tests import TestAutoData
 from qlib.data import D
 from qlib.data.dataset.handler import DataHandlerLP
+from qlib.data.dataset.loader import StaticDataLoader
+from qlib.data.dataset.processor import CSRankNorm, DropnaLabel, Fillna, RobustZScoreNorm
+from qlib.utils import init_instance_by_config
 
 
 class HandlerTests(TestAutoData):
@@ -33,5 +40,92 @@ class HandlerTests(TestAutoData):
         os.remove(fname)
 
 
+class HandlerProcessTests(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        index = pd.MultiIndex.from_product(
+            [pd.date_range("2021-01-01", periods=20), [f"SH{i:06d}" for i in range(30)]],
+            names=["datetime", "instrument"],
+        )
+        columns = pd.MultiIndex.from_tuples([("feature", f"F{i}") for i in range(5)] + [("label", "LABEL0")])
+        values = rng.standard_normal((len(index), len(columns))).astype(np.float32)
+        values[rng.random(values.shape) < 0.1] = np.nan
+        self.df = pd.DataFrame(values, index=index, columns=columns)
+
+    def get_processors(self):
+        infer = [
+            RobustZScoreNorm("2021-01-01", "2021-01-10", fields_group="feature"),
+            Fillna(fields_group="feature"),
+        ]
+        return infer, [DropnaLabel(), CSRankNorm(fields_group="label")]
+
+    def test_copy_on_write(self):
+        for process_type in [DataHandlerLP.PTYPE_A, DataHandlerLP.PTYPE_I]:
+            for drop_raw in [False, True]:
+                df = self.df.copy()
+                infer, learn = self.get_processors()
+                dh = DataHandlerLP(
+                    data_loader=StaticDataLoader(df),
+                    infer_processors=infer,
+                    learn_processors=learn,
+                    process_type=process_type,
+                    drop_raw=drop_raw,
+                )
+                # the raw data is not changed
+                pd.testing.assert_frame_equal(df, self.df)
+                if not drop_raw:
+                    self.assertIs(dh._data, df)
+
+                # the same as processing the copies of the data
+                expected = self.df.copy()
+                infer, learn = self.get_processors()
+                for proc in infer:
+                    proc.fit(expected)
+                    expected = proc(expected)
+                pd.testing.assert_frame_equal(dh._infer, expected)
+                if process_type == DataHandlerLP.PTYPE_I:
+                    expected = self.df.copy()
+                for proc in learn:
+                    expected = proc(expected)
+                pd.testing.assert_frame_equal(dh._learn, expected)
+
+    def test_snapshot(self):
+        infer, learn = self.get_processors()
+        dh = DataHandlerLP(data_loader=StaticDataLoader(self.df), infer_processors=infer, learn_processors=learn)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, "handler.pkl")
+            dh.to_snapshot(path)
+            self.assertFalse(dh.dump_all)
+            for loaded in [DataHandlerLP.load(path), init_instance_by_config(f"file://{path}")]:
+                for attr in DataHandlerLP.ATTR_MAP.values():
+                    pd.testing.assert_frame_equal(getattr(loaded, attr), getattr(dh, attr))
+                # the data are memory mapped
+                values = loaded._infer.values
+                while not isinstance(values, np.memmap):
+                    values = values.base
+                self.assertEqual(Path(values.filename).parent.parent, path.with_suffix(".data"))
+                pd.testing.assert_frame_equal(
+                    loaded.fetch(slice("2021-01-05", "2021-01-10")), dh.fetch(slice("2021-01-05", "2021-01-10"))
+                )
+
+            # the shared data are dumped once and stay shared
+            dh = DataHandlerLP.from_df(self.df)
+            dh.to_snapshot(path, exclude=["_data"])
+            loaded = DataHandlerLP.load(path)
+            self.assertIs(loaded._infer, loaded._learn)
+            self.assertFalse(hasattr(loaded, "_data"))
+            self.assertEqual(os.listdir(path.with_suffix(".data")), ["_infer"])
+            pd.testing.assert_frame_equal(loaded._infer, self.df)
+
+    def test_get_shared_columns(self):
+        df = self.df
+        label = df.columns[-1:]
+        pd.testing.assert_index_equal(DataHandlerLP._get_shared_columns(df, df, df.columns), df.columns)
+        pd.testing.assert_index_equal(DataHandlerLP._get_shared_columns(df, df, label), label)
+        self.assertEqual(len(DataHandlerLP._get_shared_columns(df.copy(), df, df.columns)), 0)
+        self.assertEqual(len(DataHandlerLP._get_shared_columns(DropnaLabel()(df), df, label)), 0)
+        self.assertIsNone(DataHandlerLP._get_shared_columns(df, df, None))
+
+
 if __name__ == "__main__":
     unittest.main()
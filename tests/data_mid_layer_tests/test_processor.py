@@ -3,9 +3,11 @@
 
 import unittest
 import numpy as np
+import pandas as pd
 from qlib.data import D
 from qlib.tests import TestAutoData
-from qlib.data.dataset.processor import MinMaxNorm, ZScoreNorm, CSZScoreNorm, CSZFillna
+from qlib.data.dataset.processor import MinMaxNorm, ZScoreNorm, CSZScoreNorm, CSRankNorm, CSZFillna
+from qlib.utils.data import robust_zscore, zscore
 
 
 class TestProcessor(TestAutoData):
@@ -71,5 +73,50 @@ class TestProcessor(TestAutoData):
         assert (df[2:4] == ((origin_df[2:4] - origin_df[2:4].mean()).div(origin_df[2:4].std()))).all().all()
 
 
+class TestCSProcessor(unittest.TestCase):
+    """the segment kernels of the cross sectional processors give the same results as `groupby`"""
+
+    def make_df(self, dtype, sort_by_datetime):
+        rng = np.random.default_rng(0)
+        # the datetimes of different numbers of instruments
+        index = pd.MultiIndex.from_tuples(
+            [
+                (d, f"SH{i:06d}")
+                for d, n in zip(pd.date_range("2021-01-01", periods=6), [1, 2, 5, 30, 300, 3])
+                for i in range(n)
+            ],
+            names=["datetime", "instrument"],
+        )
+        values = (rng.standard_normal((len(index), 5)) * 10).astype(dtype)
+        values[rng.random(values.shape) < 0.1] = np.nan
+        values[:, 0] = np.round(values[:, 0])  # ties
+        values[index.get_level_values("datetime") == "2021-01-05", 1] = np.nan
+        columns = pd.MultiIndex.from_tuples([("feature", f"f{i}") for i in range(4)] + [("label", "LABEL0")])
+        df = pd.DataFrame(values, index=index, columns=columns)
+        return df if sort_by_datetime else df.swaplevel().sort_index()
+
+    def groupby_apply(self, df, group, func):
+        df = df.copy()
+        cols = df.columns if group is None else df.columns[df.columns.get_loc(group)]
+        df[cols] = func(df[cols].groupby("datetime", group_keys=False))
+        return df
+
+    def test_cs_processors(self):
+        for dtype in [np.float32, np.float64]:
+            for sort_by_datetime in [True, False]:
+                origin_df = self.make_df(dtype, sort_by_datetime)
+                for group in [None, "feature"]:
+                    for proc, func in [
+                        (CSZScoreNorm(group), lambda g: g.apply(zscore)),
+                        (CSZScoreNorm(group, method="robust"), lambda g: g.apply(robust_zscore)),
+                        (CSRankNorm(group), lambda g: (g.rank(pct=True) - 0.5) * 3.46),
+                        (CSZFillna(group), lambda g: g.apply(lambda x: x.fillna(x.mean()))),
+                    ]:
+                        df = origin_df.copy()
+                        # the processors modify the DataFrame in place
+                        proc(df)
+                        pd.testing.assert_frame_equal(df, self.groupby_apply(origin_df, group, func), check_exact=True)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,120 @@
+import contextlib
+import pickle
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import qlib
+from qlib.config import C
+from qlib.data.cache import CacheLock, DiskCacheEvictor, DiskExpressionCache, FileCacheLock
+
+
+class TestDiskCacheEvictor(unittest.TestCase):
+    def add_entry(self, cache_path, nbytes, idle, compute_time=None, suffixes=(".meta",)):
+        meta = {"info": {}, "meta": {"last_visit": str(time.time() - idle), "visits": 1}}
+        if compute_time is not None:
+            meta["meta"]["compute_time"] = compute_time
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_bytes(b"\0" * nbytes)
+        for suffix in suffixes:
+            with cache_path.with_suffix(suffix).open("wb") as f:
+                pickle.dump(meta, f)
+        return cache_path
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as data_uri:
+            data_uri = Path(data_uri)
+            features_dir = data_uri.joinpath(C.features_cache_dir_name)
+            dataset_dir = data_uri.joinpath(C.dataset_cache_dir_name)
+            old = self.add_entry(features_dir.joinpath("sh600000", "old"), 1000, idle=100, compute_time=0)
+            # generated before the compute time is recorded
+            older = self.add_entry(features_dir.joinpath("sh600001", "older"), 1000, idle=200)
+            # idle longer, but expensive to recompute
+            costly = self.add_entry(dataset_dir.joinpath("costly"), 1000, 1000, 100, suffixes=(".meta", ".index"))
+            recent = self.add_entry(dataset_dir.joinpath("recent"), 1000, 1, 0, suffixes=(".meta", ".index"))
+
+            lock = {"class": "FileCacheLock", "kwargs": {"lock_dir": str(data_uri.joinpath("locks"))}}
+            qlib.init(provider_uri=str(data_uri), expression_cache=None, dataset_cache=None, cache_lock=lock)
+            evictor = DiskCacheEvictor()
+            self.assertIsInstance(evictor.lock, FileCacheLock)
+            entries = evictor.entries()
+            self.assertEqual(list(entries["path"]), [older, old, costly, recent])
+            self.assertEqual(list(entries["cache"]), ["expression", "expression", "dataset", "dataset"])
+            self.assertEqual(evictor.evict(), 0)
+
+            size = entries["nbytes"].sum()
+            evictor.size_limit = size - entries["nbytes"].iloc[0] - 1
+            self.assertEqual(evictor.evict(), entries["nbytes"].iloc[:2].sum())
+            self.assertFalse(older.exists() or older.with_suffix(".meta").exists())
+            self.assertFalse(old.exists())
+            self.assertEqual(list(evictor.entries()["path"]), [costly, recent])
+            evictor.size_limit = 0
+            evictor.evict()
+            self.assertEqual(list(data_uri.joinpath(C.dataset_cache_dir_name).iterdir()), [])
+
+    def test_reader_lock(self):
+        class RecordLock(CacheLock):
+            def __init__(self):
+                self.names = []
+
+            def reader_lock(self, lock_name):
+                self.names.append(("reader", lock_name))
+                return contextlib.nullcontext()
+
+            def writer_lock(self, lock_name):
+                self.names.append(("writer", lock_name))
+                return contextlib.nullcontext()
+
+        with tempfile.TemporaryDirectory() as data_uri:
+            data_uri = Path(data_uri)
+            entry = self.add_entry(data_uri.joinpath(C.features_cache_dir_name, "sh600000", "entry"), 1000, idle=100)
+            lock = RecordLock()
+            qlib.init(provider_uri=str(data_uri), expression_cache=None, dataset_cache=None, cache_lock=lock)
+            cache = DiskExpressionCache(None)
+            # the entries are never removed while they are read
+            self.assertIsInstance(cache._reader_lock(entry.name, "day"), contextlib.nullcontext)
+            self.assertEqual(lock.names, [])
+
+            qlib.init(
+                provider_uri=str(data_uri),
+                expression_cache=None,
+                dataset_cache=None,
+                cache_lock=lock,
+                disk_cache_size_limit=0,
+            )
+            cache = DiskExpressionCache(None)
+            with cache._reader_lock(entry.name, "day"):
+                pass
+            DiskCacheEvictor().evict()
+            # the evictor waits for the readers of the entry
+            self.assertEqual([name for _, name in lock.names[:1]], [name for _, name in lock.names[1:]])
+            self.assertEqual([kind for kind, _ in lock.names], ["reader", "writer"])
+
+    def test_concurrent_read(self):
+        with tempfile.TemporaryDirectory() as data_uri:
+            data_uri = Path(data_uri)
+            entry = self.add_entry(data_uri.joinpath(C.features_cache_dir_name, "sh600000", "entry"), 1000, idle=100)
+            lock = {"class": "FileCacheLock", "kwargs": {"lock_dir": str(data_uri.joinpath("locks"))}}
+            qlib.init(
+                provider_uri=str(data_uri),
+                expression_cache=None,
+                dataset_cache=None,
+                cache_lock=lock,
+                disk_cache_size_limit=0,
+            )
+            cache = DiskExpressionCache(None)
+            # the evictor thread of the process waits for the reader of the entry
+            with cache._reader_lock(entry.name, "day"):
+                thread = threading.Thread(target=DiskCacheEvictor().evict)
+                thread.start()
+                thread.join(0.5)
+                self.assertTrue(thread.is_alive())
+                self.assertTrue(entry.exists() and entry.with_suffix(".meta").exists())
+            thread.join()
+            self.assertFalse(entry.exists() or entry.with_suffix(".meta").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
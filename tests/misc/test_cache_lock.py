@@ -0,0 +1,69 @@
+import multiprocessing
+import tempfile
+import threading
+import unittest
+
+from qlib.config import C
+from qlib.data.cache import FileCacheLock, QlibCacheException, RedisCacheLock, get_cache_lock
+
+
+def _try_lock(lock_dir, mode, lock_name="dataset-test"):
+    lock = FileCacheLock(lock_dir, timeout=0.2)
+    try:
+        with getattr(lock, f"{mode}_lock")(lock_name):
+            return True
+    except QlibCacheException:
+        return False
+
+
+class TestFileCacheLock(unittest.TestCase):
+    def test_reader_writer(self):
+        with tempfile.TemporaryDirectory() as lock_dir, multiprocessing.get_context("fork").Pool(1) as pool:
+            lock = FileCacheLock(lock_dir)
+            with lock.reader_lock("dataset-test"):
+                # the readers share the lock and exclude the writers
+                self.assertTrue(pool.apply(_try_lock, (lock_dir, "reader")))
+                self.assertFalse(pool.apply(_try_lock, (lock_dir, "writer")))
+            with lock.writer_lock("dataset-test"):
+                self.assertFalse(pool.apply(_try_lock, (lock_dir, "reader")))
+                self.assertFalse(pool.apply(_try_lock, (lock_dir, "writer")))
+                # the other caches are not locked
+                self.assertTrue(pool.apply(_try_lock, (lock_dir, "writer", "dataset-other")))
+            self.assertTrue(pool.apply(_try_lock, (lock_dir, "writer")))
+
+    def test_same_process(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            # the caches and the evictor of a process have their own instances of the lock
+            lock = FileCacheLock(lock_dir)
+            with lock.reader_lock("dataset-test"):
+                self.assertFalse(_try_lock(lock_dir, "writer"))
+                result = []
+                thread = threading.Thread(target=lambda: result.append(_try_lock(lock_dir, "writer")))
+                thread.start()
+                thread.join()
+                self.assertEqual(result, [False])
+                self.assertTrue(_try_lock(lock_dir, "writer", "dataset-other"))
+            self.assertTrue(_try_lock(lock_dir, "writer"))
+            with multiprocessing.get_context("fork").Pool(1) as pool, lock.reader_lock("dataset-test"):
+                # closing the file of the failed writer does not release the lock of the reader
+                self.assertFalse(_try_lock(lock_dir, "writer"))
+                self.assertFalse(pool.apply(_try_lock, (lock_dir, "writer")))
+
+    def test_config(self):
+        cache_lock = C.get("cache_lock")
+        try:
+            C["cache_lock"] = {"class": "FileCacheLock", "kwargs": {"lock_dir": "/tmp/locks", "timeout": 1}}
+            lock = get_cache_lock()
+            self.assertIsInstance(lock, FileCacheLock)
+            self.assertEqual(lock.timeout, 1)
+            self.assertFalse(C.is_depend_redis("DiskDatasetCache"))
+            C["cache_lock"] = "RedisCacheLock"
+            self.assertTrue(C.is_depend_redis("DiskDatasetCache"))
+            self.assertFalse(C.is_depend_redis("SimpleDatasetCache"))
+            self.assertIsInstance(get_cache_lock(), RedisCacheLock)
+        finally:
+            C["cache_lock"] = cache_lock
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from qlib.data import D
+from qlib.data.cache import DiskDatasetCache
+from qlib.tests import TestMockData
+from qlib.utils import remove_fields_space
+
+
+class TestNpyDatasetCache(TestMockData):
+    def setUp(self):
+        self.fields = ["Mean($close, 5)/$close", "$close", "$volume"]
+        self.features = D.features(["0050", "1101"], self.fields, "2021-12-01", "2022-02-25")
+        # the cache fields are sorted and without spaces
+        cache_features = self.features.set_axis(remove_fields_space(self.fields), axis=1)
+        self.cache_features = cache_features.sort_index(axis=1).swaplevel("instrument", "datetime").sort_index()
+
+    def write(self, cache_path, data, n_keep=0):
+        DiskDatasetCache.write_npy_cache(cache_path, data, n_keep=n_keep)
+        # the data and the index are replaced by the temporary files
+        self.assertEqual(sorted(p.name for p in cache_path.parent.iterdir()), ["dataset", "dataset.index"])
+
+    def assert_slices(self, cache_path):
+        self.assertTrue(DiskDatasetCache.is_npy_cache(cache_path))
+        for start_time, end_time in [
+            (None, None),
+            ("2022-01-03", "2022-01-26"),
+            ("2022-01-15", "2022-01-15"),
+            ("2022-01", "2022-01"),
+            ("2023-01-01", None),
+        ]:
+            data = DiskDatasetCache.read_data_from_cache(cache_path, start_time, end_time, self.fields[::-1])
+            expected = self.features.loc(axis=0)[:, start_time:end_time][self.fields[::-1]]
+            pd.testing.assert_frame_equal(data, expected, check_exact=True, check_index_type=len(expected) > 0)
+
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_path = Path(cache_dir).joinpath("dataset")
+            self.write(cache_path, self.cache_features)
+            self.assert_slices(cache_path)
+            self.assertEqual(np.load(cache_path, mmap_mode="r").shape, (len(self.fields), len(self.features)))
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_path = Path(cache_dir).joinpath("dataset")
+            stale = self.cache_features.loc["2021-12-20":"2021-12-31"].copy()
+            stale.loc[:] = -1
+            self.write(cache_path, pd.concat([self.cache_features.loc[:"2021-12-19"], stale]))
+            n_keep = len(self.cache_features.loc[:"2021-12-19"])
+            # the stale rows are replaced, and "0050" is added to the instruments
+            self.write(cache_path, self.cache_features.loc["2021-12-20":], n_keep=n_keep)
+            self.assert_slices(cache_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import pandas as pd
+
+from qlib.data import D
+from qlib.tests import TestMockData
+
+
+class TestFeaturesIter(TestMockData):
+    fields = ["$close", "Mean($close, 5)/$close", "Ref($close, -1)", "Std($volume, 3)"]
+
+    def test_chunk_by_time(self):
+        expected = D.features(["0050", "1101"], self.fields, "2022-01-01", "2022-03-01")
+        chunks = list(D.features_iter(["0050", "1101"], self.fields, "2022-01-01", "2022-03-01", chunk_size=7))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk.index.get_level_values("datetime").unique()), 7)
+        # the rolling windows and the references to the future cross the chunks
+        pd.testing.assert_frame_equal(pd.concat(chunks).sort_index(), expected.sort_index())
+
+    def test_chunk_by_instrument(self):
+        instruments = D.instruments("all")
+        expected = D.features(instruments, self.fields, "2022-01-01", "2022-03-01")
+        chunks = list(
+            D.features_iter(instruments, self.fields, "2022-01-01", "2022-03-01", chunk_by="instrument", chunk_size=1)
+        )
+        self.assertEqual(
+            [chunk.index.get_level_values("instrument").unique().tolist() for chunk in chunks], [["0050"], ["1101"]]
+        )
+        pd.testing.assert_frame_equal(pd.concat(chunks), expected, check_exact=True)
+
+        with self.assertRaises(ValueError):
+            next(D.features_iter(instruments, self.fields, chunk_by="field"))
+
+
+if __name__ == "__main__":
+    unittest.main()
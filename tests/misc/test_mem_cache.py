@@ -0,0 +1,83 @@
+import multiprocessing
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.config import C
+from qlib.data.cache import H, MemCacheLengthUnit, MemCacheSizeofUnit, SharedMemCache, get_nbytes
+
+
+def _shared_sum(key):
+    start_index, values = SharedMemCache.get(key)
+    return start_index, values.sum(), values.flags.writeable
+
+
+class TestMemCache(unittest.TestCase):
+    def test_nbytes(self):
+        values = np.zeros(1000, dtype=np.float32)
+        self.assertEqual(get_nbytes(values), 4000)
+        self.assertGreaterEqual(get_nbytes(pd.Series(values)), 4000)
+        self.assertGreater(get_nbytes((10, values)), 4000)
+
+        unit = MemCacheSizeofUnit(size_limit=10000)
+        for i in range(3):
+            unit[i] = values
+        # the oldest one is evicted to keep the arrays in 10000 bytes
+        self.assertEqual(list(unit.od.keys()), [1, 2])
+        self.assertEqual(unit.total_size, 8000)
+        self.assertEqual(unit.evictions, 1)
+
+    def test_counters(self):
+        unit = MemCacheLengthUnit(size_limit=2)
+        unit["a"] = 1
+        self.assertTrue("a" in unit)
+        self.assertFalse("b" in unit)
+        unit["b"] = 2
+        unit["c"] = 3
+        self.assertEqual(
+            unit.stats,
+            {"hits": 1, "misses": 1, "evictions": 1, "length": 2, "total_size": 2, "size_limit": 2},
+        )
+
+    @unittest.skipUnless(SharedMemCache.SHM_DIR.is_dir(), "POSIX shared memory is required")
+    def test_shared_mem_cache(self):
+        shared_mem_cache = C.get("shared_mem_cache")
+        C["shared_mem_cache"] = True
+        try:
+            SharedMemCache.start_session()
+            key = ("test", "sh600000", "close", "day")
+            self.assertIsNone(SharedMemCache.get(key))
+            SharedMemCache.set(key, 10, np.arange(100, dtype=np.float32))
+            with multiprocessing.get_context("fork").Pool(1) as pool:
+                self.assertEqual(pool.apply(_shared_sum, (key,)), (10, 4950, False))
+            SharedMemCache.clear()
+            self.assertFalse(SharedMemCache.enabled())
+            self.assertEqual(list(SharedMemCache.SHM_DIR.glob("qlib*")), [])
+        finally:
+            SharedMemCache.clear()
+            C["shared_mem_cache"] = shared_mem_cache
+
+    @unittest.skipUnless(SharedMemCache.SHM_DIR.is_dir(), "POSIX shared memory is required")
+    def test_shared_mem_cache_budget(self):
+        shared_mem_cache, nbytes_limit = C.get("shared_mem_cache"), C.get("shared_mem_cache_nbytes_limit")
+        C["shared_mem_cache"], C["shared_mem_cache_nbytes_limit"] = True, 1000
+        try:
+            SharedMemCache.start_session()
+            SharedMemCache.set(("test", "a"), 0, np.arange(200, dtype=np.float32))
+            SharedMemCache.set(("test", "b"), 0, np.arange(200, dtype=np.float32))
+            # the second one is beyond the budget
+            self.assertEqual(SharedMemCache.get(("test", "a"))[1].sum(), 19900)
+            self.assertIsNone(SharedMemCache.get(("test", "b")))
+            # the mapped segments are closed and removed with the memory caches
+            H.clear()
+            self.assertEqual(SharedMemCache._segments, {})
+            self.assertFalse(SharedMemCache.enabled())
+            self.assertEqual(list(SharedMemCache.SHM_DIR.glob("qlib*")), [])
+        finally:
+            SharedMemCache.clear()
+            C["shared_mem_cache"], C["shared_mem_cache_nbytes_limit"] = shared_mem_cache, nbytes_limit
+
+
+if __name__ == "__main__":
+    unittest.main()
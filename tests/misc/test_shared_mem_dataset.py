@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.config import C
+from qlib.data import D
+from qlib.data.cache import SharedMemCache
+from qlib.tests import TestMockData
+
+
+@unittest.skipUnless(SharedMemCache.SHM_DIR.is_dir(), "POSIX shared memory is required")
+class TestSharedMemDataset(TestMockData):
+    def features(self, instruments, fields, shared_mem_dataset, start_time="2022-01-01", end_time="2022-03-01"):
+        C["shared_mem_dataset"] = shared_mem_dataset
+        try:
+            return D.features(instruments, fields, start_time, end_time)
+        finally:
+            C["shared_mem_dataset"] = False
+
+    def test_same_as_concat(self):
+        fields = ["Mean($close, 5)/$close", "$close", "$volume", "$close"]
+        spans = {
+            "0050": [(pd.Timestamp("2022-01-10"), pd.Timestamp("2022-01-20"))],
+            "1101": [
+                (pd.Timestamp("2021-12-01"), pd.Timestamp("2022-01-05")),
+                (pd.Timestamp("2022-02-01"), pd.Timestamp("2022-02-10")),
+            ],
+        }
+        # the rows of "0050" end before the calendar, so the rows of "1101" are moved
+        for instruments in [["1101", "0050", "0050"], spans]:
+            expected = self.features(instruments, fields, False)
+            data = self.features(instruments, fields, True)
+            pd.testing.assert_frame_equal(data, expected, check_exact=True)
+            self.assertEqual(list(data.columns), fields)
+            self.assertEqual(data.values.dtype, np.float32)
+
+        empty = self.features({"0050": [(pd.Timestamp("2021-01-01"), pd.Timestamp("2021-02-01"))]}, fields, True)
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(list(empty.columns), fields)
+        self.assertEqual(list(SharedMemCache.SHM_DIR.glob("qlib*.dataset")), [])
+
+    def test_empty_instrument(self):
+        # the data of "0050" end before February, its frame is empty like the frame of an unknown instrument
+        fields = ["$close", "Ref($close, 1)"]
+        expected = self.features(["0050", "1101"], fields, False, "2022-02-01")
+        data = self.features(["0050", "1101"], fields, True, "2022-02-01")
+        pd.testing.assert_frame_equal(data, expected, check_exact=True)
+        self.assertEqual(list(data.index.get_level_values("instrument").unique()), ["1101"])
+
+
+if __name__ == "__main__":
+    unittest.main()
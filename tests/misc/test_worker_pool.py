@@ -0,0 +1,79 @@
+import os
+import unittest
+
+import pandas as pd
+from joblib import delayed
+
+from qlib.config import C
+from qlib.data import D
+from qlib.data.cache import H
+from qlib.tests import TestMockData
+from qlib.utils.paral import WorkerPool
+
+
+def _state(key):
+    H["c"]["test_worker_pool"] = (H["c"]["test_worker_pool"] if "test_worker_pool" in H["c"] else 0) + 1
+    return os.getpid(), C.get(key), H["c"]["test_worker_pool"]
+
+
+def _fail():
+    raise ValueError("failed")
+
+
+class TestWorkerPool(TestMockData):
+    def tearDown(self):
+        WorkerPool.stop()
+
+    def test_pool(self):
+        pool = WorkerPool.start(n_workers=2)
+        self.assertIs(WorkerPool.get(), pool)
+        results = pool(delayed(_state)("kernels") for _ in range(10))
+        results += pool(delayed(_state)("kernels") for _ in range(10))
+        # the workers and their caches are kept between the calls
+        counts = {}
+        for pid, _, count in results:
+            counts[pid] = max(counts.get(pid, 0), count)
+        self.assertLessEqual(len(counts), 2)
+        self.assertEqual(sum(counts.values()), 20)
+
+        # the config of the main process is applied
+        expire = C["mem_cache_expire"]
+        C["mem_cache_expire"] = 1
+        try:
+            self.assertEqual({value for _, value, _ in pool([delayed(_state)("mem_cache_expire")] * 4)}, {1})
+        finally:
+            C["mem_cache_expire"] = expire
+
+        pool.clear_mem_cache()
+        self.assertEqual({count for _, _, count in pool([delayed(_state)("kernels")])}, {1})
+
+        with self.assertRaises(ValueError):
+            pool([delayed(_state)("kernels"), delayed(_fail)()])
+        self.assertEqual(len(pool([delayed(_state)("kernels")] * 3)), 3)
+
+        WorkerPool.stop()
+        self.assertIsNone(WorkerPool.get())
+        with self.assertRaises(RuntimeError):
+            pool([delayed(_state)("kernels")])
+
+    def test_recycle(self):
+        pool = WorkerPool.start(n_workers=2, memory_limit=1)
+        pids = [pid for pid, _, _ in pool(delayed(_state)("kernels") for _ in range(6))]
+        # every worker is replaced after its task
+        self.assertEqual(len(set(pids)), 6)
+        # the exits of the last workers are handled by the next call
+        pids += [pid for pid, _, _ in pool(delayed(_state)("kernels") for _ in range(2))]
+        self.assertEqual(len(set(pids)), 8)
+        self.assertGreaterEqual(pool.n_recycled, 6)
+
+    def test_features(self):
+        fields = ["Mean($close, 5)/$close", "$volume"]
+        expected = D.features(["0050", "1101"], fields, "2022-01-01", "2022-03-01")
+        WorkerPool.start(n_workers=2)
+        for _ in range(2):
+            data = D.features(["0050", "1101"], fields, "2022-01-01", "2022-03-01")
+            pd.testing.assert_frame_equal(data, expected, check_exact=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.data.base import Feature
+from qlib.data.compiler import CompiledExpressions, FusedKernel
+from qlib.data.ops import Abs, ElemOperator, If, Log
+from qlib.data.data import DatasetD, ExpressionD
+from qlib.tests import TestMockData
+from qlib.config import C
+
+
+class Diff(ElemOperator):
+    """an operator which only implements the calculation with pd.Series"""
+
+    def _load_internal(self, instrument, start_index, end_index, *args):
+        return self.feature.load(instrument, start_index, end_index, *args).diff()
+
+
+class TestCompiledExpressions(TestMockData):
+    def setUp(self) -> None:
+        self.instrument = "0050"
+        self.start_time = "2022-01-01"
+        self.end_time = "2022-02-01"
+        self.freq = "day"
+        self.fields = [
+            "$close",
+            "Ref($close, 1)/$close",
+            "Mean($close, 5)/$close",
+            "Std($close, 5)/$close",
+            "($close-Mean($close, 5))/Std($close, 5)",
+            "Corr($close, Log($volume+1), 5)",
+            "Abs($close-Ref($close, 1))",
+            "If($close>Ref($close, 1), $close, Ref($close, 1))",
+            "Mean($close>Ref($close, 1), 5)",
+            "IdxMax($close, 5)",
+        ]
+
+    def test_nodes(self):
+        expressions = [ExpressionD.get_expression_instance(field) for field in self.fields]
+        compiled = CompiledExpressions(expressions, [(0, 10)] * len(expressions))
+        # `$close`, `Ref($close, 1)`, `Mean($close, 5)`, `Std($close, 5)` are shared
+        self.assertEqual(compiled.n_nodes + compiled.n_saved, compiled.n_expressions)
+        self.assertEqual(compiled.n_nodes, 19)
+        self.assertEqual(compiled.n_saved, 26)
+
+    def test_compiled_cache(self):
+        cache = ExpressionD._provider.compiled_cache
+        cache.clear()
+        compile_expressions = C.compile_expressions
+        try:
+            C.compile_expressions = True
+            cache.set_limit_size(2)
+            for end_time in ["2022-01-10", "2022-01-20", "2022-02-01", "2022-01-10"]:
+                ExpressionD.expressions(self.instrument, self.fields, self.start_time, end_time, self.freq)
+            # the DAGs of the least recently used index ranges are dropped
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(cache.evictions, 2)
+            ExpressionD.expressions(self.instrument, self.fields, self.start_time, "2022-01-10", self.freq)
+            self.assertEqual(cache.hits, 1)
+        finally:
+            C.compile_expressions = compile_expressions
+            cache.set_limit_size(C.compiled_expressions_limit)
+
+    def test_same_as_expression(self):
+        compile_expressions = C.compile_expressions
+        try:
+            C.compile_expressions = True
+            compiled = ExpressionD.expressions(self.instrument, self.fields, self.start_time, self.end_time, self.freq)
+            C.compile_expressions = False
+            origin = ExpressionD.expressions(self.instrument, self.fields, self.start_time, self.end_time, self.freq)
+        finally:
+            C.compile_expressions = compile_expressions
+        self.assertEqual(list(compiled.keys()), self.fields)
+        for field in self.fields:
+            golden = ExpressionD.expression(self.instrument, field, self.start_time, self.end_time, self.freq)
+            np.testing.assert_array_equal(compiled[field].index, golden.index)
+            np.testing.assert_array_equal(compiled[field].values, golden.values)
+            np.testing.assert_array_equal(origin[field].values, golden.values)
+
+    def test_change_instrument(self):
+        # `ChangeInstrument` overrides `load`, so it is loaded by `load` in the DAG, even as the leaf of a fused node
+        fields = ["ChangeInstrument('1101',$close)", "$close/ChangeInstrument('1101',$close)-1", "$close"]
+        compile_expressions, fuse_expressions = C.compile_expressions, C.fuse_expressions
+        try:
+            C.compile_expressions = C.fuse_expressions = True
+            compiled = ExpressionD.expressions(self.instrument, fields, self.start_time, self.end_time, self.freq)
+            C.compile_expressions = False
+            origin = ExpressionD.expressions(self.instrument, fields, self.start_time, self.end_time, self.freq)
+        finally:
+            C.compile_expressions, C.fuse_expressions = compile_expressions, fuse_expressions
+        other = ExpressionD.expression("1101", "$close", self.start_time, self.end_time, self.freq)
+        np.testing.assert_array_equal(origin[fields[0]].values, other.values)
+        for field in fields:
+            np.testing.assert_array_equal(compiled[field].index, origin[field].index)
+            np.testing.assert_array_equal(compiled[field].values, origin[field].values)
+
+    def test_panel(self):
+        # `IdxMax` is not supported by panels and is loaded instrument by instrument
+        panels, indexes = CompiledExpressions(
+            [ExpressionD.get_expression_instance(field) for field in self.fields], [(0, 10)] * len(self.fields)
+        ).load_panel([self.instrument], self.freq)
+        data = DatasetD.panel_calculator(
+            [self.instrument], self.start_time, self.end_time, self.freq, self.fields
+        ).droplevel("instrument")
+        golden = DatasetD.inst_calculator(self.instrument, self.start_time, self.end_time, self.freq, self.fields)
+        for field, panel, index in zip(self.fields, panels, indexes):
+            np.testing.assert_array_equal(panel.index, np.arange(11))
+            self.assertEqual(index.shape, (11, 1))
+        np.testing.assert_array_equal(data.index, golden.index)
+        np.testing.assert_array_equal(data.values, golden.values)
+
+    def test_panel_instruments(self):
+        # the instruments have different data ranges, so the panels have cells out of the index of the expressions
+        fields = self.fields + [
+            "And($close>$open,$high>$low)",
+            "Or($close>$open,$high>$low)",
+            "Not($close>$open)",
+            "Sum(Not($close>$open),3)",
+            "Mean(And($close>$open,$high>$low),5)",
+            "If(Or($close>$open,$high>$low),$close,$open)",
+        ]
+        instruments = ["0050", "1101"]
+        start_time = "2021-06-01"
+        data = DatasetD.panel_calculator(instruments, start_time, self.end_time, self.freq, fields)
+        golden = pd.concat(
+            {
+                inst: DatasetD.inst_calculator(inst, start_time, self.end_time, self.freq, fields)
+                for inst in instruments
+            },
+            names=["instrument"],
+        )
+        self.assertFalse(data.index.get_level_values("instrument").is_unique)
+        np.testing.assert_array_equal(data.index, golden.index)
+        for field in fields:
+            np.testing.assert_array_equal(data[field].values, golden[field].values.astype(data[field].dtype))
+
+    def test_fuse(self):
+        fields = self.fields + ["($close-$open)/($high-$low+1e-12)", "Abs($close-$open)/$open"]
+        expressions = [ExpressionD.get_expression_instance(field) for field in fields]
+        compiled = CompiledExpressions(expressions, [(0, 100)] * len(expressions))
+        # `$close-$open` is shared by the two fields, so it is a leaf of their kernels
+        kernel = compiled.kernels[str(expressions[-2])]
+        self.assertEqual(kernel.n_operators, 3)
+        self.assertEqual(list(map(str, kernel.leaves)), ["Sub($close,$open)", "$high", "$low"])
+        kernel = compiled.kernels[str(expressions[-1])]
+        self.assertEqual(kernel.n_operators, 2)
+        self.assertEqual(list(map(str, kernel.leaves)), ["Sub($close,$open)", "$open"])
+        self.assertGreater(compiled.n_fused, 0)
+        golden = CompiledExpressions(expressions, [(0, 100)] * len(expressions), fuse=False)
+        self.assertEqual(golden.kernels, {})
+        for series, golden_series in zip(
+            compiled.load(self.instrument, self.freq), golden.load(self.instrument, self.freq)
+        ):
+            self.assertEqual(series.name, golden_series.name)
+            np.testing.assert_array_equal(series.index, golden_series.index)
+            np.testing.assert_array_equal(series.values, golden_series.values)
+
+        # the long arrays are calculated block by block
+        close, open_ = Feature("close"), Feature("open")
+        kernel = FusedKernel(If(close > 0, Log(close), open_ * 2), lambda expression: isinstance(expression, Feature))
+        rng = np.random.default_rng(0)
+        x, y = rng.normal(1, 1, (2, 100000)).astype(np.float32)
+        x[rng.random(100000) < 0.1] = np.nan
+        with np.errstate(invalid="ignore"):
+            result = kernel(x, y)
+            np.testing.assert_array_equal(result, np.where(x > 0, np.log(x), y * 2))
+        self.assertEqual(result.dtype, np.float32)
+
+    def test_load_array(self):
+        index = Feature("close").load(self.instrument, 0, 1000, self.freq).index
+        start_index, end_index = index[2], index[15]
+        close = Feature("close").load(self.instrument, start_index, end_index, self.freq)
+        for expression, golden in [
+            (Abs(Feature("close") - 1), (close - 1).abs()),
+            (Diff(Abs(Feature("close"))), close.diff()),
+        ]:
+            self.assertEqual(expression.support_array(), isinstance(expression, Abs))
+            start, values = expression.load_array(self.instrument, start_index, end_index, self.freq)
+            self.assertEqual(start, golden.index[0])
+            np.testing.assert_array_equal(values, golden.values)
+            series = expression.load(self.instrument, start_index, end_index, self.freq)
+            self.assertEqual(series.name, str(expression))
+            np.testing.assert_array_equal(series.index, golden.index)
+            np.testing.assert_array_equal(series.values, golden.values)
+
+
+if __name__ == "__main__":
+    unittest.main()
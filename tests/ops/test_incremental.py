@@ -0,0 +1,45 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from qlib.data import D
+from qlib.data.incremental import IncrementalExpressions
+from qlib.tests import TestMockData
+
+
+class TestIncrementalExpressions(TestMockData):
+    def setUp(self) -> None:
+        self.instruments = ["0050"]
+        self.fields = [
+            "$close",
+            "Ref($close, 1)/$close",
+            "Mean($close, 5)/$close",
+            "Std($close, 5)",
+            "Sum($close>Ref($close, 1), 5)",
+            "Corr($close, Log($volume+1), 5)",
+            "Cov($close, $volume, 5)",
+            "IdxMax($close, 5)",
+            "Quantile($close, 5, 0.8)",
+            "Rsquare($close, 5)",
+            "If($close>Ref($close, 1), $close, Ref($close, 1))",
+        ]
+
+    def test_update(self):
+        evaluator = IncrementalExpressions(self.fields)
+        history = evaluator.update(self.instruments, "2022-01-20")
+        # the state is checkpointed and restored between the updates
+        evaluator = pickle.loads(pickle.dumps(evaluator))
+        new_data = evaluator.update(self.instruments, "2022-02-10")
+        self.assertEqual(history.index.get_level_values("datetime").max(), D.calendar(end_time="2022-01-20")[-1])
+        self.assertTrue((new_data.index.get_level_values("datetime") > "2022-01-20").all())
+        self.assertEqual(len(evaluator.update(self.instruments, "2022-02-10")), 0)
+
+        golden = D.features(self.instruments, self.fields, "2022-01-21", "2022-02-10")
+        self.assertGreater(len(golden), 0)
+        np.testing.assert_array_equal(new_data.index, golden.index)
+        np.testing.assert_allclose(new_data.values, golden.values.astype(float), rtol=1e-5)
+
+
+if __name__ == "__main__":
+    unittest.main()
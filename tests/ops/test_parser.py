@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+
+from qlib.config import C
+from qlib.contrib.data.loader import Alpha158DL, Alpha360DL
+from qlib.data.data import ExpressionD, LocalExpressionProvider
+from qlib.data.ops import Operators  # pylint: disable=W0611  # noqa: F401
+from qlib.data.parser import ExpressionParser, UnsupportedSyntax, load_parsed_fields
+from qlib.tests import TestMockData
+from qlib.utils import parse_field
+
+
+class TestExpressionParser(TestMockData):
+    def assert_same_as_eval(self, field, result):
+        golden = eval(parse_field(field))
+        self.assertIs(type(result), type(golden), field)
+        self.assertEqual(str(result), str(golden), field)
+
+    def test_parse(self):
+        parser = ExpressionParser()
+        fields = Alpha158DL.get_feature_config()[0] + Alpha360DL.get_feature_config()[0]
+        fields += [
+            "1-$close",
+            "2**-1*$close",
+            "-2**2+$close",
+            "($close>$open)&($high<$low)|$volume",
+            "1 > $close",
+            "Quantile($close, 5, qscore=0.8,)",
+            "Ref($close, -1)/$close - 1",
+            "ChangeInstrument('SH000300', $close)",
+            "$$roewa_q + $市值",
+            "1/2 + 1.5e-1",
+        ]
+        for field in fields:
+            self.assert_same_as_eval(field, parser.parse(field))
+
+    def test_unsupported(self):
+        parser = ExpressionParser()
+        for field in ["$close > $open > 1", "$close.shift(1)", "Mean(*[$close, 5])", "Ref($close, 01)", "$ close"]:
+            with self.assertRaises(UnsupportedSyntax):
+                parser.parse(field)
+        # fall back to `eval`
+        self.assert_same_as_eval("$close > $open > 1", ExpressionD.get_expression_instance("$close > $open > 1"))
+        with self.assertRaises(SyntaxError):
+            ExpressionD.get_expression_instance("Mean($close, 5")
+        with self.assertRaises(AttributeError):
+            ExpressionD.get_expression_instance("Unknown($close, 5)")
+
+    def test_intern(self):
+        parser = ExpressionParser()
+        a = parser.parse("Mean($close, 5)/$close")
+        b = parser.parse("Std($close, 5) + Mean($close,5)")
+        self.assertIs(a.feature_left, b.feature_right)
+        self.assertIs(a.feature_right, a.feature_left.feature)
+        self.assertIsNot(parser.parse("Ref($close, 1)"), parser.parse("Ref($close, 1.0)"))
+
+    def test_disk_cache(self):
+        fields = ["$close", "Mean($close, 5)/$close", "Std($close, 5)"]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            C["parsed_fields_cache_dir"] = cache_dir
+            try:
+                self.assertIsNone(load_parsed_fields(fields))
+                expressions = LocalExpressionProvider().get_expression_instances(fields)
+                cached = load_parsed_fields(fields)
+                self.assertEqual(list(map(str, cached.values())), list(map(str, expressions)))
+                # the shared sub-expressions are kept
+                self.assertIs(cached["Mean($close, 5)/$close"].feature_right, cached["$close"])
+                self.assertIsNone(load_parsed_fields(fields[:2]))
+            finally:
+                C["parsed_fields_cache_dir"] = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from qlib.config import C
+from qlib.data import D
+from qlib.data.profiler import Profiler, profile_expressions
+from qlib.tests import TestMockData
+
+
+class TestExpressionProfiler(TestMockData):
+    def test_report(self):
+        fields = ["$close", "Mean($close, 5)/$close", "Std($close, 5)", "($close-$open)/$open"]
+        compile_expressions = C.compile_expressions
+        try:
+            C.compile_expressions = True
+            with profile_expressions() as profiler:
+                D.features(["0050"], fields, "2022-01-01", "2022-02-01")
+        finally:
+            C.compile_expressions = compile_expressions
+        self.assertFalse(Profiler.enabled)
+
+        operators = profiler.report()
+        self.assertTrue({"Feature", "Mean", "Std", "Div"}.issubset(operators.index))
+        self.assertTrue((operators["calls"] == operators["hits"] + operators["misses"]).all())
+        self.assertTrue((operators["time"] >= operators["self_time"]).all())
+        self.assertTrue(operators["time"].is_monotonic_decreasing)
+        # `$close` and `$open` are loaded from the storage once, then shared by the fields
+        self.assertEqual(operators.loc["Feature", "misses"], 2)
+        self.assertGreater(operators.loc["Feature", "hits"], 0)
+        self.assertGreater(operators.loc["Mean", "nbytes"], 0)
+
+        by_field = profiler.report("field", sort_by="calls", ascending=True)
+        # the fields are normalized by `D.features`
+        self.assertEqual(set(by_field.index), {field.replace(" ", "") for field in fields})
+        self.assertTrue(by_field["calls"].is_monotonic_increasing)
+        self.assertAlmostEqual(by_field["time"].sum(), operators["self_time"].sum())
+
+        with Profiler.collect() as stats:
+            self.assertEqual(stats, {"operator": {}, "field": {}})
+        # the stats are reset in a new context
+        with profile_expressions() as profiler:
+            pass
+        self.assertEqual(len(profiler.report()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import pickle
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.data._libs import rolling, expanding
+
+
+class TestRollingKernels(unittest.TestCase):
+    """the cython implementations of the rolling operators are the same as pandas"""
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.x = rng.normal(10, 2, 1000).round(2)
+        self.x[rng.random(1000) < 0.1] = np.nan
+        self.x[100:130] = np.nan
+        self.x[200:220] = 5.0
+        self.y = rng.normal(0, 1, 1000)
+        self.y[rng.random(1000) < 0.1] = np.nan
+
+    def assert_same(self, result, golden):
+        np.testing.assert_allclose(result, golden, rtol=1e-8, atol=1e-10)
+
+    def test_moments(self):
+        s = pd.Series(self.x)
+        for N in [5, 20]:
+            for func in ["var", "std", "skew", "kurt"]:
+                golden = getattr(s.rolling(N, min_periods=1), func)()
+                self.assert_same(getattr(rolling, "rolling_" + func)(self.x, N), golden)
+            golden = getattr(s[:300].expanding(min_periods=1), func)()
+            self.assert_same(getattr(expanding, "expanding_" + func)(self.x[:300]), golden)
+
+    def test_moments_speed(self):
+        def timeit(func):
+            t = time.perf_counter()
+            func()
+            return time.perf_counter() - t
+
+        # the moments are updated in O(1) per step, so an expanding window takes about the same time as pandas
+        x = np.tile(self.x, 100)
+        s = pd.Series(x)
+        for func in ["skew", "kurt"]:
+            cost = min(timeit(lambda: getattr(expanding, "expanding_" + func)(x)) for _ in range(3))
+            golden = min(timeit(lambda: getattr(s.expanding(min_periods=1), func)()) for _ in range(3))
+            self.assertLess(cost, golden * 5 + 0.01)
+            cost = min(timeit(lambda: getattr(rolling, "rolling_" + func)(x, 1000)) for _ in range(3))
+            golden = min(timeit(lambda: getattr(s.rolling(1000, min_periods=1), func)()) for _ in range(3))
+            self.assertLess(cost, golden * 5 + 0.01)
+
+    def test_order_statistics(self):
+        s = pd.Series(self.x)
+        for N in [5, 20]:
+            r = s.rolling(N, min_periods=1)
+            np.testing.assert_array_equal(rolling.rolling_max(self.x, N), r.max())
+            np.testing.assert_array_equal(rolling.rolling_min(self.x, N), r.min())
+            np.testing.assert_array_equal(rolling.rolling_median(self.x, N), r.median())
+            np.testing.assert_array_equal(rolling.rolling_quantile(self.x, N, 0.8), r.quantile(0.8))
+            np.testing.assert_array_equal(rolling.rolling_rank(self.x, N), r.rank(pct=True))
+            # NaN is the max and the min of `np.argmax` and `np.argmin`
+            np.testing.assert_array_equal(
+                rolling.rolling_idxmax(self.x, N), r.apply(lambda x: x.argmax() + 1, raw=True)
+            )
+            np.testing.assert_array_equal(
+                rolling.rolling_idxmin(self.x, N), r.apply(lambda x: x.argmin() + 1, raw=True)
+            )
+        e = s[:300].expanding(min_periods=1)
+        np.testing.assert_array_equal(expanding.expanding_max(self.x[:300]), e.max())
+        np.testing.assert_array_equal(expanding.expanding_rank(self.x[:300]), e.rank(pct=True))
+        np.testing.assert_array_equal(
+            expanding.expanding_idxmin(self.x[:300]), e.apply(lambda x: x.argmin() + 1, raw=True)
+        )
+
+    def test_weighted(self):
+        def mad(x):
+            x1 = x[~np.isnan(x)]
+            return np.mean(np.abs(x1 - x1.mean()))
+
+        def weighted_mean(x):
+            w = np.arange(len(x)) + 1
+            w = w / w.sum()
+            return np.nanmean(w * x)
+
+        def exp_weighted_mean(x):
+            a = 1 - 2 / (1 + len(x))
+            w = a ** np.arange(len(x))[::-1]
+            w /= w.sum()
+            return np.nansum(w * x)
+
+        s = pd.Series(self.x)
+        for N in [5, 20]:
+            r = s.rolling(N, min_periods=1)
+            self.assert_same(rolling.rolling_mad(self.x, N), r.apply(mad, raw=True))
+            self.assert_same(rolling.rolling_wma(self.x, N), r.apply(weighted_mean, raw=True))
+            np.testing.assert_array_equal(
+                rolling.ewm_mean(self.x, 2 / (N + 1)), s.ewm(span=N, min_periods=1).mean().values
+            )
+        e = s[:300].expanding(min_periods=1)
+        self.assert_same(expanding.expanding_mad(self.x[:300]), e.apply(mad, raw=True))
+        self.assert_same(expanding.expanding_wma(self.x[:300]), e.apply(weighted_mean, raw=True))
+        self.assert_same(expanding.expanding_ema(self.x[:300]), e.apply(exp_weighted_mean, raw=True))
+
+    def test_pair(self):
+        s, t = pd.Series(self.x), pd.Series(self.y)
+        for N in [5, 20]:
+            r = s.rolling(N, min_periods=1)
+            self.assert_same(rolling.rolling_cov(self.x, self.y, N), r.cov(t))
+            # the correlation of the windows of the same values is masked by `Corr`
+            mask = (r.std() > 0).values
+            self.assert_same(rolling.rolling_corr(self.x, self.y, N)[mask], r.corr(t).values[mask])
+        e = s[:300].expanding(min_periods=1)
+        self.assert_same(expanding.expanding_cov(self.x[:300], self.y[:300]), e.cov(t[:300]))
+        self.assert_same(expanding.expanding_corr(self.x[:300], self.y[:300]), e.corr(t[:300]))
+
+    def test_pair_fuzz(self):
+        for seed in range(20):
+            rng = np.random.default_rng(seed)
+            x, y = rng.normal(100, 3, 300).round(1), rng.normal(0, 1, 300).round(3)
+            # the values of one side are the same in the pairs without NaN, but not in the whole window
+            for i, j in rng.integers(0, 280, (5, 2)):
+                x[i : i + rng.integers(3, 15)] = round(rng.normal(100, 3), 1)
+                y[j : j + rng.integers(3, 15)] = 0.3
+            x[rng.random(300) < 0.2] = np.nan
+            y[rng.random(300) < 0.2] = np.nan
+            for N in [3, 5, 10]:
+                golden = pd.Series(x).rolling(N, min_periods=1).corr(pd.Series(y)).values
+                # pandas divides by the zero variance
+                golden[np.isinf(golden)] = np.nan
+                np.testing.assert_allclose(rolling.rolling_corr(x, y, N), golden, rtol=1e-6, atol=1e-6)
+            golden = pd.Series(x).expanding(min_periods=1).corr(pd.Series(y)).values
+            golden[np.isinf(golden)] = np.nan
+            np.testing.assert_allclose(expanding.expanding_corr(x, y), golden, rtol=1e-6, atol=1e-6)
+
+    def test_infinite(self):
+        # pandas takes the infinite values as NaN, e.g. the volume ratios of the days after the zero volume days
+        np.testing.assert_allclose(
+            rolling.rolling_std(np.array([1, 2, 3, np.inf, 4, 5, 6, 7, 8, 9.0]), 3)[-3:], [1.0, 1.0, 1.0]
+        )
+        x, y = self.x.copy(), self.y.copy()
+        x[[50, 51, 300, 600]] = [np.inf, -np.inf, np.inf, -np.inf]
+        y[[400, 700]] = [-np.inf, np.inf]
+        s, t = pd.Series(x), pd.Series(y)
+        for N in [5, 20]:
+            r = s.rolling(N, min_periods=1)
+            for func in ["var", "std", "skew", "kurt"]:
+                self.assert_same(getattr(rolling, "rolling_" + func)(x, N), getattr(r, func)())
+            mad = r.apply(lambda v: np.nanmean(np.abs(v - np.nanmean(v))), raw=True)
+            self.assert_same(rolling.rolling_mad(x, N), mad)
+            self.assert_same(rolling.rolling_cov(x, y, N), r.cov(t))
+            mask = (r.std() > 0).values
+            self.assert_same(rolling.rolling_corr(x, y, N)[mask], r.corr(t).values[mask])
+        e = s[:500].expanding(min_periods=1)
+        for func in ["var", "std", "skew", "kurt"]:
+            self.assert_same(getattr(expanding, "expanding_" + func)(x[:500]), getattr(e, func)())
+        self.assert_same(expanding.expanding_cov(x[:500], y[:500]), e.cov(t[:500]))
+
+    def test_step(self):
+        s = pd.Series(self.x)
+        r = s.rolling(5, min_periods=1)
+        for kernel, golden in [(rolling.Sum(5), r.sum()), (rolling.Count(5), r.count()), (rolling.Std(5), r.std())]:
+            # the window is kept between the steps
+            self.assert_same(np.concatenate([kernel.step(self.x[:150]), kernel.step(self.x[150:])]), golden)
+        ewm = rolling.EWMean(0.3)
+        result = ewm.step(self.x[:150])
+        ewm = pickle.loads(pickle.dumps(ewm))
+        np.testing.assert_array_equal(np.concatenate([result, ewm.step(self.x[150:])]), rolling.ewm_mean(self.x, 0.3))
+
+    def test_empty(self):
+        self.assertEqual(len(rolling.rolling_std(np.array([]), 5)), 0)
+        self.assertEqual(len(expanding.expanding_idxmax(np.array([]))), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import shutil
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import qlib
+from qlib.config import C
+from qlib.data import D
+from qlib.data.cache import H
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from qlib.data.storage.parquet_storage import ParquetFeatureStorage
+except ImportError:
+    pa = None
+
+_file_name = Path(__file__).name.split(".")[0]
+DATA_DIR = Path(__file__).parent.joinpath(f"{_file_name}_data")
+
+INSTRUMENTS = ["SH600000", "SH600001", "SH600002"]
+FIELDS = ["open", "close"]
+
+
+def _backend(klass: str) -> dict:
+    return {"class": klass, "module_path": "qlib.data.storage.parquet_storage"}
+
+
+@unittest.skipIf(pa is None, "pyarrow is required by the parquet storage")
+class TestParquetStorage(unittest.TestCase):
+    """
+    Data:
+        SH600000    2020-01-01 ~ 2020-03-31
+        SH600001    2020-01-01 ~ 2020-03-31, 2020-02-03 is missing
+        SH600002    2020-02-03 ~ 2020-03-31
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        calendar = pd.bdate_range("2020-01-01", "2020-03-31")
+        rng = np.random.RandomState(0)
+        dfs = []
+        for i, inst in enumerate(INSTRUMENTS):
+            _calendar = calendar[calendar >= "2020-02-03"] if i == 2 else calendar
+            if i == 1:
+                _calendar = _calendar[_calendar != "2020-02-03"]
+            _df = pd.DataFrame(rng.rand(len(_calendar), len(FIELDS)), columns=FIELDS)
+            _df["datetime"] = _calendar
+            _df["instrument"] = inst
+            dfs.append(_df)
+        cls.df = pd.concat(dfs).set_index(["instrument", "datetime"]).astype(np.float32)
+        ds.write_dataset(
+            pa.Table.from_pandas(cls.df.reset_index(), preserve_index=False),
+            DATA_DIR.joinpath("parquet", "day"),
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("instrument", pa.string())]), flavor="hive"),
+            existing_data_behavior="delete_matching",
+        )
+        qlib.init(
+            provider_uri=str(DATA_DIR.resolve()),
+            calendar_provider={
+                "class": "LocalCalendarProvider",
+                "kwargs": {"backend": _backend("ParquetCalendarStorage")},
+            },
+            instrument_provider={
+                "class": "LocalInstrumentProvider",
+                "kwargs": {"backend": _backend("ParquetInstrumentStorage")},
+            },
+            feature_provider={
+                "class": "LocalFeatureProvider",
+                "kwargs": {"backend": _backend("ParquetFeatureStorage")},
+            },
+            expression_cache=None,
+            dataset_cache=None,
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(str(DATA_DIR.resolve()))
+
+    def test_calendar_and_instruments(self):
+        self.assertEqual(len(D.calendar(freq="day")), len(pd.bdate_range("2020-01-01", "2020-03-31")))
+        self.assertListEqual(D.list_instruments(D.instruments("all"), as_list=True), INSTRUMENTS)
+
+    def test_features(self):
+        df = D.features(INSTRUMENTS, ["$close", "Ref($open, 1)"], start_time="2020-01-15", end_time="2020-03-15")
+        close = df["$close"].dropna()
+        ori = self.df.loc(axis=0)[:, "2020-01-15":"2020-03-15"]["close"]
+        self.assertTrue(np.array_equal(close.values, ori.loc[close.index].values))
+        self.assertEqual(len(close), len(ori))
+        # the missing day inside the range is NaN
+        self.assertTrue(np.isnan(df.loc[("SH600001", pd.Timestamp("2020-02-03")), "$close"]))
+        # the data before the first day is not loaded
+        self.assertTrue(df.loc[("SH600002", slice("2020-01-15", "2020-01-31")), "$close"].empty)
+
+    def test_feature_storage(self):
+        feature = ParquetFeatureStorage(instrument="SH600002", field="close", freq="day")
+        calendar = D.calendar(freq="day")
+        self.assertEqual(calendar[feature.start_index], pd.Timestamp("2020-02-03"))
+        self.assertEqual(feature.end_index, len(calendar) - 1)
+        self.assertEqual(len(feature[:]), len(feature))
+        with self.assertRaises(IndexError):
+            print(feature[0])
+        self.assertTrue(ParquetFeatureStorage(instrument="SH600002", field="volume", freq="day")[:].empty)
+        self.assertEqual(ParquetFeatureStorage(instrument="SH600009", field="close", freq="day")[0], (None, None))
+
+        # the ranges of all the instruments are read at once and kept out of the handle pool
+        self.assertListEqual(feature.ranges.index.tolist(), [inst.lower() for inst in INSTRUMENTS])
+        self.assertFalse(any("parquet_range" in key for key in H["m"].od.keys()))
+
+    def test_panel(self):
+        fields = ["$close", "Ref($open, 1)", "Mean($close, 5)"]
+        golden = D.features(INSTRUMENTS, fields, start_time="2020-01-15", end_time="2020-03-15")
+        panel_evaluation = C.panel_evaluation
+        try:
+            C.panel_evaluation = True
+            df = D.features(INSTRUMENTS, fields, start_time="2020-01-15", end_time="2020-03-15")
+        finally:
+            C.panel_evaluation = panel_evaluation
+        pd.testing.assert_frame_equal(df, golden)
+
+        panel = ParquetFeatureStorage(instrument="SH600000", field="close", freq="day").panel()
+        self.assertListEqual(sorted(panel.columns), [inst.lower() for inst in INSTRUMENTS])
+        self.assertTrue(np.isnan(panel["sh600002"].iloc[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
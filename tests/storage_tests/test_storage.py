@@ -12,6 +12,7 @@ from qlib.data.storage.file_storage import (
     FileCalendarStorage as CalendarStorage,
     FileInstrumentStorage as InstrumentStorage,
     FileFeatureStorage as FeatureStorage,
+    MmapFileFeatureStorage,
 )
 
 _file_name = Path(__file__).name.split(".")[0]
@@ -168,3 +169,24 @@ class TestStorage(TestAutoData):
             print(feature[:].empty)
         with self.assertRaises(ValueError):
             print(feature.data.empty)
+
+    def test_mmap_feature_storage(self):
+        feature = FeatureStorage(instrument="SZ300677", field="close", freq="day", provider_uri=self.provider_uri)
+        mmap_feature = MmapFileFeatureStorage(
+            instrument="SZ300677", field="close", freq="day", provider_uri=self.provider_uri
+        )
+
+        assert mmap_feature.start_index == feature.start_index
+        assert mmap_feature.end_index == feature.end_index
+        assert len(mmap_feature) == len(feature)
+        assert mmap_feature[3049] == feature[3049]
+        assert mmap_feature[3049:3052].equals(feature[3049:3052])
+        assert mmap_feature[:].equals(feature[:])
+        with self.assertRaises(IndexError):
+            print(mmap_feature[0])
+
+        mmap_feature = MmapFileFeatureStorage(
+            instrument="SH600004", field="close", freq="day", provider_uri="not_fount"
+        )
+        with self.assertRaises(ValueError):
+            print(mmap_feature[:].empty)
@@ -11,10 +11,12 @@ import qlib
 import numpy as np
 import pandas as pd
 from qlib.data import D
+from qlib.data.storage.file_storage import FileFeatureStorage
+from qlib.data.storage.panel_storage import PanelFeatureStorage
 
 sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
 from get_data import GetData
-from dump_bin import DumpDataAll, DumpDataFix
+from dump_bin import DumpDataAll, DumpDataFix, DumpPanel
 
 
 DATA_DIR = Path(__file__).parent.joinpath("test_dump_data")
@@ -61,6 +63,8 @@ class TestDumpData(unittest.TestCase):
         )
         res_calendars = set(D.calendar())
         assert len(ori_calendars - res_calendars) == len(res_calendars - ori_calendars) == 0, "dump calendars failed"
+        npy_calendars = np.load(QLIB_DIR.joinpath("calendars", "day.npy")).view("M8[ns]")
+        assert set(map(pd.Timestamp, npy_calendars)) == ori_calendars, "dump binary calendars failed"
 
     def test_2_dump_instruments(self):
         ori_ins = set(map(lambda x: x.name[:-4].upper(), SOURCE_DIR.glob("*.csv")))
@@ -85,6 +89,25 @@ class TestDumpData(unittest.TestCase):
         self.assertEqual(len(df), len(TestDumpData.SIMPLE_DATA), "dump features simple failed")
         self.assertTrue(np.isclose(df.dropna(), self.SIMPLE_DATA.dropna()).all(), "dump features simple failed")
 
+    def test_5_dump_panel(self):
+        DumpPanel(qlib_dir=QLIB_DIR, include_fields=self.FIELDS).dump()
+
+        stock = self.STOCK_NAMES[0].lower()
+        for field in self.FIELDS:
+            ori = FileFeatureStorage(instrument=stock, field=field, freq="day")
+            res = PanelFeatureStorage(instrument=stock, field=field, freq="day")
+            self.assertEqual((ori.start_index, ori.end_index), (res.start_index, res.end_index), "dump panel failed")
+            self.assertTrue(np.array_equal(ori[:].values, res[:].values, equal_nan=True), "dump panel failed")
+
+        panel = PanelFeatureStorage(instrument=stock, field="close", freq="day").panel()
+        self.assertEqual(len(panel.columns), len(self.STOCK_NAMES), "dump panel failed")
+
+        # no instrument
+        dump_panel = DumpPanel(qlib_dir=DATA_DIR.joinpath("empty"))
+        dump_panel._panels_dir.mkdir(parents=True, exist_ok=True)
+        dump_panel._dump_field("close", [], 10)
+        self.assertEqual(np.load(dump_panel._panels_dir.joinpath("close.npy")).shape, (10, 0), "dump panel failed")
+
 
 if __name__ == "__main__":
     unittest.main()
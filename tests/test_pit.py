@@ -7,6 +7,7 @@ import qlib
 import shutil
 import unittest
 import pytest
+import numpy as np
 import pandas as pd
 import baostock as bs
 from pathlib import Path
@@ -282,6 +283,14 @@ class TestPIT(unittest.TestCase):
         """
         self.check_same(data, except_data)
 
+    def test_asof_same_as_daily(self):
+        # `P($$field)` is computed in one pass while `P($$field + 0)` is collapsed day by day
+        instruments = ["sh600519"]
+        fields = ["P($$roewa_q)", "P($$roewa_q + 0)", "PRef($$yoyni_q, 201801)", "PRef($$yoyni_q + 0, 201801)"]
+        data = D.features(instruments, fields, start_time="2017-01-01", end_time="2020-01-01", freq="day")
+        np.testing.assert_array_equal(data.iloc[:, 0].values, data.iloc[:, 1].values)
+        np.testing.assert_array_equal(data.iloc[:, 2].values, data.iloc[:, 3].values)
+
 
 if __name__ == "__main__":
     unittest.main()